@@ -1,10 +1,116 @@
+import tempfile
+
 import streamlit as st
-import sqlite3
 import pandas as pd
-import bcrypt
+
+from db import (
+    init_databases,
+    insert_record_db1,
+    get_filtered_records,
+    update_record_db1,
+    delete_record_db1,
+    insert_record_db2,
+    update_record_db2,
+    delete_record_db2,
+    get_min_times,
+    get_years,
+    get_leaderboard,
+    get_podium,
+    get_personal_bests,
+    get_athlete_progress,
+    get_athlete_results,
+    add_player,
+    update_player,
+    delete_player,
+    get_players_by_category,
+    get_page,
+    PAGED_TABLES,
+    search_game_names,
+    search_kid_names,
+    get_stats_groups,
+    link_player_athlete,
+    reject_player_link,
+)
+from auth import (
+    LoginBusy,
+    LoginThrottled,
+    add_user,
+    check_login,
+    ensure_default_users,
+    issue_session_token,
+    verify_session_token,
+    get_user,
+    list_users,
+    reset_password,
+    set_user_active,
+)
+from bulk_import import import_file
+from board import BOARD_PLACES, POLL_INTERVAL, get_standings, latest_year
+from charts import trend_chart
+from reconcile import cached_proposals
+from export import EXPORTS, FILTERED_COLUMNS, WRITERS, export_filtered, export_table
+from formats import format_time, is_missing, seconds_to_ms, split_ms, to_ms
+import profiling
+
+# Modalità tabellone (?board oppure ?board=<anno>): classifiche in diretta per gli
+# schermi delle gare, in sola lettura e senza login
+BOARD_MODE = "board" in st.query_params
 
 # Configurazione della pagina
-st.set_page_config(page_title="Login Multi-Utente", layout="centered")
+if BOARD_MODE:
+    st.set_page_config(page_title="Classifiche in diretta", layout="wide")
+else:
+    st.set_page_config(page_title="Login Multi-Utente", layout="centered")
+
+# --- Inizializza i database creando le tabelle se non esistono (una volta per processo) ---
+
+init_databases()
+ensure_default_users()
+
+
+# --- Tabellone in diretta ---
+
+# Classifiche affiancate per riga del tabellone
+BOARD_COLUMNS = 3
+
+
+def render_board():
+    """
+    Classifiche dell'anno aggiornate ogni POLL_INTERVAL secondi. Lo stato è
+    condiviso da tutti gli schermi (vedi board.py): a ogni aggiornamento si
+    leggono solo i tempi nuovi, e niente se il database non è cambiato.
+    """
+    requested = st.query_params.get("board", "")
+    year = int(requested) if requested.isdigit() else latest_year()
+    if year is None:
+        st.info("Nessun tempo registrato.")
+        return
+    st.title(f"Classifiche {year}")
+
+    @st.fragment(run_every=POLL_INTERVAL)
+    def standings():
+        snapshot, updated = get_standings(year).snapshot()
+        if not snapshot:
+            st.info("Nessun tempo registrato per questo anno.")
+            return
+        st.caption(f"Primi {BOARD_PLACES} per gioco e categoria - ultimo aggiornamento {updated}")
+        for start in range(0, len(snapshot), BOARD_COLUMNS):
+            for column, ((game, category, gender), rows) in zip(
+                st.columns(BOARD_COLUMNS), snapshot[start:start + BOARD_COLUMNS]
+            ):
+                with column:
+                    st.subheader(f"{game} - {category}" + ("" if gender == "NA" else f" ({gender})"))
+                    df = pd.DataFrame(rows, columns=["Pos.", "Nome", "Tempo", "Distacco"])
+                    df["Tempo"] = df["Tempo"].apply(format_time)
+                    df["Distacco"] = df["Distacco"].apply(lambda gap: "+" + format_time(gap) if gap else "")
+                    st.dataframe(df, hide_index=True)
+
+    standings()
+
+
+if BOARD_MODE:
+    render_board()
+    st.stop()
 
 # Inizializza lo stato di autenticazione e informazioni sull'utente corrente
 if "authenticated" not in st.session_state:
@@ -13,28 +119,18 @@ if "authenticated" not in st.session_state:
 if "current_user" not in st.session_state:
     st.session_state["current_user"] = None
 
-# Definisci il dizionario di utenti con password hashate (una sola volta per sessione)
-if "users" not in st.session_state:
-    st.session_state["users"] = {
-        "mattia": {
-            "name": "Mattia",
-            "password": bcrypt.hashpw("Dorz".encode("utf-8"), bcrypt.gensalt())
-        },
-        "luca": {
-            "name": "Luca",
-            "password": bcrypt.hashpw("password123".encode("utf-8"), bcrypt.gensalt())
-        },
-        "giulia": {
-            "name": "Giulia",
-            "password": bcrypt.hashpw("secret456".encode("utf-8"), bcrypt.gensalt())
-        }
-    }
-
-def verify_password(plain_password, hashed_password):
-    """Verifica se la password in chiaro corrisponde all'hash salvato."""
-    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password)
+# Dopo un refresh o una riconnessione la sessione riparte vuota: se l'URL contiene un
+# token di sessione valido l'utente viene riconosciuto senza rifare bcrypt.
+if not st.session_state["authenticated"] and "session" in st.query_params:
+    resumed_user = verify_session_token(st.query_params["session"])
+    if resumed_user is not None:
+        st.session_state["authenticated"] = True
+        st.session_state["current_user"] = resumed_user["username"]
+    else:
+        del st.query_params["session"]
 
-# Se l'utente non è autenticato, mostra la form di login e blocca il resto dell'app
+# Se l'utente non è autenticato, mostra la form di login e blocca il resto dell'app.
+# Gli utenti e i loro hash sono salvati in users.db: l'avvio della sessione non calcola hash.
 if not st.session_state["authenticated"]:
     st.title("Login")
     st.write("Inserisci le tue credenziali per accedere")
@@ -45,654 +141,862 @@ if not st.session_state["authenticated"]:
         submit_button = st.form_submit_button("Accedi")
     
     if submit_button:
-        users = st.session_state["users"]
-        if username in users and verify_password(password, users[username]["password"]):
-            st.session_state["authenticated"] = True
-            st.session_state["current_user"] = username
-            st.success(f"Login effettuato con successo! Benvenuto {users[username]['name']}!")
-            st.rerun()  # Ricarica la pagina per mostrare il contenuto principale
+        try:
+            user = check_login(username, password)
+        except LoginThrottled as exc:
+            st.error(f"Troppi tentativi falliti: {exc}.")
+        except LoginBusy:
+            st.warning("Troppi accessi contemporanei, riprova tra qualche secondo.")
         else:
-            st.error("Credenziali non valide. Riprova.")
+            if user is not None:
+                st.session_state["authenticated"] = True
+                st.session_state["current_user"] = username
+                st.query_params["session"] = issue_session_token(user)
+                st.success(f"Login effettuato con successo! Benvenuto {user['name']}!")
+                st.rerun()  # Ricarica la pagina per mostrare il contenuto principale
+            else:
+                st.error("Credenziali non valide. Riprova.")
     
     st.stop()  # Blocca l'esecuzione del codice sotto
 
 # Contenuto principale dell'app (visibile solo dopo il login)
-current_user = st.session_state["current_user"]
+current_user = get_user(st.session_state["current_user"])
+# Un utente disabilitato (o rimosso) nel frattempo perde l'accesso al rerun successivo
+if current_user is None or not current_user["active"]:
+    st.session_state["authenticated"] = False
+    st.session_state["current_user"] = None
+    st.query_params.pop("session", None)
+    st.rerun()
+
 st.title("Applicazione Principale")
-if current_user:
-    st.write(f"Benvenuto {st.session_state['users'][current_user]['name']}!")
-else:
-    st.write("Utente sconosciuto")
+st.write(f"Benvenuto {current_user['name']}!")
+if st.button("Esci", key="logout_button"):
+    st.session_state["authenticated"] = False
+    st.session_state["current_user"] = None
+    st.query_params.pop("session", None)
+    st.rerun()
 
 st.write("Questo è il contenuto riservato agli utenti autenticati.")
 
-# --- Inizializza i database creando le tabelle se non esistono ---
-
-def init_db1():
-    conn = sqlite3.connect("database1.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS results (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            time REAL,
-            game_name TEXT,
-            category TEXT,
-            gender TEXT,
-            year INTEGER
-        )
-        """
-    )
-    conn.commit()
-    conn.close()
-
-def init_db2():
-    conn = sqlite3.connect("database2.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS results_kids (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT,
-            time REAL,
-            game_name TEXT,
-            category TEXT,
-            gender TEXT,
-            year INTEGER
-        )
-        """
-    )
-    conn.commit()
-    conn.close()
-
-def init_db3():
-    """Crea il database e la tabella 'players' se non esistono."""
-    conn = sqlite3.connect("database3.db")
-    c = conn.cursor()
-    c.execute('''
-         CREATE TABLE IF NOT EXISTS players (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            first_name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            game TEXT NOT NULL,
-            category TEXT NOT NULL,
-            gender TEXT NOT NULL,
-            status TEXT NOT NULL
+# --- Tabelle paginate lato server ---
+
+def paged_table(table, columns, key):
+    """
+    Mostra una pagina della tabella con ordinamento, ricerca e navigazione eseguiti
+    da SQLite e restituisce il DataFrame della sola pagina corrente.
+    """
+    col_sort, col_dir, col_search = st.columns([1, 1, 2])
+    with col_sort:
+        sort = st.selectbox("Ordina per", options=list(PAGED_TABLES[table]["sort"]), key=f"{key}_sort")
+    with col_dir:
+        descending = st.checkbox("Decrescente", key=f"{key}_desc")
+    with col_search:
+        search = st.text_input("Cerca", value="", key=f"{key}_search")
+
+    # Cursori delle pagine visitate (per tornare indietro); cambiando ordinamento
+    # o ricerca si riparte dalla prima pagina.
+    signature = (sort, descending, search)
+    if st.session_state.get(f"{key}_signature") != signature:
+        st.session_state[f"{key}_signature"] = signature
+        st.session_state[f"{key}_cursors"] = [None]
+    cursors = st.session_state[f"{key}_cursors"]
+    rows, next_cursor = get_page(table, sort, descending, cursors[-1], search)
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("◀ Precedente", disabled=len(cursors) == 1, key=f"{key}_prev"):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.write(f"Pagina {len(cursors)}")
+    with col_next:
+        if st.button("Successiva ▶", disabled=next_cursor is None, key=f"{key}_next"):
+            cursors.append(next_cursor)
+            st.rerun()
+
+    with profiling.section("dataframe"):
+        df = pd.DataFrame(rows, columns=columns)
+    # I tempi sono in millisecondi: a video nel formato mm:ss.cc
+    st.dataframe(df.assign(Tempo=df["Tempo"].apply(format_time)) if "Tempo" in df else df)
+    return df
+
+
+# --- Importazione massiva da file ---
+
+def import_section(table, key):
+    """Caricamento di un file CSV/Excel di tempi con resoconto delle righe scartate."""
+    with st.expander("Importa tempi da file CSV/Excel"):
+        uploaded = st.file_uploader("File dei tempi", type=["csv", "xlsx"], key=f"{key}_file")
+        if uploaded is not None and st.button("Importa", key=f"{key}_button"):
+            try:
+                with st.spinner("Importazione in corso..."):
+                    inserted, rejected = import_file(uploaded, uploaded.name, table)
+            except ValueError as exc:
+                st.error(f"File non valido: {exc}")
+                return
+            st.success(f"Record importati: {inserted}")
+            if rejected:
+                st.warning(f"Righe scartate: {len(rejected)}")
+                st.dataframe(pd.DataFrame(rejected, columns=["Riga", "Motivo"]))
+
+
+# --- Esportazione in CSV/Parquet ---
+
+def export_section(table, filters, key):
+    """Esporta i record filtrati della vista o un'intera tabella, letti a blocchi."""
+    with st.expander("Esporta dati"):
+        source = st.selectbox("Dati da esportare", ["Record filtrati"] + list(EXPORTS), key=f"{key}_source")
+        fmt = st.radio("Formato", list(WRITERS), horizontal=True, key=f"{key}_format")
+        if st.button("Prepara file", key=f"{key}_prepare"):
+            # Il file viene scritto su disco a blocchi e letto solo alla fine,
+            # quando Streamlit ha bisogno dei byte per il download.
+            with tempfile.TemporaryFile() as out:
+                try:
+                    if source == "Record filtrati":
+                        export_filtered(table, filters, out, fmt)
+                    else:
+                        export_table(source, out, fmt)
+                except ImportError:
+                    st.error("Per l'esportazione in Parquet è necessario installare pyarrow.")
+                    return
+                out.seek(0)
+                data = out.read()
+            _, mime, extension = WRITERS[fmt]
+            file_name = source.lower().replace(" ", "_") + "." + extension
+            st.download_button("Scarica", data=data, file_name=file_name, mime=mime, key=f"{key}_download")
+
+
+# --- Vista dei tempi con filtri combinabili ---
+
+def year_options(table):
+    """Scelte dell'anno: "Tutti" e gli anni con tempi in `table`, archiviati compresi."""
+    return ["Tutti"] + [str(year) for year in get_years(table)]
+
+
+def filter_view(table, key):
+    """
+    Filtri combinabili su anno, categoria, sesso, gioco e intervallo di tempo,
+    applicati insieme da un'unica query in SQLite (vedi db.filter_query).
+    """
+    st.write("Filtra per:")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        year = st.selectbox(
+            "Anno",
+            options=year_options(table),
+            key=f"{key}_year"
         )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Inizializza i due database all'avvio
-init_db1()
-init_db2()
-init_db3()
-
-# --- Funzioni di utilità per il database 1 ---
-
-def insert_record_db1(time_value, game_name, category, gender, year):
-    conn = sqlite3.connect("database1.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO results (time, game_name, category, gender, year) VALUES (?, ?, ?, ?, ?)",
-        (time_value, game_name, category, gender, year)
-    )
-    conn.commit()
-    conn.close()
-
-def get_records_db1():
-    conn = sqlite3.connect("database1.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM results")
-    records = cursor.fetchall()
-    conn.close()
-    return records
-
-def update_record_db1(record_id, new_time, new_game_name, new_category, new_gender, new_year):
-    conn = sqlite3.connect("database1.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE results SET time=?, game_name=?, category=?, gender=?, year=? WHERE id=?",
-        (new_time, new_game_name, new_category, new_gender, new_year, record_id)
-    )
-    conn.commit()
-    conn.close()
-
-def delete_record_db1(record_id):
-    conn = sqlite3.connect("database1.db")
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM results WHERE id=?", (record_id,))
-    conn.commit()
-    conn.close()
-
-# --- Funzioni di utilità per il database 2 (ragazzi) ---
-
-import sqlite3
-
-def insert_record_db2(nome, time_value, game_name, category, year, gender):
-    conn = sqlite3.connect("database2.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO results_kids (nome, time, game_name, category, year, gender) VALUES (?, ?, ?, ?, ?, ?)",
-        (nome, time_value, game_name, category, year, gender)
-    )
-    conn.commit()
-    conn.close()
-
-def get_records_db2():
-    conn = sqlite3.connect("database2.db")
-    cursor = conn.cursor()
-    # Selezioniamo esplicitamente tutti i campi, inclusa la colonna gender
-    cursor.execute("SELECT id, nome, time, game_name, category, gender, year FROM results_kids")
-    records = cursor.fetchall()
-    conn.close()
-    return records
-
-def update_record_db2(record_id, nome, new_time, new_game_name, new_category, new_year, new_gender):
-    conn = sqlite3.connect("database2.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE results_kids SET nome=?, time=?, game_name=?, category=?, year=?, gender=? WHERE id=?",
-        (nome, new_time, new_game_name, new_category, new_year, new_gender, record_id)
-    )
-    conn.commit()
-    conn.close()
-
-def delete_record_db2(record_id):
-    conn = sqlite3.connect("database2.db")
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM results_kids WHERE id=?", (record_id,))
-    conn.commit()
-    conn.close()
-
-def get_min_times(year_filter=None):
-    conn = sqlite3.connect("database2.db")
-    cursor = conn.cursor()
-    # Utilizziamo una query con subquery e JOIN per estrarre la riga (con il nome e il gender)
-    # che possiede il tempo minimo per ogni gruppo (game_name, category, gender).
-    if year_filter and year_filter != "Tutti":
-        cursor.execute(
-            """
-            SELECT r.game_name, r.category, r.nome, r.gender, r.time AS min_time
-            FROM results_kids r
-            INNER JOIN (
-                SELECT game_name, category, gender, MIN(time) AS min_time
-                FROM results_kids
-                WHERE year=?
-                GROUP BY game_name, category, gender
-            ) m ON r.game_name = m.game_name 
-               AND r.category = m.category 
-               AND r.gender = m.gender 
-               AND r.time = m.min_time
-            """, (year_filter,)
+        time_min = st.number_input("Tempo minimo (secondi, 0 = nessuno)", value=0.0, min_value=0.0,
+                                   format="%.2f", key=f"{key}_time_min")
+    with col2:
+        category = st.selectbox(
+            "Categoria",
+            options=["Tutte", "materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
+            key=f"{key}_category"
         )
+        time_max = st.number_input("Tempo massimo (secondi, 0 = nessuno)", value=0.0, min_value=0.0,
+                                   format="%.2f", key=f"{key}_time_max")
+    with col3:
+        gender = st.selectbox("Sesso", options=["Tutti", "maschio", "femmina"], key=f"{key}_gender")
+        game = st.text_input("Parte del Nome del Gioco", value="", key=f"{key}_game")
+    # Suggerimenti dall'indice full-text mentre si scrive
+    suggestions = search_game_names(game)
+    if suggestions:
+        st.caption("Giochi trovati: " + ", ".join(suggestions))
+
+    filters = {
+        "year": int(year) if year != "Tutti" else None,
+        "category": category if category != "Tutte" else None,
+        "gender": gender if gender != "Tutti" else None,
+        "game": game,
+        "time_min": seconds_to_ms(time_min) or None,
+        "time_max": seconds_to_ms(time_max) or None,
+    }
+    records_filtered = get_filtered_records(table, filters)
+
+    if records_filtered:
+        st.write(f"Record trovati: {len(records_filtered)}")
+        with profiling.section("dataframe"):
+            df_filtered = pd.DataFrame(records_filtered, columns=FILTERED_COLUMNS[table])
+            # Aggiunge una nuova colonna: tempo formattato in formato mm:ss.cc
+            df_filtered["Tempo Formattato"] = df_filtered["Tempo (ms)"].apply(format_time)
+        st.dataframe(df_filtered)
     else:
-        cursor.execute(
-            """
-            SELECT r.game_name, r.category, r.nome, r.gender, r.time AS min_time
-            FROM results_kids r
-            INNER JOIN (
-                SELECT game_name, category, gender, MIN(time) AS min_time
-                FROM results_kids
-                GROUP BY game_name, category, gender
-            ) m ON r.game_name = m.game_name 
-               AND r.category = m.category 
-               AND r.gender = m.gender 
-               AND r.time = m.min_time
-            """
+        st.info("Nessun record trovato con i filtri applicati.")
+
+    export_section(table, filters, key=f"{key}_export")
+
+
+# --- Viste dell'app: ogni funzione esegue solo le query della propria vista ---
+
+# ----- TAB 1: Inserimento Record in database1.db -----
+def render_tab1():
+    st.header("Inserisci Nuovo Tempo")
+    col1, col2 = st.columns(2)
+    with col1:
+        # Inserimento separato per minuti e secondi
+        minutes_value = st.number_input("Minuti", value=0, step=1, key="db1_minutes_input")
+        seconds_value = st.number_input("Secondi", value=0.0, format="%.2f", key="db1_seconds_input")
+        # Calcola il tempo totale in millisecondi
+        total_time = to_ms(minutes_value, seconds_value)
+        game_name = st.text_input("Nome del Gioco", key="db1_game_input")
+        # Categoria aggiornata includendo "elementari"
+        category = st.selectbox(
+            "Categoria", 
+            options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
+            key="db1_category_input"
         )
-    results = cursor.fetchall()
-    conn.close()
-    return results
-
-def add_player(first_name, last_name, game, category, gender, status):
-    """Inserisce un nuovo record nel database."""
-    conn = sqlite3.connect("database3.db")
-    c = conn.cursor()
-    c.execute("INSERT INTO players (first_name, last_name, game, category, gender, status) VALUES (?, ?, ?, ?, ?, ?)",
-              (first_name, last_name, game, category, gender, status))
-    conn.commit()
-    conn.close()
-
-def get_all_players():
-    """Recupera tutti i record dal database."""
-    conn = sqlite3.connect("database3.db")
-    c = conn.cursor()
-    c.execute("SELECT id, first_name, last_name, game, category, gender, status FROM players")
-    rows = c.fetchall()
-    conn.close()
-    return rows
-
-def update_player(record_id, first_name, last_name, game, category, gender, status):
-    """Aggiorna un record esistente nel database."""
-    conn = sqlite3.connect("database3.db")
-    c = conn.cursor()
-    c.execute("UPDATE players SET first_name=?, last_name=?, game=?, category=?, gender=?, status=? WHERE id=?",
-              (first_name, last_name, game, category, gender, status, record_id))
-    conn.commit()
-    conn.close()
-
-def delete_player(record_id):
-    """Elimina un record dal database."""
-    conn = sqlite3.connect("database3.db")
-    c = conn.cursor()
-    c.execute("DELETE FROM players WHERE id=?", (record_id,))
-    conn.commit()
-    conn.close()
-
-def get_players_by_category(category):
-    """
-    Recupera i giocatori (first_name, status, game) appartenenti alla categoria selezionata.
-    Ritorna una lista di tuple: (first_name, status, game)
-    """
-    conn = sqlite3.connect("database3.db")
-    c = conn.cursor()
-    c.execute("SELECT first_name, status, game FROM players WHERE category=?", (category,))
-    rows = c.fetchall()
-    conn.close()
-    return rows
+        year = st.number_input("Anno", value=2025, step=1, key="db1_year_input")
+    with col2:
+        # Se la categoria lo richiede, viene richiesto anche il genere
+        if category in ["elementari", "medie", "adolescenti"]:
+            gender = st.selectbox("Genere", options=["maschio", "femmina"], key="db1_gender_input")
+        else:
+            gender = "NA"
+    if st.button("Inserisci Record", key="db1_insert_button"):
+        try:
+            insert_record_db1(total_time, game_name, category, gender, year)
+            st.success("Record inserito correttamente nei tempi.")
+        except ValueError as exc:
+            st.error(f"Record non valido: {exc}")
 
-# --- Definizione dell'app Streamlit con le 4 Tab ---
+    import_section("results", key="db1_import")
 
-def main():
-    st.title("Gestione Tempi")
 
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "Inserisci Tempi",
-        "Modifica/Cancella Tempi",
-        "Visualizza Tempi",
-        "Gestione Ragazzi e Visualizza Minimi",
-        "Nomi"
-    ])
-
-    # ----- TAB 1: Inserimento Record in database1.db -----
-    with tab1:
-        st.header("Inserisci Nuovo Tempo")
-        col1, col2 = st.columns(2)
-        with col1:
-            # Inserimento separato per minuti e secondi
-            minutes_value = st.number_input("Minuti", value=0, step=1, key="db1_minutes_input")
-            seconds_value = st.number_input("Secondi", value=0.0, format="%.2f", key="db1_seconds_input")
-            # Calcola il tempo totale in secondi
-            total_time = minutes_value * 60 + seconds_value
-            game_name = st.text_input("Nome del Gioco", key="db1_game_input")
-            # Categoria aggiornata includendo "elementari"
-            category = st.selectbox(
-                "Categoria", 
+# ----- TAB 2: Modifica/Cancellazione Record in database1.db -----
+def render_tab2():
+    st.header("Modifica o Cancella Record")
+    df = paged_table("results", ["ID", "Tempo", "Gioco", "Categoria", "Sesso", "Anno"], key="db1_page")
+    if not df.empty:
+        # Il selettore elenca solo i record della pagina corrente
+        record_ids = df["ID"].tolist()
+        selected_id = st.selectbox("Seleziona ID del record", record_ids, key="db1_select_record")
+        action = st.selectbox("Scegli azione", ["Modifica", "Elimina"], key="db1_action_select")
+        
+        selected_record = df[df["ID"] == selected_id].iloc[0]
+        
+        if action == "Modifica":
+            new_game_name = st.text_input(
+                "Nuovo Nome del Gioco", 
+                value=selected_record["Gioco"], 
+                key=f"update_db1_game_{selected_id}"
+            )
+            new_category = st.selectbox(
+                "Nuova Categoria", 
                 options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
-                key="db1_category_input"
+                index=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"].index(selected_record["Categoria"]),
+                key=f"update_db1_category_{selected_id}"
             )
-            year = st.number_input("Anno", value=2025, step=1, key="db1_year_input")
-        with col2:
-            # Se la categoria lo richiede, viene richiesto anche il genere
-            if category in ["elementari", "medie", "adolescenti"]:
-                gender = st.selectbox("Genere", options=["maschio", "femmina"], key="db1_gender_input")
+            # Tempo o anno mancanti (vecchie righe importate senza) restano vuoti
+            # e vanno inseriti prima di confermare
+            new_year = st.number_input(
+                "Nuovo Anno", 
+                value=None if is_missing(selected_record["Anno"]) else int(selected_record["Anno"]),
+                step=1, 
+                key=f"update_db1_year_{selected_id}"
+            )
+            # Suddivide il tempo corrente in minuti e secondi
+            current_minutes, current_seconds = split_ms(selected_record["Tempo"])
+            new_minutes = st.number_input(
+                "Nuovi Minuti", 
+                value=current_minutes, 
+                step=1, 
+                key=f"update_db1_minutes_{selected_id}"
+            )
+            new_seconds = st.number_input(
+                "Nuovi Secondi", 
+                value=current_seconds, 
+                format="%.2f", 
+                key=f"update_db1_seconds_{selected_id}"
+            )
+            new_time = None if new_seconds is None else to_ms(new_minutes or 0, new_seconds)
+            
+            if new_category in ["elementari", "medie", "adolescenti"]:
+                # Se il valore salvato per il genere non corrisponde alle opzioni, si usa "maschio" di default
+                default_gender = selected_record["Sesso"] if selected_record["Sesso"] in ["maschio", "femmina"] else "maschio"
+                new_gender = st.selectbox(
+                    "Nuovo Genere", 
+                    options=["maschio", "femmina"],
+                    index=(0 if default_gender == "maschio" else 1),
+                    key=f"update_db1_gender_{selected_id}"
+                )
             else:
-                gender = "NA"
-        if st.button("Inserisci Record", key="db1_insert_button"):
-            insert_record_db1(total_time, game_name, category, gender, year)
-            st.success("Record inserito correttamente nei tempi.")
+                new_gender = "NA"
+                
+            if st.button("Conferma Modifica", key=f"db1_confirm_update_{selected_id}"):
+                try:
+                    update_record_db1(selected_id, new_time, new_game_name, new_category, new_gender, new_year)
+                    st.success("Record modificato correttamente.")
+                except ValueError as exc:
+                    st.error(f"Record non valido: {exc}")
+        elif action == "Elimina":
+            if st.button("Conferma Eliminazione", key=f"db1_confirm_delete_{selected_id}"):
+                delete_record_db1(selected_id)
+                st.success("Record eliminato correttamente.")
+    else:
+        st.info("Nessun record trovato.")
 
-    # ----- TAB 2: Modifica/Cancellazione Record in database1.db -----
-    with tab2:
-        st.header("Modifica o Cancella Record")
-        records = get_records_db1()
-        if records:
-            df = pd.DataFrame(records, columns=["ID", "Tempo", "Gioco", "Categoria", "Sesso", "Anno"])
-            st.dataframe(df)
-            
+
+# ----- TAB 3: Visualizzazione Record con Filtri in database1.db -----
+def render_tab3():
+    st.header("Visualizza Record con Filtri")
+    filter_view("results", key="db1_filter")
+
+
+# ----- TAB 4: Gestione Tempi Ragazzi (DB 2) -----
+def render_tab4():
+    st.header("Gestione Tempi Ragazzi e Visualizzazione Minimi")
+    option_tab4 = st.radio(
+        "Seleziona Azione",
+        [
+            "Inserisci Nuovo Tempo",
+            "Modifica/Cancella Tempo",
+            "Visualizza Tempi con Filtri",
+            "Visualizza Minimo per Gioco e Categoria",
+            "Classifica per Gioco e Categoria",
+            "Profilo Atleta",
+        ],
+        key="db2_action_radio"
+    )
+    
+    # --- Sezione Inserimento record in database2.db ---
+    if option_tab4 == "Inserisci Nuovo Tempo":
+        st.subheader("Inserisci Nuovo Tempo per Ragazzi")
+        nome = st.text_input("Nome Ragazzo", key="db2_nome_input")
+        # Input per minuti e secondi
+        minutes_value = st.number_input("Minuti", value=0, step=1, key="db2_minutes_input")
+        seconds_value = st.number_input("Secondi", value=0.0, format="%.2f", key="db2_seconds_input")
+        # Calcolo del tempo totale in millisecondi
+        total_time = to_ms(minutes_value, seconds_value)
+        
+        game_name = st.text_input("Nome del Gioco", key="db2_game_input")
+        # Menu delle categorie aggiornato, includendo "elementari"
+        category = st.selectbox(
+            "Categoria",
+            options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
+            key="db2_category_input"
+        )
+        # Se la categoria è tra quelle che richiedono di specificare il genere (elementari, medie, adolescenti)
+        if category in ["elementari", "medie", "adolescenti"]:
+            gender = st.selectbox("Genere", options=["maschio", "femmina"], key="db2_gender_input")
+        else:
+            gender = "NA"
+        year = st.number_input("Anno", value=2025, step=1, key="db2_year_input")
+        
+        if st.button("Inserisci Record", key="db2_insert_record"):
+            # Assicurati che la funzione insert_record_db2 sia definita per accettare anche il parametro "gender"
+            try:
+                insert_record_db2(nome, total_time, game_name, category, year, gender)
+                st.success("Record inserito correttamente per il ragazzo.")
+            except ValueError as exc:
+                st.error(f"Record non valido: {exc}")
+
+        import_section("results_kids", key="db2_import")
+    
+    # --- Sezione Modifica/Cancellazione record in database2.db ---
+    elif option_tab4 == "Modifica/Cancella Tempo":
+        st.subheader("Modifica o Cancella Record per Ragazzi")
+        df = paged_table(
+            "results_kids",
+            ["ID", "Nome", "Tempo", "Gioco", "Categoria", "Genere", "Anno"],
+            key="db2_page"
+        )
+        if not df.empty:
             record_ids = df["ID"].tolist()
-            selected_id = st.selectbox("Seleziona ID del record", record_ids, key="db1_select_record")
-            action = st.selectbox("Scegli azione", ["Modifica", "Elimina"], key="db1_action_select")
-            
+            selected_id = st.selectbox("Seleziona ID del record", record_ids, key="db2_select_record")
+            action = st.selectbox("Scegli azione", ["Modifica", "Elimina"], key="db2_action_select")
             selected_record = df[df["ID"] == selected_id].iloc[0]
             
             if action == "Modifica":
-                new_game_name = st.text_input(
-                    "Nuovo Nome del Gioco", 
-                    value=selected_record["Gioco"], 
-                    key=f"update_db1_game_{selected_id}"
-                )
-                new_category = st.selectbox(
-                    "Nuova Categoria", 
-                    options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
-                    index=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"].index(selected_record["Categoria"]),
-                    key=f"update_db1_category_{selected_id}"
-                )
-                new_year = st.number_input(
-                    "Nuovo Anno", 
-                    value=int(selected_record["Anno"]), 
-                    step=1, 
-                    key=f"update_db1_year_{selected_id}"
+                new_nome = st.text_input(
+                    "Nuovo Nome Ragazzo", 
+                    value=selected_record["Nome"], 
+                    key=f"update_db2_nome_{selected_id}"
                 )
-                # Suddivide il tempo corrente in minuti e secondi
-                current_minutes = int(float(selected_record["Tempo"]) // 60)
-                current_seconds = float(selected_record["Tempo"]) - current_minutes * 60
+                # Calcola minuti e secondi dal tempo attuale
+                current_minutes, current_seconds = split_ms(selected_record["Tempo"])
                 new_minutes = st.number_input(
                     "Nuovi Minuti", 
                     value=current_minutes, 
                     step=1, 
-                    key=f"update_db1_minutes_{selected_id}"
+                    key=f"update_db2_minutes_{selected_id}"
                 )
                 new_seconds = st.number_input(
                     "Nuovi Secondi", 
                     value=current_seconds, 
                     format="%.2f", 
-                    key=f"update_db1_seconds_{selected_id}"
+                    key=f"update_db2_seconds_{selected_id}"
                 )
-                new_time = new_minutes * 60 + new_seconds
+                new_time = None if new_seconds is None else to_ms(new_minutes or 0, new_seconds)
                 
+                new_game_name = st.text_input(
+                    "Nuovo Nome del Gioco", 
+                    value=selected_record["Gioco"], 
+                    key=f"update_db2_game_{selected_id}"
+                )
+                new_category = st.selectbox(
+                    "Nuova Categoria", 
+                    options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
+                    index=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"].index(selected_record["Categoria"]),
+                    key=f"update_db2_category_{selected_id}"
+                )
                 if new_category in ["elementari", "medie", "adolescenti"]:
-                    # Se il valore salvato per il genere non corrisponde alle opzioni, si usa "maschio" di default
-                    default_gender = selected_record["Sesso"] if selected_record["Sesso"] in ["maschio", "femmina"] else "maschio"
                     new_gender = st.selectbox(
                         "Nuovo Genere", 
                         options=["maschio", "femmina"],
-                        index=(0 if default_gender == "maschio" else 1),
-                        key=f"update_db1_gender_{selected_id}"
+                        index=["maschio", "femmina"].index(selected_record["Genere"]) if selected_record["Genere"] in ["maschio", "femmina"] else 0,
+                        key=f"update_db2_gender_{selected_id}"
                     )
                 else:
                     new_gender = "NA"
-                    
-                if st.button("Conferma Modifica", key=f"db1_confirm_update_{selected_id}"):
-                    update_record_db1(selected_id, new_time, new_game_name, new_category, new_gender, new_year)
-                    st.success("Record modificato correttamente.")
+                
+                new_year = st.number_input(
+                    "Nuovo Anno", 
+                    value=None if is_missing(selected_record["Anno"]) else int(selected_record["Anno"]),
+                    step=1,
+                    key=f"update_db2_year_{selected_id}"
+                )
+                if st.button("Conferma Modifica", key=f"db2_confirm_update_{selected_id}"):
+                    try:
+                        update_record_db2(selected_id, new_nome, new_time, new_game_name, new_category, new_year, new_gender)
+                        st.success("Record modificato correttamente.")
+                    except ValueError as exc:
+                        st.error(f"Record non valido: {exc}")
             elif action == "Elimina":
-                if st.button("Conferma Eliminazione", key=f"db1_confirm_delete_{selected_id}"):
-                    delete_record_db1(selected_id)
+                if st.button("Conferma Eliminazione", key=f"db2_confirm_delete_{selected_id}"):
+                    delete_record_db2(selected_id)
                     st.success("Record eliminato correttamente.")
         else:
-            st.info("Nessun record presente nel database.")
-
-    # ----- TAB 3: Visualizzazione Record con Filtri in database1.db -----
-    with tab3:
-        st.header("Visualizza Record con Filtri")
-        st.write("Filtra per:")
-        filter_options = ["Tutti", "Anno", "Categoria", "Sesso", "Nome del Gioco"]
-        filter_choice = st.selectbox("Seleziona filtro", filter_options, key="db1_filter_choice")
-        filter_value = None
-
-        if filter_choice == "Anno":
-            filter_value = st.number_input("Inserisci Anno", value=2025, step=1, key="filter_year_input")
-        elif filter_choice == "Categoria":
-            filter_value = st.selectbox(
-                "Seleziona Categoria", 
-                options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"], 
-                key="filter_category_input"
-            )
-        elif filter_choice == "Sesso":
-            filter_value = st.selectbox("Seleziona Sesso", options=["maschio", "femmina"], key="filter_gender_input")
-        elif filter_choice == "Nome del Gioco":
-            filter_value = st.text_input("Inserisci parte del Nome del Gioco", value="", key="filter_game_name_input")
-
-        conn = sqlite3.connect("database1.db")
-        cursor = conn.cursor()
-
-        if filter_choice == "Tutti":
-            cursor.execute("SELECT * FROM results")
-        elif filter_choice == "Anno":
-            cursor.execute("SELECT * FROM results WHERE year=?", (filter_value,))
-        elif filter_choice == "Categoria":
-            cursor.execute("SELECT * FROM results WHERE category=?", (filter_value,))
-        elif filter_choice == "Sesso":
-            cursor.execute("SELECT * FROM results WHERE gender=?", (filter_value,))
-        elif filter_choice == "Nome del Gioco":
-            cursor.execute("SELECT * FROM results WHERE game_name LIKE ?", ('%' + filter_value + '%',))
-        records_filtered = cursor.fetchall()
-        conn.close()
-
-        if records_filtered:
-            st.write(f"Record trovati: {len(records_filtered)}")
-            df_filtered = pd.DataFrame(records_filtered, columns=["ID", "Tempo", "Gioco", "Categoria", "Sesso", "Anno"])
-            # Aggiunge una nuova colonna: tempo formattato in formato mm:ss.ss
-            df_filtered["Tempo Formattato"] = df_filtered["Tempo"].apply(
-                lambda x: f"{int(x // 60):02d}:{(x - int(x // 60)*60):05.2f}"
-            )
-            st.dataframe(df_filtered)
+            st.info("Nessun record trovato.")
+    
+    # --- Sezione Visualizzazione tempi con filtri in database2.db ---
+    elif option_tab4 == "Visualizza Tempi con Filtri":
+        st.subheader("Visualizza Tempi Ragazzi con Filtri")
+        filter_view("results_kids", key="db2_filter")
+
+    # --- Sezione Visualizzazione minimi per ogni gioco e categoria in database2.db ---
+    elif option_tab4 == "Visualizza Minimo per Gioco e Categoria":
+        st.subheader("Visualizza Tempo Minimo per Gioco e Categoria")
+        filtro_anno = st.selectbox(
+            "Seleziona Anno (oppure 'Tutti')", 
+            options=year_options("results_kids"),
+            key="db2_filter_year"
+        )
+        min_results = get_min_times(filtro_anno)
+        if min_results:
+            # Includiamo anche il nome associato al tempo minimo
+            df_min = pd.DataFrame(min_results, columns=["Gioco", "Categoria", "Nome","Sesso","Tempo Minimo"])
+            df_min["Tempo Minimo"] = df_min["Tempo Minimo"].apply(format_time)
+            st.dataframe(df_min)
         else:
-            st.info("Nessun record trovato con i filtri applicati.")
-
-# ----- TAB 4: Gestione Tempi Ragazzi (DB 2) -----
-    with tab4:
-        st.header("Gestione Tempi Ragazzi e Visualizzazione Minimi")
-        option_tab4 = st.radio(
-            "Seleziona Azione",
-            ["Inserisci Nuovo Tempo", "Modifica/Cancella Tempo", "Visualizza Minimo per Gioco e Categoria"],
-            key="db2_action_radio"
+            st.info("Nessun dato disponibile per i criteri di ricerca.")
+
+    # --- Sezione Classifica completa (podio, parità e distacchi) ---
+    elif option_tab4 == "Classifica per Gioco e Categoria":
+        st.subheader("Classifica per Gioco, Categoria e Genere")
+        leaderboard_view(key="db2_ranking")
+
+    # --- Sezione Profilo atleta: record personali e andamento negli anni ---
+    elif option_tab4 == "Profilo Atleta":
+        st.subheader("Profilo Atleta")
+        athlete_view(key="db2_athlete")
+
+
+def athlete_view(key):
+    """Record personali, andamento anno per anno e tempi di un atleta."""
+    text = st.text_input("Parte del Nome del Ragazzo", value="", key=f"{key}_search")
+    names = search_kid_names(text, limit=20)
+    if not names:
+        if text.strip():
+            st.info("Nessun atleta trovato.")
+        return
+    nome = st.selectbox("Atleta", options=names, key=f"{key}_name")
+
+    with profiling.section("dataframe"):
+        df_pb = pd.DataFrame(get_personal_bests(nome), columns=["Gioco", "Record Personale", "Anno", "ID"])
+        df_pb["Record Personale"] = df_pb["Record Personale"].apply(format_time)
+        df_progress = pd.DataFrame(
+            get_athlete_progress(nome), columns=["Gioco", "Anno", "Tempi", "Migliore dell'Anno", "Differenza"]
         )
-        
-        # --- Sezione Inserimento record in database2.db ---
-        if option_tab4 == "Inserisci Nuovo Tempo":
-            st.subheader("Inserisci Nuovo Tempo per Ragazzi")
-            nome = st.text_input("Nome Ragazzo", key="db2_nome_input")
-            # Input per minuti e secondi
-            minutes_value = st.number_input("Minuti", value=0, step=1, key="db2_minutes_input")
-            seconds_value = st.number_input("Secondi", value=0.0, format="%.2f", key="db2_seconds_input")
-            # Calcolo del tempo totale in secondi
-            total_time = minutes_value * 60 + seconds_value
-            
-            game_name = st.text_input("Nome del Gioco", key="db2_game_input")
-            # Menu delle categorie aggiornato, includendo "elementari"
-            category = st.selectbox(
-                "Categoria",
-                options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
-                key="db2_category_input"
-            )
-            # Se la categoria è tra quelle che richiedono di specificare il genere (elementari, medie, adolescenti)
+        df_progress["Migliore dell'Anno"] = df_progress["Migliore dell'Anno"].apply(format_time)
+        # Differenza negativa = miglioramento rispetto all'anno precedente
+        df_progress["Differenza"] = df_progress["Differenza"].apply(
+            lambda diff: "" if pd.isna(diff) else ("-" if diff < 0 else "+") + format_time(abs(diff))
+        )
+        df_results = pd.DataFrame(
+            get_athlete_results(nome), columns=["ID", "Tempo", "Gioco", "Categoria", "Sesso", "Anno"]
+        )
+        df_results["Tempo"] = df_results["Tempo"].apply(format_time)
+
+    st.markdown("**Record personali**")
+    st.dataframe(df_pb, hide_index=True)
+    st.markdown("**Andamento anno per anno**")
+    st.dataframe(df_progress, hide_index=True)
+    st.markdown(f"**Tutti i tempi ({len(df_results)})**")
+    st.dataframe(df_results, hide_index=True)
+
+
+def leaderboard_view(key):
+    """Podio e classifica completa a pagine di un gruppo dei tempi dei ragazzi."""
+    filtro_anno = st.selectbox(
+        "Seleziona Anno (oppure 'Tutti')",
+        options=year_options("results_kids"),
+        key=f"{key}_year"
+    )
+    # I gruppi con almeno un tempo sono quelli della classifica dei minimi
+    groups = sorted((game, category, gender) for game, category, _, gender, _ in get_min_times(filtro_anno))
+    if not groups:
+        st.info("Nessun dato disponibile per i criteri di ricerca.")
+        return
+    game, category, gender = st.selectbox(
+        "Gioco, categoria e genere",
+        options=groups,
+        format_func=lambda g: f"{g[0]} - {g[1]}" + ("" if g[2] == "NA" else f" ({g[2]})"),
+        key=f"{key}_group"
+    )
+    year = int(filtro_anno) if filtro_anno != "Tutti" else None
+    columns = ["Posizione", "Nome", "Tempo", "Distacco", "ID"]
+
+    def show(rows):
+        with profiling.section("dataframe"):
+            df = pd.DataFrame(rows, columns=columns)
+            df["Tempo"] = df["Tempo"].apply(format_time)
+            df["Distacco"] = df["Distacco"].apply(lambda gap: "+" + format_time(gap) if gap else "")
+        st.dataframe(df, hide_index=True)
+
+    st.markdown("**Podio**")
+    show(get_podium(game, category, gender, year))
+
+    st.markdown("**Classifica completa**")
+    # Cursori delle pagine visitate, come in paged_table
+    signature = (filtro_anno, game, category, gender)
+    if st.session_state.get(f"{key}_signature") != signature:
+        st.session_state[f"{key}_signature"] = signature
+        st.session_state[f"{key}_cursors"] = [None]
+    cursors = st.session_state[f"{key}_cursors"]
+    rows, next_cursor = get_leaderboard(game, category, gender, year, after=cursors[-1])
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("◀ Precedente", disabled=len(cursors) == 1, key=f"{key}_prev"):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.write(f"Pagina {len(cursors)}")
+    with col_next:
+        if st.button("Successiva ▶", disabled=next_cursor is None, key=f"{key}_next"):
+            cursors.append(next_cursor)
+            st.rerun()
+    show(rows)
+
+
+# ----- TAB 5: Gestione Nomi Ragazzi (inserimento, modifica ed eliminazione) -----
+def render_tab5():
+    st.header("Gestione Ragazzi: Inserimento, Modifica, Eliminazione e Visualizzazione")
+    
+    # Scelta dell'azione tramite radio button
+    option_tab5 = st.radio(
+        "Seleziona Azione",
+        [
+            "Inserisci Nuovo Record",
+            "Modifica/Elimina Record",
+            "Visualizza Nomi per Categoria, Stato e Gioco",
+            "Collega Nomi ai Tempi",
+        ],
+        key="option_tab5"
+    )
+    
+    # --- Sezione 1: Inserimento ---
+    if option_tab5 == "Inserisci Nuovo Record":
+        st.subheader("Inserisci Nuovo Ragazzo")
+        with st.form("insert_form", clear_on_submit=True):
+            first_name = st.text_input("Nome")
+            last_name = st.text_input("Cognome")
+            game = st.text_input("Gioco", help="Inserisci il nome del gioco")
+            category = st.selectbox("Categoria", 
+                                    options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
+                                    key="category_select")
+            # Se la categoria richiede di specificare il genere
             if category in ["elementari", "medie", "adolescenti"]:
-                gender = st.selectbox("Genere", options=["maschio", "femmina"], key="db2_gender_input")
+                gender = st.selectbox("Genere", options=["maschio", "femmina"], key="gender_select")
             else:
                 gender = "NA"
-            year = st.number_input("Anno", value=2025, step=1, key="db2_year_input")
+            # Selezione dello stato: Titolari o Riserve
+            status = st.selectbox("Stato", options=["Titolari", "Riserve"], key="status_select")
+            submit = st.form_submit_button("Inserisci Record")
+            if submit:
+                if first_name and last_name and game:
+                    add_player(first_name, last_name, game, category, gender, status)
+                    st.success(f"Record inserito: {first_name} {last_name}, gioco: {game}, categoria: {category}, genere: {gender}, stato: {status}.")
+                else:
+                    st.error("Compilare i campi obbligatori: Nome, Cognome e Gioco.")
+    
+    # --- Sezione 2: Modifica/Eliminazione ---
+    elif option_tab5 == "Modifica/Elimina Record":
+        st.subheader("Modifica o Elimina Record")
+        df = paged_table(
+            "players",
+            ["ID", "Nome", "Cognome", "Gioco", "Categoria", "Genere", "Stato"],
+            key="players_page"
+        )
+        if not df.empty:
+            record_ids = df["ID"].tolist()
+            selected_id = st.selectbox("Seleziona ID del record", record_ids, key="select_id_mod")
+            action = st.selectbox("Scegli azione", ["Modifica", "Elimina"], key="action_select")
+            selected_record = df[df["ID"] == selected_id].iloc[0]
             
-            if st.button("Inserisci Record", key="db2_insert_record"):
-                # Assicurati che la funzione insert_record_db2 sia definita per accettare anche il parametro "gender"
-                insert_record_db2(nome, total_time, game_name, category, year, gender)
-                st.success("Record inserito correttamente per il ragazzo.")
-        
-        # --- Sezione Modifica/Cancellazione record in database2.db ---
-        elif option_tab4 == "Modifica/Cancella Tempo":
-            st.subheader("Modifica o Cancella Record per Ragazzi")
-            records = get_records_db2()
-            if records:
-                # Assumendo che ora il record contenga anche il campo "Genere"
-                df = pd.DataFrame(records, columns=["ID", "Nome", "Tempo", "Gioco", "Categoria", "Genere", "Anno"])
-                st.dataframe(df)
-                record_ids = df["ID"].tolist()
-                selected_id = st.selectbox("Seleziona ID del record", record_ids, key="db2_select_record")
-                action = st.selectbox("Scegli azione", ["Modifica", "Elimina"], key="db2_action_select")
-                selected_record = df[df["ID"] == selected_id].iloc[0]
-                
-                if action == "Modifica":
-                    new_nome = st.text_input(
-                        "Nuovo Nome Ragazzo", 
-                        value=selected_record["Nome"], 
-                        key=f"update_db2_nome_{selected_id}"
-                    )
-                    # Calcola minuti e secondi dal tempo attuale
-                    current_minutes = int(float(selected_record["Tempo"]) // 60)
-                    current_seconds = float(selected_record["Tempo"]) - current_minutes * 60
-                    new_minutes = st.number_input(
-                        "Nuovi Minuti", 
-                        value=current_minutes, 
-                        step=1, 
-                        key=f"update_db2_minutes_{selected_id}"
-                    )
-                    new_seconds = st.number_input(
-                        "Nuovi Secondi", 
-                        value=current_seconds, 
-                        format="%.2f", 
-                        key=f"update_db2_seconds_{selected_id}"
-                    )
-                    new_time = new_minutes * 60 + new_seconds
-                    
-                    new_game_name = st.text_input(
-                        "Nuovo Nome del Gioco", 
-                        value=selected_record["Gioco"], 
-                        key=f"update_db2_game_{selected_id}"
-                    )
+            if action == "Modifica":
+                with st.form("update_form"):
+                    new_first_name = st.text_input("Nuovo Nome", value=selected_record["Nome"], key="upd_first_name")
+                    new_last_name = st.text_input("Nuovo Cognome", value=selected_record["Cognome"], key="upd_last_name")
+                    new_game = st.text_input("Nuovo Gioco", value=selected_record["Gioco"], key="upd_game")
                     new_category = st.selectbox(
-                        "Nuova Categoria", 
+                        "Nuova Categoria",
                         options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
                         index=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"].index(selected_record["Categoria"]),
-                        key=f"update_db2_category_{selected_id}"
+                        key="upd_category"
                     )
                     if new_category in ["elementari", "medie", "adolescenti"]:
-                        new_gender = st.selectbox(
-                            "Nuovo Genere", 
-                            options=["maschio", "femmina"],
-                            index=["maschio", "femmina"].index(selected_record["Genere"]) if selected_record["Genere"] in ["maschio", "femmina"] else 0,
-                            key=f"update_db2_gender_{selected_id}"
-                        )
+                        default_gender = selected_record["Genere"] if selected_record["Genere"] in ["maschio", "femmina"] else "maschio"
+                        new_gender = st.selectbox("Nuovo Genere", options=["maschio", "femmina"],
+                                                  index=["maschio", "femmina"].index(default_gender),
+                                                  key="upd_gender")
                     else:
-                        new_gender = None
-                    
-                    new_year = st.number_input(
-                        "Nuovo Anno", 
-                        value=int(selected_record["Anno"]), 
-                        step=1,
-                        key=f"update_db2_year_{selected_id}"
-                    )
-                    if st.button("Conferma Modifica", key=f"db2_confirm_update_{selected_id}"):
-                        update_record_db2(selected_id, new_nome, new_time, new_game_name, new_category, new_year, new_gender)
-                        st.success("Record modificato correttamente.")
-                elif action == "Elimina":
-                    if st.button("Conferma Eliminazione", key=f"db2_confirm_delete_{selected_id}"):
-                        delete_record_db2(selected_id)
-                        st.success("Record eliminato correttamente.")
-            else:
-                st.info("Nessun record presente nel database.")
-        
-        # --- Sezione Visualizzazione minimi per ogni gioco e categoria in database2.db ---
-        elif option_tab4 == "Visualizza Minimo per Gioco e Categoria":
-            st.subheader("Visualizza Tempo Minimo per Gioco e Categoria")
-            filtro_anno = st.selectbox(
-                "Seleziona Anno (oppure 'Tutti')", 
-                options=["Tutti", "2031", "2030", "2029", "2028", "2027", "2026", "2025", "2024", "2023"],
-                key="db2_filter_year"
-            )
-            min_results = get_min_times(filtro_anno)
-            if min_results:
-                # Includiamo anche il nome associato al tempo minimo
-                df_min = pd.DataFrame(min_results, columns=["Gioco", "Categoria", "Nome","Sesso","Tempo Minimo"])
-                st.dataframe(df_min)
-            else:
-                st.info("Nessun dato disponibile per i criteri di ricerca.")
+                        new_gender = "NA"
+                    new_status = st.selectbox("Nuovo Stato", options=["Titolari", "Riserve"],
+                                              index=["Titolari", "Riserve"].index(selected_record["Stato"]),
+                                              key="upd_status")
+                    update_submit = st.form_submit_button("Conferma Modifica")
+                    if update_submit:
+                        update_player(selected_id, new_first_name, new_last_name, new_game, new_category, new_gender, new_status)
+                        st.success("Record aggiornato con successo!")
+                        st.rerun()
+            elif action == "Elimina":
+                if st.button("Conferma Eliminazione", key="delete_btn"):
+                    delete_player(selected_id)
+                    st.success("Record eliminato con successo!")
+                    st.rerun()
+        else:
+            st.info("Nessun record trovato.")
+    
+    # --- Sezione 3: Visualizzazione dei nomi per Categoria, Stato e Gioco (divisi per gioco) ---
+    elif option_tab5 == "Visualizza Nomi per Categoria, Stato e Gioco":
+        st.subheader("Visualizza Nomi per Categoria, Stato e Gioco")
+        selected_cat = st.selectbox("Seleziona Categoria", 
+                                    options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
+                                    key="view_category")
+        # Recupera i record per la categoria selezionata (campo: Nome, Stato, Gioco)
+        players = get_players_by_category(selected_cat)
+        if players:
+            df = pd.DataFrame(players, columns=["Nome", "Stato", "Gioco"])
+            games = df["Gioco"].unique()
+            for game in games:
+                st.markdown(f"### Gioco: {game}")
+                subdf = df[df["Gioco"] == game]
+                titolari = subdf[subdf["Stato"] == "Titolari"]["Nome"].tolist()
+                riserve = subdf[subdf["Stato"] == "Riserve"]["Nome"].tolist()
+                
+                st.markdown("**Titolari:**")
+                if titolari:
+                    for nome in titolari:
+                        st.write(nome)
+                else:
+                    st.write("Nessun titolare per questo gioco.")
+                
+                st.markdown("**Riserve:**")
+                if riserve:
+                    for nome in riserve:
+                        st.write(nome)
+                else:
+                    st.write("Nessuna riserva per questo gioco.")
+        else:
+            st.info("Nessun record trovato per questa categoria.")
 
-    # ----- TAB 5: Gestione Nomi Ragazzi (inserimento, modifica ed eliminazione) -----
-    with tab5:
-        st.header("Gestione Ragazzi: Inserimento, Modifica, Eliminazione e Visualizzazione")
-        
-        # Scelta dell'azione tramite radio button
-        option_tab5 = st.radio(
-            "Seleziona Azione",
-            ["Inserisci Nuovo Record", "Modifica/Elimina Record", "Visualizza Nomi per Categoria, Stato e Gioco"],
-            key="option_tab5"
+    # --- Sezione 4: Collegamento dei nomi scritti in modo diverso nei tempi ---
+    elif option_tab5 == "Collega Nomi ai Tempi":
+        st.subheader("Collega Nomi ai Tempi")
+        link_view(key="links")
+
+
+# Proposte di collegamento mostrate per pagina
+LINKS_SHOWN = 20
+
+
+def link_view(key):
+    """Proposte di collegamento fra elenco nomi e nomi nei tempi, da accettare o scartare."""
+    st.caption(
+        "Ragazzi dei tempi che non compaiono nell'elenco nomi, con il nome più simile. "
+        "Collegando, i tempi passano al ragazzo dell'elenco e il nome diverso viene "
+        "riconosciuto anche negli inserimenti futuri."
+    )
+    proposals = cached_proposals()
+    if not proposals:
+        st.info("Nessun collegamento da proporre.")
+        return
+    st.write(f"Proposte: {len(proposals)}")
+    for proposal in proposals[:LINKS_SHOWN]:
+        pair = f"{proposal['player_id']}_{proposal['athlete_id']}"
+        col_names, col_accept, col_reject = st.columns([4, 1, 1])
+        with col_names:
+            st.write(
+                f"**{proposal['player']}** ({proposal['game']}, {proposal['category']}) ↔ "
+                f"**{proposal['athlete']}** ({proposal['results']} tempi) - "
+                f"somiglianza {proposal['score']:.0%}"
+            )
+        with col_accept:
+            if st.button("Collega", key=f"{key}_accept_{pair}"):
+                link_player_athlete(proposal["player_id"], proposal["athlete_id"])
+                st.rerun()
+        with col_reject:
+            if st.button("Scarta", key=f"{key}_reject_{pair}"):
+                reject_player_link(proposal["player_id"], proposal["athlete_id"])
+                st.rerun()
+
+
+# ----- Statistiche: andamento dei tempi negli anni -----
+STATS_SOURCES = {"Tempi": "results", "Tempi Ragazzi": "results_kids"}
+
+
+def render_stats():
+    st.header("Andamento dei Tempi negli Anni")
+    source = st.radio("Dati", options=list(STATS_SOURCES), horizontal=True, key="stats_source")
+    table = STATS_SOURCES[source]
+    # Statistiche pre-aggregate per anno: la lettura non dipende dal numero di tempi
+    groups = get_stats_groups(table)
+    if not groups:
+        st.info("Nessun tempo registrato.")
+        return
+    col1, col2 = st.columns(2)
+    with col1:
+        game = st.selectbox("Gioco", options=list(dict.fromkeys(g for g, _, _ in groups)), key="stats_game")
+    with col2:
+        categories = [(c, runs) for g, c, runs in groups if g == game]
+        category = st.selectbox(
+            "Categoria",
+            options=[c for c, _ in categories],
+            format_func=lambda c: f"{c} ({dict(categories)[c]} tempi)",
+            key="stats_category"
         )
-        
-        # --- Sezione 1: Inserimento ---
-        if option_tab5 == "Inserisci Nuovo Record":
-            st.subheader("Inserisci Nuovo Ragazzo")
-            with st.form("insert_form", clear_on_submit=True):
-                first_name = st.text_input("Nome")
-                last_name = st.text_input("Cognome")
-                game = st.text_input("Gioco", help="Inserisci il nome del gioco")
-                category = st.selectbox("Categoria", 
-                                        options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
-                                        key="category_select")
-                # Se la categoria richiede di specificare il genere
-                if category in ["elementari", "medie", "adolescenti"]:
-                    gender = st.selectbox("Genere", options=["maschio", "femmina"], key="gender_select")
+    with profiling.section("chart"):
+        png = trend_chart(table, game, category)
+    if png:
+        st.image(png)
+        st.caption("Linee: tempo migliore e mediano per anno. Barre: numero di tempi registrati.")
+
+
+# ----- Gestione Utenti (solo amministratori) -----
+def render_users():
+    st.header("Gestione Utenti")
+    users = list_users()
+    df = pd.DataFrame(users)
+    df.columns = ["Username", "Nome", "Amministratore", "Attivo"]
+    st.dataframe(df)
+
+    option_users = st.radio(
+        "Seleziona Azione",
+        ["Aggiungi Utente", "Abilita/Disabilita Utente", "Reimposta Password"],
+        key="users_action_radio"
+    )
+    if option_users == "Aggiungi Utente":
+        with st.form("add_user_form", clear_on_submit=True):
+            new_username = st.text_input("Username")
+            new_name = st.text_input("Nome")
+            new_password = st.text_input("Password", type="password")
+            new_is_admin = st.checkbox("Amministratore")
+            if st.form_submit_button("Aggiungi"):
+                if new_username and new_name and new_password:
+                    try:
+                        add_user(new_username, new_name, new_password, new_is_admin)
+                        st.success(f"Utente {new_username} creato.")
+                    except ValueError as exc:
+                        st.error(str(exc))
                 else:
-                    gender = "NA"
-                # Selezione dello stato: Titolari o Riserve
-                status = st.selectbox("Stato", options=["Titolari", "Riserve"], key="status_select")
-                submit = st.form_submit_button("Inserisci Record")
-                if submit:
-                    if first_name and last_name and game:
-                        add_player(first_name, last_name, game, category, gender, status)
-                        st.success(f"Record inserito: {first_name} {last_name}, gioco: {game}, categoria: {category}, genere: {gender}, stato: {status}.")
-                    else:
-                        st.error("Compilare i campi obbligatori: Nome, Cognome e Gioco.")
-        
-        # --- Sezione 2: Modifica/Eliminazione ---
-        elif option_tab5 == "Modifica/Elimina Record":
-            st.subheader("Modifica o Elimina Record")
-            players = get_all_players()
-            if players:
-                df = pd.DataFrame(players, columns=["ID", "Nome", "Cognome", "Gioco", "Categoria", "Genere", "Stato"])
-                st.dataframe(df)
-                record_ids = df["ID"].tolist()
-                selected_id = st.selectbox("Seleziona ID del record", record_ids, key="select_id_mod")
-                action = st.selectbox("Scegli azione", ["Modifica", "Elimina"], key="action_select")
-                selected_record = df[df["ID"] == selected_id].iloc[0]
-                
-                if action == "Modifica":
-                    with st.form("update_form"):
-                        new_first_name = st.text_input("Nuovo Nome", value=selected_record["Nome"], key="upd_first_name")
-                        new_last_name = st.text_input("Nuovo Cognome", value=selected_record["Cognome"], key="upd_last_name")
-                        new_game = st.text_input("Nuovo Gioco", value=selected_record["Gioco"], key="upd_game")
-                        new_category = st.selectbox(
-                            "Nuova Categoria",
-                            options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
-                            index=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"].index(selected_record["Categoria"]),
-                            key="upd_category"
-                        )
-                        if new_category in ["elementari", "medie", "adolescenti"]:
-                            default_gender = selected_record["Genere"] if selected_record["Genere"] in ["maschio", "femmina"] else "maschio"
-                            new_gender = st.selectbox("Nuovo Genere", options=["maschio", "femmina"],
-                                                      index=["maschio", "femmina"].index(default_gender),
-                                                      key="upd_gender")
-                        else:
-                            new_gender = "NA"
-                        new_status = st.selectbox("Nuovo Stato", options=["Titolari", "Riserve"],
-                                                  index=["Titolari", "Riserve"].index(selected_record["Stato"]),
-                                                  key="upd_status")
-                        update_submit = st.form_submit_button("Conferma Modifica")
-                        if update_submit:
-                            update_player(selected_id, new_first_name, new_last_name, new_game, new_category, new_gender, new_status)
-                            st.success("Record aggiornato con successo!")
-                            st.rerun()
-                elif action == "Elimina":
-                    if st.button("Conferma Eliminazione", key="delete_btn"):
-                        delete_player(selected_id)
-                        st.success("Record eliminato con successo!")
-                        st.rerun()
-            else:
-                st.info("Nessun record presente nel database.")
-        
-        # --- Sezione 3: Visualizzazione dei nomi per Categoria, Stato e Gioco (divisi per gioco) ---
-        elif option_tab5 == "Visualizza Nomi per Categoria, Stato e Gioco":
-            st.subheader("Visualizza Nomi per Categoria, Stato e Gioco")
-            selected_cat = st.selectbox("Seleziona Categoria", 
-                                        options=["materna", "elementari", "medie", "adolescenti", "adulti", "donne"],
-                                        key="view_category")
-            # Recupera i record per la categoria selezionata (campo: Nome, Stato, Gioco)
-            players = get_players_by_category(selected_cat)
-            if players:
-                df = pd.DataFrame(players, columns=["Nome", "Stato", "Gioco"])
-                games = df["Gioco"].unique()
-                for game in games:
-                    st.markdown(f"### Gioco: {game}")
-                    subdf = df[df["Gioco"] == game]
-                    titolari = subdf[subdf["Stato"] == "Titolari"]["Nome"].tolist()
-                    riserve = subdf[subdf["Stato"] == "Riserve"]["Nome"].tolist()
-                    
-                    st.markdown("**Titolari:**")
-                    if titolari:
-                        for nome in titolari:
-                            st.write(nome)
-                    else:
-                        st.write("Nessun titolare per questo gioco.")
-                    
-                    st.markdown("**Riserve:**")
-                    if riserve:
-                        for nome in riserve:
-                            st.write(nome)
-                    else:
-                        st.write("Nessuna riserva per questo gioco.")
-            else:
-                st.info("Nessun record trovato per questa categoria.")
+                    st.error("Compilare i campi obbligatori: Username, Nome e Password.")
+    elif option_users == "Abilita/Disabilita Utente":
+        usernames = [u["username"] for u in users]
+        selected = st.selectbox("Utente", usernames, key="users_toggle_select")
+        selected_user = next(u for u in users if u["username"] == selected)
+        if selected == current_user["username"]:
+            st.info("Non puoi disabilitare il tuo stesso utente.")
+        elif selected_user["active"]:
+            if st.button("Disabilita", key="users_disable"):
+                set_user_active(selected, False)
+                st.rerun()
+        elif st.button("Abilita", key="users_enable"):
+            set_user_active(selected, True)
+            st.rerun()
+    elif option_users == "Reimposta Password":
+        with st.form("reset_password_form", clear_on_submit=True):
+            selected = st.selectbox("Utente", [u["username"] for u in users])
+            new_password = st.text_input("Nuova Password", type="password")
+            if st.form_submit_button("Reimposta"):
+                if new_password:
+                    reset_password(selected, new_password)
+                    st.success(f"Password di {selected} reimpostata.")
+                else:
+                    st.error("Inserire la nuova password.")
+
+
+# --- Definizione dell'app Streamlit e delle sue viste ---
+
+def debug_panel():
+    """Pannello per gli amministratori con i tempi di query e rerun (vedi profiling.py)."""
+    with st.expander("Debug prestazioni"):
+        enabled = st.checkbox("Strumentazione attiva (per tutte le sessioni)",
+                              value=profiling.is_enabled(), key="profiling_enabled")
+        if enabled != profiling.is_enabled():
+            profiling.set_enabled(enabled)
+            st.caption("Le misure partono dal prossimo rerun.")
+        if not enabled:
+            return
+        last = profiling.last_rerun()
+        if last:
+            st.write(
+                f"Ultimo rerun di **{last['view']}**: {last['total_ms']:.1f} ms "
+                f"(query {last['query_ms']:.1f} ms, "
+                f"DataFrame {last['sections_ms'].get('dataframe', 0):.1f} ms, "
+                f"resto {last['other_ms']:.1f} ms)"
+            )
+            if last["query_log"]:
+                st.dataframe(pd.DataFrame(last["query_log"]))
+        summary = profiling.summary()
+        if summary:
+            st.write("Latenza dei rerun per vista")
+            st.dataframe(pd.DataFrame(summary))
+        st.caption(f"Log strutturato: {profiling.LOG_FILE}")
+
+
+VIEWS = {
+    "Inserisci Tempi": render_tab1,
+    "Modifica/Cancella Tempi": render_tab2,
+    "Visualizza Tempi": render_tab3,
+    "Gestione Ragazzi e Visualizza Minimi": render_tab4,
+    "Nomi": render_tab5,
+    "Statistiche": render_stats,
+}
+
+
+def main():
+    st.title("Gestione Tempi")
+
+    # A differenza di st.tabs, che esegue il corpo di tutte le schede a ogni rerun,
+    # la navigazione esegue solo la vista attiva: le query e i DataFrame delle
+    # altre viste non vengono calcolati.
+    views = dict(VIEWS)
+    if current_user["is_admin"]:
+        views["Utenti"] = render_users
+    active_view = st.radio(
+        "Sezione",
+        options=list(views),
+        horizontal=True,
+        label_visibility="collapsed",
+        key="active_view"
+    )
+    with profiling.profile_view(active_view, current_user["username"]):
+        views[active_view]()
+    if current_user["is_admin"]:
+        debug_panel()
+
 
 if __name__ == '__main__':
     main()
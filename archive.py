@@ -0,0 +1,245 @@
+"""Archivi per anno delle stagioni concluse.
+
+I tempi (results e results_kids) di una stagione conclusa vengono spostati da
+DATABASE in un file per anno, archive/<database>-<anno>.db, con lo stesso schema
+e le stesse chiavi: tabelle, viste, classifica, record personali e statistiche
+dei soli tempi di quell'anno. Il database vivo resta piccolo e le scritture
+della stagione in corso non condividono più le pagine con lo storico.
+
+Le letture di db.py passano da db.partitions: una query filtrata per anno va
+solo al database che lo contiene, una su tutti gli anni è eseguita su ognuno e
+i risultati sono fusi. Gli archivi sono aperti in sola lettura (mode=ro,
+immutable) con un pool di connessioni per file. Uso da riga di comando:
+
+    python archive.py archive 2023          # sposta il 2023 in archive/treponti-2023.db
+    python archive.py list
+    python archive.py restore 2023          # riporta il 2023 nel database vivo
+
+Lo spostamento avviene in due tempi: l'archivio viene scritto accanto con un
+nome provvisorio, verificato con PRAGMA integrity_check e rinominato; poi, in
+un'unica transazione su DATABASE, le righe vengono confrontate con quelle
+dell'archivio, eliminate e l'anno registrato in db.archives. Da quel momento i
+trigger rifiutano nuovi tempi per quell'anno; per correggerli si riporta
+l'anno nel database vivo con restore.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from backup import integrity_errors
+from db import (
+    ARCHIVE_DIR,
+    BEST_TIMES_SCHEMA,
+    BUSY_TIMEOUT,
+    DATABASE,
+    INDEXES,
+    PERSONAL_BESTS_SCHEMA,
+    SCHEMA,
+    TIME_TABLES,
+    YEAR_STATS_SCHEMA,
+    archive_file,
+    archive_uri,
+    create_fts_index,
+    init_databases,
+    rebuild_best_times,
+    rebuild_personal_bests,
+    rebuild_year_stats,
+    remove_archived_year,
+    restore_archived_year,
+)
+from formats import validate_year
+
+TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S"
+
+# Righe dell'anno copiate nell'archivio: tutte le dimensioni (poche righe) e
+# gli atleti che compaiono nei tempi dell'anno, con le stesse chiavi
+_COPY = (
+    "INSERT INTO games SELECT * FROM live.games",
+    "INSERT INTO categories SELECT * FROM live.categories",
+    "INSERT INTO athletes SELECT * FROM live.athletes "
+    "WHERE id IN (SELECT athlete_id FROM live.results_kids WHERE year = :year)",
+    "INSERT INTO results SELECT * FROM live.results WHERE year = :year",
+    "INSERT INTO results_kids SELECT * FROM live.results_kids WHERE year = :year",
+)
+
+
+class ArchiveError(Exception):
+    """Archiviazione o ripristino di un anno non riuscito."""
+
+
+def _live_connection(path=DATABASE):
+    """Connessione a DATABASE con le transazioni gestite a mano (ATTACH e BEGIN IMMEDIATE)."""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, uri=True)
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+def archives(path=DATABASE):
+    """Anni archiviati: (anno, file, righe di results, righe di results_kids, data)."""
+    conn = _live_connection(path)
+    try:
+        return conn.execute(
+            "SELECT year, path, results, results_kids, created FROM archives ORDER BY year"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def build_archive(year, target, source=DATABASE):
+    """Scrive in `target` l'archivio dei tempi di `year` letti da `source`, verificato."""
+    partial = target + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    conn = sqlite3.connect(partial, uri=True)
+    try:
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        conn.execute("ATTACH DATABASE ? AS live", (f"file:{source}?mode=ro",))
+        # Una sola transazione: tutte le letture vedono lo stesso stato di DATABASE
+        with conn:
+            for statement in _COPY:
+                conn.execute(statement, {"year": year})
+        conn.execute("DETACH DATABASE live")
+        with conn:
+            for statement in INDEXES + BEST_TIMES_SCHEMA + PERSONAL_BESTS_SCHEMA + YEAR_STATS_SCHEMA:
+                conn.execute(statement)
+            rebuild_best_times(conn)
+            rebuild_personal_bests(conn)
+            rebuild_year_stats(conn)
+            # Servono alla ricerca per nome di gioco e atleta dei filtri
+            for table in ("games", "athletes"):
+                create_fts_index(conn, table)
+        conn.execute("PRAGMA optimize")
+        # File compatto e senza spazio libero: non verrà più scritto
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    errors = integrity_errors(partial)
+    if errors:
+        os.remove(partial)
+        raise ArchiveError(f"archivio del {year} non integro: {'; '.join(errors[:5])}")
+    os.replace(partial, target)
+
+
+def _differences(conn, table, year):
+    """Righe di `year` diverse fra DATABASE e l'archivio collegato (0 se sono identiche)."""
+    return conn.execute(
+        f"SELECT (SELECT COUNT(*) FROM (SELECT * FROM main.{table} WHERE year = ? "
+        f"                               EXCEPT SELECT * FROM archive.{table})) "
+        f"     + (SELECT COUNT(*) FROM (SELECT * FROM archive.{table} "
+        f"                               EXCEPT SELECT * FROM main.{table} WHERE year = ?))",
+        (year, year)
+    ).fetchone()[0]
+
+
+def archive_year(year, directory=ARCHIVE_DIR, vacuum=True):
+    """
+    Sposta i tempi di `year` da DATABASE al suo archivio e restituisce le righe
+    spostate per tabella. Con `vacuum` il file di DATABASE viene poi compattato.
+    """
+    year = validate_year(year)
+    if year >= time.localtime().tm_year:
+        raise ArchiveError(f"la stagione {year} non è conclusa")
+    if any(row[0] == year for row in archives()):
+        raise ArchiveError(f"l'anno {year} è già archiviato")
+    os.makedirs(directory, exist_ok=True)
+    path = archive_file(year, directory)
+    build_archive(year, path)
+
+    conn = _live_connection()
+    try:
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_uri(path),))
+        # IMMEDIATE: nessuno scrive fra il confronto e l'eliminazione
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in TIME_TABLES:
+                if _differences(conn, table, year):
+                    raise ArchiveError(f"i tempi del {year} sono cambiati durante la copia: riprovare")
+            removed = remove_archived_year(conn, year)
+            conn.execute(
+                "INSERT INTO archives (year, path, results, results_kids, created) VALUES (?, ?, ?, ?, ?)",
+                (year, path, removed["results"], removed["results_kids"], time.strftime(TIMESTAMP_FORMAT))
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    except BaseException:
+        conn.close()
+        os.remove(path)
+        raise
+    if vacuum:
+        conn.execute("DETACH DATABASE archive")
+        conn.execute("VACUUM")
+    conn.close()
+    return removed
+
+
+def restore_year(year):
+    """
+    Riporta in DATABASE i tempi di `year` dal suo archivio, che poi viene
+    eliminato; restituisce le righe riportate per tabella.
+    """
+    year = validate_year(year)
+    entry = [row for row in archives() if row[0] == year]
+    if not entry:
+        raise ArchiveError(f"l'anno {year} non è archiviato")
+    _, path, *expected, _ = entry[0]
+    errors = integrity_errors(path)
+    if errors:
+        raise ArchiveError(f"archivio del {year} non integro: {'; '.join(errors[:5])}")
+
+    conn = _live_connection()
+    try:
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_uri(path),))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            restored = restore_archived_year(conn, year)
+            if [restored[table] for table in TIME_TABLES] != expected:
+                raise ArchiveError(f"righe riportate {restored}, attese {expected}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    os.remove(path)
+    return restored
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archivi per anno delle stagioni concluse.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    move = commands.add_parser("archive", help="sposta i tempi di un anno nel suo archivio")
+    move.add_argument("year", type=int)
+    move.add_argument("--dir", default=ARCHIVE_DIR, help=f"cartella degli archivi (default: {ARCHIVE_DIR})")
+    move.add_argument("--no-vacuum", action="store_true", help="non compattare il database vivo")
+    commands.add_parser("list", help="elenca gli anni archiviati")
+    back = commands.add_parser("restore", help="riporta i tempi di un anno nel database vivo")
+    back.add_argument("year", type=int)
+    args = parser.parse_args(argv)
+
+    init_databases()
+    try:
+        if args.command == "archive":
+            moved = archive_year(args.year, args.dir, vacuum=not args.no_vacuum)
+            print(f"Archiviato il {args.year}: {moved['results']} tempi, {moved['results_kids']} tempi ragazzi")
+        elif args.command == "list":
+            for year, path, results, results_kids, created in archives():
+                size = os.path.getsize(path) if os.path.exists(path) else "MANCANTE"
+                print(f"{year}  {path}  {results} + {results_kids} righe  {size} byte  ({created})")
+        elif args.command == "restore":
+            restored = restore_year(args.year)
+            print(f"Riportato il {args.year}: {restored['results']} tempi, "
+                  f"{restored['results_kids']} tempi ragazzi")
+    except (ArchiveError, ValueError) as exc:
+        print(f"Errore: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""Archivio persistente degli utenti, verifica delle password e token di sessione.
+
+Gli hash bcrypt sono calcolati una sola volta, quando un utente viene creato o
+la sua password reimpostata, e salvati nella tabella `users`: l'apertura di una
+nuova sessione non esegue alcun hash. Le verifiche al login girano in un pool
+limitato di thread, con un limite ai tentativi falliti per utente, e un token
+firmato permette di riprendere la sessione dopo un refresh senza rifare bcrypt.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from db import DATABASE_USERS, cached_query, execute, query
+
+# Fattore di costo di bcrypt per i nuovi hash (configurabile da variabile d'ambiente)
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+# Thread che eseguono bcrypt al login e verifiche in attesa oltre le quali si rifiuta
+LOGIN_WORKERS = int(os.environ.get("LOGIN_WORKERS", max(2, (os.cpu_count() or 2) // 2)))
+LOGIN_QUEUE_LIMIT = LOGIN_WORKERS * 8
+LOGIN_TIMEOUT = 30.0
+
+# Tentativi falliti consecutivi prima del blocco, e durata del primo blocco
+# (raddoppia a ogni ulteriore errore)
+MAX_FAILED_ATTEMPTS = 5
+LOCKOUT_SECONDS = 30
+
+# Validità dei token di sessione
+SESSION_TTL = int(os.environ.get("SESSION_TTL_HOURS", "12")) * 3600
+
+# Utenti creati al primo avvio, quando la tabella è vuota
+DEFAULT_USERS = (
+    ("mattia", "Mattia", "Dorz", True),
+    ("luca", "Luca", "password123", False),
+    ("giulia", "Giulia", "secret456", False),
+)
+
+
+def hash_password(plain_password, rounds=None):
+    """Calcola l'hash bcrypt della password con il fattore di costo configurato."""
+    return bcrypt.hashpw(plain_password.encode("utf-8"), bcrypt.gensalt(rounds or BCRYPT_ROUNDS))
+
+
+def verify_password(plain_password, hashed_password):
+    """Verifica se la password in chiaro corrisponde all'hash salvato."""
+    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password)
+
+
+def hash_rounds(hashed_password):
+    """Fattore di costo con cui è stato calcolato un hash bcrypt ($2b$12$...)."""
+    return int(hashed_password.split(b"$")[2])
+
+
+def ensure_default_users():
+    """Popola la tabella con gli utenti predefiniti se è vuota (solo al primo avvio)."""
+    if cached_query(DATABASE_USERS, "SELECT 1 FROM users LIMIT 1"):
+        return
+    for username, name, password, is_admin in DEFAULT_USERS:
+        # OR IGNORE: due sessioni possono arrivare qui insieme al primo avvio
+        execute(
+            DATABASE_USERS,
+            "INSERT OR IGNORE INTO users (username, name, password_hash, is_admin, active) "
+            "VALUES (?, ?, ?, ?, 1)",
+            (username, name, hash_password(password), int(is_admin))
+        )
+
+
+def _as_dict(row):
+    username, name, password_hash, is_admin, active = row
+    return {
+        "username": username,
+        "name": name,
+        "password": password_hash,
+        "is_admin": bool(is_admin),
+        "active": bool(active),
+    }
+
+
+def get_user(username):
+    """Utente con lo username indicato, oppure None. Letto dalla cache condivisa."""
+    rows = cached_query(
+        DATABASE_USERS,
+        "SELECT username, name, password_hash, is_admin, active FROM users WHERE username=?",
+        (username,)
+    )
+    return _as_dict(rows[0]) if rows else None
+
+
+def list_users():
+    """Tutti gli utenti (senza hash delle password)."""
+    rows = cached_query(DATABASE_USERS, "SELECT username, name, is_admin, active FROM users ORDER BY username")
+    return [
+        {"username": username, "name": name, "is_admin": bool(is_admin), "active": bool(active)}
+        for username, name, is_admin, active in rows
+    ]
+
+
+def add_user(username, name, password, is_admin=False):
+    """Crea un nuovo utente. Solleva ValueError se lo username esiste già."""
+    if get_user(username) is not None:
+        raise ValueError(f"l'utente {username!r} esiste già")
+    execute(
+        DATABASE_USERS,
+        "INSERT INTO users (username, name, password_hash, is_admin, active) VALUES (?, ?, ?, ?, 1)",
+        (username, name, hash_password(password), int(is_admin))
+    )
+
+
+def set_user_active(username, active):
+    """Abilita o disabilita l'accesso di un utente."""
+    execute(DATABASE_USERS, "UPDATE users SET active=? WHERE username=?", (int(active), username))
+
+
+def reset_password(username, new_password):
+    """Reimposta la password di un utente."""
+    execute(
+        DATABASE_USERS,
+        "UPDATE users SET password_hash=? WHERE username=?",
+        (hash_password(new_password), username)
+    )
+
+
+def authenticate(username, password):
+    """
+    Restituisce l'utente se le credenziali sono valide e l'utente è attivo, altrimenti None.
+    Se l'hash salvato usa un fattore di costo diverso da BCRYPT_ROUNDS viene
+    ricalcolato ora, che la password in chiaro è disponibile: l'utente restituito
+    contiene già il nuovo hash, con cui va firmato il token di sessione.
+    """
+    user = get_user(username)
+    if user is None or not user["active"]:
+        return None
+    if not verify_password(password, user["password"]):
+        return None
+    if hash_rounds(user["password"]) != BCRYPT_ROUNDS:
+        reset_password(username, password)
+        user = get_user(username)
+    return user
+
+
+# --- Verifica del login in un pool limitato, con limite ai tentativi ---
+
+class LoginThrottled(Exception):
+    """Troppi tentativi falliti per l'utente: riprovare dopo `retry_after` secondi."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"riprovare tra {int(retry_after) + 1} secondi")
+        self.retry_after = retry_after
+
+
+class LoginBusy(Exception):
+    """Troppe verifiche in coda: il server è sotto carico."""
+
+
+_login_executor = ThreadPoolExecutor(max_workers=LOGIN_WORKERS, thread_name_prefix="login")
+_login_slots = threading.BoundedSemaphore(LOGIN_QUEUE_LIMIT)
+_failures = {}
+_failures_lock = threading.Lock()
+
+
+def _check_throttle(username):
+    with _failures_lock:
+        count, locked_until = _failures.get(username, (0, 0.0))
+    remaining = locked_until - time.monotonic()
+    if remaining > 0:
+        raise LoginThrottled(remaining)
+
+
+def _record_attempt(username, success):
+    with _failures_lock:
+        if success:
+            _failures.pop(username, None)
+            return
+        count, _ = _failures.get(username, (0, 0.0))
+        count += 1
+        locked_until = 0.0
+        if count >= MAX_FAILED_ATTEMPTS:
+            locked_until = time.monotonic() + LOCKOUT_SECONDS * 2 ** (count - MAX_FAILED_ATTEMPTS)
+        _failures[username] = (count, locked_until)
+        # Evita che username inventati facciano crescere il dizionario senza limite
+        if len(_failures) > 10_000:
+            now = time.monotonic()
+            for name in [n for n, (_, until) in _failures.items() if until < now]:
+                del _failures[name]
+
+
+def check_login(username, password):
+    """
+    Verifica le credenziali in un thread del pool di login e restituisce l'utente
+    o None. Solleva LoginThrottled se l'utente è temporaneamente bloccato e
+    LoginBusy se ci sono già troppe verifiche in attesa.
+    """
+    _check_throttle(username)
+    if not _login_slots.acquire(blocking=False):
+        raise LoginBusy("troppi accessi contemporanei, riprovare tra qualche secondo")
+    try:
+        future = _login_executor.submit(authenticate, username, password)
+    except BaseException:
+        _login_slots.release()
+        raise
+    future.add_done_callback(lambda _: _login_slots.release())
+    user = future.result(timeout=LOGIN_TIMEOUT)
+    _record_attempt(username, user is not None)
+    return user
+
+
+# --- Token di sessione firmati ---
+
+_secret = None
+_secret_lock = threading.Lock()
+
+
+def _session_secret():
+    """Chiave di firma: da SESSION_SECRET oppure generata una volta e salvata in users.db."""
+    global _secret
+    if _secret is None:
+        with _secret_lock:
+            if _secret is None:
+                value = os.environ.get("SESSION_SECRET")
+                if not value:
+                    execute(
+                        DATABASE_USERS,
+                        "INSERT OR IGNORE INTO settings (key, value) VALUES ('session_secret', ?)",
+                        (secrets.token_hex(32),)
+                    )
+                    value = query(DATABASE_USERS, "SELECT value FROM settings WHERE key='session_secret'")[0][0]
+                _secret = value.encode("utf-8")
+    return _secret
+
+
+def _signature(username, expires, password_hash):
+    # L'hash della password fa parte del messaggio firmato: reimpostare la
+    # password invalida i token già emessi.
+    message = f"{username}|{expires}|".encode("utf-8") + password_hash
+    return hmac.new(_session_secret(), message, hashlib.sha256).hexdigest()
+
+
+def issue_session_token(user, ttl=SESSION_TTL):
+    """Token firmato e con scadenza che identifica l'utente."""
+    expires = int(time.time()) + ttl
+    encoded = base64.urlsafe_b64encode(user["username"].encode("utf-8")).decode("ascii").rstrip("=")
+    return f"{encoded}.{expires}.{_signature(user['username'], expires, user['password'])}"
+
+
+def verify_session_token(token):
+    """Restituisce l'utente del token se firma e scadenza sono valide e l'utente è attivo."""
+    try:
+        encoded, expires, signature = token.split(".")
+        username = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode("utf-8")
+        expires = int(expires)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if expires < time.time():
+        return None
+    user = get_user(username)
+    if user is None or not user["active"]:
+        return None
+    if not hmac.compare_digest(signature, _signature(username, expires, user["password"])):
+        return None
+    return user
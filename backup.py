@@ -0,0 +1,265 @@
+"""Backup a caldo dei database, senza fermare l'app.
+
+Le copie sono fatte con l'API di backup di SQLite a piccoli blocchi di pagine,
+con una breve pausa fra un blocco e l'altro: l'app continua a leggere e
+scrivere durante la copia. Ogni copia viene scritta con un nome provvisorio,
+verificata con PRAGMA integrity_check e solo allora rinominata come istantanea
+con data e ora; delle istantanee di ogni database restano le BACKUP_KEEP più
+recenti. Uso da riga di comando:
+
+    python backup.py backup                  # una copia di tutti i database
+    python backup.py backup --every 900      # una copia ogni 15 minuti
+    python backup.py list
+    python backup.py verify backups/treponti-20250601-101500.db
+    python backup.py restore backups/treponti-20250601-101500.db
+
+Il ripristino verifica l'istantanea, salva prima una copia dello stato attuale
+e poi la ricopia sul database con la stessa API, anche ad app avviata: le
+sessioni vedono i nuovi dati alla lettura successiva (PRAGMA data_version).
+
+Gli archivi per anno (vedi archive.py) non cambiano più dopo la creazione: a
+ogni backup vengono copiati in <cartella>/archive solo se mancano o sono
+diversi dall'ultima copia.
+"""
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import time
+
+from db import ARCHIVE_DIR, BUSY_TIMEOUT, DATABASE, DATABASE_USERS
+
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "backups")
+
+# Database copiati a ogni backup
+DATABASES = (DATABASE, DATABASE_USERS)
+
+# Pagine copiate per passo e pausa fra due passi (secondi)
+BACKUP_PAGES = 256
+BACKUP_PAUSE = 0.005
+
+# Ripartenze tollerate prima di copiare tutto in un solo passo: se un'altra
+# connessione scrive durante la copia, SQLite la fa ripartire da capo
+MAX_RESTARTS = 3
+
+# Istantanee conservate per ogni database
+BACKUP_KEEP = 24
+
+TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S"
+
+# Nome di un'istantanea: <database>-<data>-<ora>[-pre-restore].db
+SNAPSHOT_NAME = re.compile(r"^(?P<stem>.+)-\d{8}-\d{6}(?P<safety>-pre-restore)?\.db$")
+PRE_RESTORE = "-pre-restore"
+
+
+class BackupError(Exception):
+    """Copia non riuscita o istantanea non valida."""
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _copy(source, target, pages=BACKUP_PAGES, pause=BACKUP_PAUSE):
+    """
+    Copia `source` in `target` a blocchi di `pages` pagine. Se la copia riparte
+    troppe volte per le scritture concorrenti, la rifà in un solo passo: con WAL
+    la lettura non blocca gli scrittori, quindi anche così l'app non si ferma.
+    """
+    restarts = 0
+    previous = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, previous
+        if previous is not None and remaining > previous:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _Restarted()
+        previous = remaining
+        time.sleep(pause)
+
+    try:
+        source.backup(target, pages=pages, progress=progress)
+    except _Restarted:
+        source.backup(target, pages=-1)
+
+
+def integrity_errors(path):
+    """Problemi trovati da PRAGMA integrity_check (lista vuota se il file è integro)."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as exc:
+        return [str(exc)]
+    finally:
+        conn.close()
+    return [] if rows == ["ok"] else rows
+
+
+def snapshot_name(path, suffix=""):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}-{time.strftime(TIMESTAMP_FORMAT)}{suffix}.db"
+
+
+def backup_database(path, directory=BACKUP_DIR, keep=BACKUP_KEEP, suffix=""):
+    """Crea un'istantanea verificata di `path` in `directory` e ne restituisce il percorso."""
+    if not os.path.exists(path):
+        raise BackupError(f"database inesistente: {path}")
+    os.makedirs(directory, exist_ok=True)
+    final = os.path.join(directory, snapshot_name(path, suffix))
+    partial = final + ".partial"
+    source = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    target = sqlite3.connect(partial)
+    try:
+        _copy(source, target)
+        # L'istantanea è un file unico, senza -wal/-shm accanto
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+        source.close()
+    errors = integrity_errors(partial)
+    if errors:
+        os.remove(partial)
+        raise BackupError(f"copia di {path} non integra: {'; '.join(errors[:5])}")
+    os.replace(partial, final)
+    if keep:
+        rotate(path, directory, keep)
+    return final
+
+
+def snapshots(path, directory=BACKUP_DIR, safety=True):
+    """Istantanee di `path` in `directory`, dalla più recente (con o senza le copie pre-ripristino)."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if not os.path.isdir(directory):
+        return []
+    names = []
+    for name in os.listdir(directory):
+        match = SNAPSHOT_NAME.match(name)
+        if match and match["stem"] == stem and (safety or not match["safety"]):
+            names.append(name)
+    # Il nome contiene data e ora nel formato ordinabile TIMESTAMP_FORMAT
+    return [os.path.join(directory, n) for n in sorted(names, reverse=True)]
+
+
+def rotate(path, directory=BACKUP_DIR, keep=BACKUP_KEEP):
+    """Elimina le istantanee periodiche di `path` oltre le `keep` più recenti."""
+    for old in snapshots(path, directory, safety=False)[keep:]:
+        os.remove(old)
+
+
+def backup_archives(directory=BACKUP_DIR, archives=ARCHIVE_DIR):
+    """Copia gli archivi per anno nuovi o cambiati in `directory`/archive; restituisce le copie."""
+    if not os.path.isdir(archives):
+        return []
+    target_dir = os.path.join(directory, "archive")
+    copied = []
+    for name in sorted(os.listdir(archives)):
+        if not name.endswith(".db"):
+            continue
+        source = os.path.join(archives, name)
+        target = os.path.join(target_dir, name)
+        if os.path.exists(target):
+            old, new = os.stat(target), os.stat(source)
+            if (old.st_size, old.st_mtime) == (new.st_size, new.st_mtime):
+                continue
+        os.makedirs(target_dir, exist_ok=True)
+        # copy2 conserva la data di modifica usata nel confronto
+        shutil.copy2(source, target + ".partial")
+        errors = integrity_errors(target + ".partial")
+        if errors:
+            os.remove(target + ".partial")
+            raise BackupError(f"copia di {source} non integra: {'; '.join(errors[:5])}")
+        os.replace(target + ".partial", target)
+        copied.append(target)
+    return copied
+
+
+def backup_all(directory=BACKUP_DIR, keep=BACKUP_KEEP):
+    """Istantanea di ogni database esistente e copia degli archivi; restituisce i percorsi creati."""
+    created = [backup_database(path, directory, keep) for path in DATABASES if os.path.exists(path)]
+    return created + backup_archives(directory)
+
+
+def restore(snapshot, path=None, directory=BACKUP_DIR):
+    """
+    Ripristina `snapshot` sul database `path` (di default quello da cui è stata
+    presa, ricavato dal nome). Restituisce la copia di sicurezza dello stato
+    precedente, oppure None se il database non esisteva.
+    """
+    if path is None:
+        match = SNAPSHOT_NAME.match(os.path.basename(snapshot))
+        matches = [
+            p for p in DATABASES
+            if match and os.path.splitext(os.path.basename(p))[0] == match["stem"]
+        ]
+        if not matches:
+            raise BackupError(f"database di destinazione non riconosciuto per {snapshot}")
+        path = matches[0]
+    errors = integrity_errors(snapshot)
+    if errors:
+        raise BackupError(f"istantanea non integra: {'; '.join(errors[:5])}")
+    # Esclusa dalla rotazione: resta finché non viene eliminata a mano
+    safety = backup_database(path, directory, keep=0, suffix=PRE_RESTORE) if os.path.exists(path) else None
+    source = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+    target = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    try:
+        # Un solo passo: le altre connessioni vedono o i dati vecchi o i nuovi
+        source.backup(target)
+        target.execute("PRAGMA journal_mode=WAL")
+    finally:
+        target.close()
+        source.close()
+    return safety
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backup a caldo e ripristino dei database.")
+    parser.add_argument("--dir", default=BACKUP_DIR, help=f"cartella delle istantanee (default: {BACKUP_DIR})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("backup", help="crea un'istantanea di ogni database")
+    run.add_argument("--every", type=float, help="ripete il backup ogni tanti secondi")
+    run.add_argument("--keep", type=int, default=BACKUP_KEEP,
+                     help=f"istantanee da conservare per database (default: {BACKUP_KEEP})")
+    commands.add_parser("list", help="elenca le istantanee")
+    verify = commands.add_parser("verify", help="controlla l'integrità di un'istantanea")
+    verify.add_argument("snapshot")
+    back = commands.add_parser("restore", help="ripristina un'istantanea")
+    back.add_argument("snapshot")
+    back.add_argument("--database", help="database da sovrascrivere (default: ricavato dal nome)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "backup":
+            while True:
+                for created in backup_all(args.dir, args.keep):
+                    print(f"Creato {created}")
+                if not args.every:
+                    break
+                time.sleep(args.every)
+        elif args.command == "list":
+            for path in DATABASES:
+                for snapshot in snapshots(path, args.dir):
+                    print(f"{snapshot}  {os.path.getsize(snapshot)} byte")
+        elif args.command == "verify":
+            errors = integrity_errors(args.snapshot)
+            for error in errors:
+                print(error, file=sys.stderr)
+            print("Integra" if not errors else "NON integra")
+            return 1 if errors else 0
+        elif args.command == "restore":
+            safety = restore(args.snapshot, args.database, args.dir)
+            if safety:
+                print(f"Stato precedente salvato in {safety}")
+            print(f"Ripristinato {args.snapshot}")
+    except BackupError as exc:
+        print(f"Errore: {exc}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+"""Benchmark delle funzioni di accesso ai dati e delle viste dell'app.
+
+Per ogni dimensione richiesta crea, in una cartella temporanea, un database con
+dati sintetici generati da un seme fisso (stesso seme = stessi dati), misura le
+funzioni di db.py e i rerun completi dello script con AppTest di Streamlit e
+scrive i risultati in JSON. Uso da riga di comando:
+
+    python benchmark.py --sizes 10000 100000 --output bench.json
+    python benchmark.py --sizes 10000 --baseline bench.json
+
+Ogni dimensione gira in un processo separato, così pool di connessioni, cache
+e stato di Streamlit non passano da una misura all'altra.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+SIZES = (10_000, 100_000, 1_000_000)
+SEED = 42
+REPEAT = 5
+CHUNK_SIZE = 20_000
+
+# Rallentamento oltre il quale il confronto con --baseline segnala una regressione
+TOLERANCE = 1.2
+
+GAMES = [f"{name} {n}" for name in ("Staffetta", "Corsa", "Sacchi", "Tiro alla fune", "Salto") for n in (1, 2, 3, 4)]
+FIRST_NAMES = ["Luca", "Giulia", "Marco", "Anna", "Matteo", "Sara", "Davide", "Elena", "Paolo", "Chiara",
+               "Andrea", "Francesca", "Simone", "Marta", "Giorgio", "Alice", "Filippo", "Irene", "Pietro", "Laura"]
+LAST_NAMES = ["Rossi", "Bianchi", "Ferrari", "Russo", "Romano", "Gallo", "Costa", "Fontana", "Conti", "Esposito",
+              "Ricci", "Bruno", "Moretti", "Marino", "Greco", "Barbieri", "Lombardi", "Giordano", "Colombo", "Rinaldi"]
+GENDER_CATEGORIES = ["elementari", "medie", "adolescenti"]
+YEARS = range(2015, 2026)
+
+
+# --- Generatore di dati sintetici ---
+
+def _category_gender(rng, categories):
+    category = rng.choice(categories)
+    gender = rng.choice(["maschio", "femmina"]) if category in GENDER_CATEGORIES else "NA"
+    return category, gender
+
+
+def generate_rows(table, size, seed=SEED):
+    """Righe sintetiche (colonne come in bulk_import.TARGETS) per `table`."""
+    from db import CATEGORIES
+
+    rng = random.Random(f"{seed}-{table}")
+    # Circa un atleta ogni 20 tempi, per avere storici personali realistici
+    athletes = [
+        f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {n}" for n in range(max(size // 20, 1))
+    ]
+    for _ in range(size):
+        category, gender = _category_gender(rng, CATEGORIES)
+        # Tempi in millisecondi tra 10 secondi e 5 minuti
+        time_ms = rng.randint(10_000, 300_000)
+        game = rng.choice(GAMES)
+        year = rng.choice(YEARS)
+        if table == "results":
+            yield (time_ms, game, category, gender, year)
+        elif table == "results_kids":
+            yield (rng.choice(athletes), time_ms, game, category, gender, year)
+        else:
+            first, last = rng.choice(athletes).rsplit(" ", 2)[:2]
+            yield (first, last, game, category, gender, rng.choice(["Titolari", "Riserve"]))
+
+
+TABLE_COLUMNS = {
+    "results": ("time", "game_name", "category", "gender", "year"),
+    "results_kids": ("nome", "time", "game_name", "category", "gender", "year"),
+    "players": ("first_name", "last_name", "game", "category", "gender", "status"),
+}
+
+
+def populate(size, seed=SEED):
+    """Riempie results, results_kids e players con `size` righe ciascuna."""
+    from db import DATABASE, bulk_insert, init_databases, transaction
+
+    init_databases()
+    for table, columns in TABLE_COLUMNS.items():
+        batch = []
+        for row in generate_rows(table, size, seed):
+            batch.append(row)
+            if len(batch) >= CHUNK_SIZE:
+                with transaction(DATABASE) as conn:
+                    bulk_insert(conn, table, columns, batch)
+                batch = []
+        if batch:
+            with transaction(DATABASE) as conn:
+                bulk_insert(conn, table, columns, batch)
+    with transaction(DATABASE) as conn:
+        conn.execute("ANALYZE")
+
+
+# --- Misure ---
+
+def _summary(samples):
+    samples = [s * 1000 for s in samples]
+    return {
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "max_ms": round(max(samples), 3),
+        "runs": len(samples),
+    }
+
+
+def measure(fn, repeat=REPEAT, cold=False):
+    """Tempi di `repeat` chiamate di `fn`; con cold=True svuota prima la cache delle query."""
+    from db import clear_query_cache
+
+    samples = []
+    for _ in range(repeat):
+        if cold:
+            clear_query_cache()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _summary(samples)
+
+
+def helper_cases():
+    """Funzioni di db.py da misurare: (letture, scritture), ognuna nome -> funzione."""
+    import db
+
+    rng = random.Random(SEED)
+    kids_ids = [row[0] for row in db.query(db.DATABASE, "SELECT id FROM results_kids LIMIT 1000")]
+    result_ids = [row[0] for row in db.query(db.DATABASE, "SELECT id FROM results LIMIT 1000")]
+    player_ids = [row[0] for row in db.query(db.DATABASE, "SELECT id FROM players LIMIT 1000")]
+
+    def update_db1():
+        db.update_record_db1(rng.choice(result_ids), rng.randint(10_000, 300_000), rng.choice(GAMES),
+                             "medie", "maschio", rng.choice(YEARS))
+
+    def update_db2():
+        db.update_record_db2(rng.choice(kids_ids), "Luca Rossi 0", rng.randint(10_000, 300_000),
+                             rng.choice(GAMES), "medie", rng.choice(YEARS), "femmina")
+
+    def update_player():
+        db.update_player(rng.choice(player_ids), "Luca", "Rossi", rng.choice(GAMES), "medie", "maschio", "Riserve")
+
+    reads = {
+        "get_records_db1": lambda: db.get_records_db1(),
+        "get_records_db2": lambda: db.get_records_db2(),
+        "get_all_players": lambda: db.get_all_players(),
+        "get_min_times[Tutti]": lambda: db.get_min_times("Tutti"),
+        "get_min_times[2020]": lambda: db.get_min_times("2020"),
+        "filter[nessuno]": lambda: db.get_filtered_records("results", {}),
+        "filter[anno]": lambda: db.get_filtered_records("results", {"year": 2020}),
+        "filter[anno+categoria]": lambda: db.get_filtered_records("results", {"year": 2020, "category": "medie"}),
+        "filter[anno+categoria+sesso]": lambda: db.get_filtered_records(
+            "results", {"year": 2020, "category": "medie", "gender": "femmina"}),
+        "filter[gioco]": lambda: db.get_filtered_records("results", {"game": "staff"}),
+        "filter[tempo]": lambda: db.get_filtered_records("results", {"time_min": 60_000, "time_max": 61_000}),
+        "filter_kids[anno+categoria+gioco]": lambda: db.get_filtered_records(
+            "results_kids", {"year": 2020, "category": "medie", "game": "corsa"}),
+        "get_players_by_category": lambda: db.get_players_by_category("medie"),
+        "get_page[results,Tempo]": lambda: db.get_page("results", "Tempo"),
+        "get_page[results_kids,ricerca]": lambda: db.get_page("results_kids", search="giulia"),
+        "search_game_names": lambda: db.search_game_names("sta"),
+        "search_kid_names": lambda: db.search_kid_names("mar"),
+    }
+    writes = {
+        "insert_record_db1": lambda: db.insert_record_db1(rng.randint(10_000, 300_000), rng.choice(GAMES),
+                                                          "adulti", "NA", rng.choice(YEARS)),
+        "update_record_db1": update_db1,
+        "insert_record_db2": lambda: db.insert_record_db2("Luca Rossi 0", rng.randint(10_000, 300_000),
+                                                          rng.choice(GAMES), "medie", rng.choice(YEARS), "maschio"),
+        "update_record_db2": update_db2,
+        "add_player": lambda: db.add_player("Luca", "Rossi", rng.choice(GAMES), "medie", "maschio", "Titolari"),
+        "update_player": update_player,
+    }
+    return reads, writes
+
+
+def benchmark_helpers(repeat=REPEAT):
+    reads, writes = helper_cases()
+    results = {}
+    for name, fn in reads.items():
+        results[name] = {"cold": measure(fn, repeat, cold=True), "warm": measure(fn, repeat)}
+    for name, fn in writes.items():
+        results[name] = {"cold": measure(fn, repeat)}
+    return results
+
+
+def benchmark_apptest(repeat=REPEAT):
+    """Tempi di rerun completi dello script per ciascuna vista, dopo il login."""
+    from streamlit.testing.v1 import AppTest
+
+    from auth import DEFAULT_USERS
+
+    # Utente amministratore predefinito, così si misura anche la vista Utenti
+    username, _, password, _ = next(user for user in DEFAULT_USERS if user[3])
+    at = AppTest.from_file(os.path.join(HERE, "app.py"), default_timeout=300)
+    start = time.perf_counter()
+    at.run()
+    results = {"primo avvio": _summary([time.perf_counter() - start])}
+    at.text_input[0].input(username)
+    at.text_input[1].input(password)
+    at.button[0].click().run()
+    for view in at.radio(key="active_view").options:
+        at.radio(key="active_view").set_value(view).run()
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            at.run()
+            samples.append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(f"errore nella vista {view}: {at.exception}")
+        results[view] = _summary(samples)
+    return results
+
+
+def run_size(size, seed=SEED, repeat=REPEAT, apptest=True):
+    """Misure per una dimensione, nella cartella di lavoro corrente (vuota)."""
+    start = time.perf_counter()
+    populate(size, seed)
+    report = {"populate_s": round(time.perf_counter() - start, 3), "helpers": benchmark_helpers(repeat)}
+    if apptest:
+        report["apptest"] = benchmark_apptest(repeat)
+    return report
+
+
+# --- Esecuzione e confronto ---
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _run_child(size, args):
+    """Esegue le misure di una dimensione in un processo separato e ne legge il JSON."""
+    command = [sys.executable, os.path.abspath(__file__), "--child", str(size),
+               "--seed", str(args.seed), "--repeat", str(args.repeat)]
+    if args.no_apptest:
+        command.append("--no-apptest")
+    with tempfile.TemporaryDirectory(prefix="treponti-bench-") as workdir:
+        output = subprocess.run(command, cwd=workdir, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"benchmark con {size} righe fallito:\n{output.stderr}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def _medians(report):
+    """Coppie (nome misura, mediana in ms) di un report, per il confronto."""
+    for size, data in report["sizes"].items():
+        for name, modes in data["helpers"].items():
+            for mode, summary in modes.items():
+                yield f"{size}/{name}/{mode}", summary["median_ms"]
+        for name, summary in data.get("apptest", {}).items():
+            yield f"{size}/apptest/{name}", summary["median_ms"]
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """Misure più lente di `tolerance` volte rispetto al report `baseline`."""
+    before = dict(_medians(baseline))
+    regressions = []
+    for name, median in _medians(report):
+        if name in before and before[name] > 0 and median / before[name] > tolerance:
+            regressions.append((name, before[name], median))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dei dati e delle viste con dati sintetici.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES),
+                        help="righe per tabella (default: 10000 100000 1000000)")
+    parser.add_argument("--seed", type=int, default=SEED, help="seme del generatore")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="ripetizioni per misura")
+    parser.add_argument("--no-apptest", action="store_true", help="salta i rerun con AppTest")
+    parser.add_argument("--output", help="file JSON dei risultati (default: standard output)")
+    parser.add_argument("--baseline", help="JSON di un'esecuzione precedente da confrontare")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="rapporto oltre il quale una misura è una regressione")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        print(json.dumps(run_size(args.child, args.seed, args.repeat, not args.no_apptest)))
+        return 0
+
+    report = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "sizes": {},
+    }
+    for size in args.sizes:
+        print(f"Dimensione {size}...", file=sys.stderr)
+        report["sizes"][str(size)] = _run_child(size, args)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            out.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as stream:
+            regressions = compare(report, json.load(stream), args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSIONE {name}: {before:.3f} ms -> {after:.3f} ms", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Classifiche in diretta per il tabellone delle gare (sola lettura).
+
+Un solo stato per anno è condiviso da tutti gli schermi collegati allo stesso
+processo. Ogni aggiornamento controlla prima PRAGMA data_version (nessuna
+lettura se il database non è cambiato), poi legge soltanto i tempi con id
+maggiore dell'ultimo già visto e li inserisce nelle classifiche in memoria.
+Modifiche ed eliminazioni, che non si vedono dagli id, sono contate in meta
+dai trigger (EDITS_KEY): quando il contatore cambia la classifica dell'anno
+viene ricaricata per intero.
+"""
+import bisect
+import threading
+import time
+
+from db import DATABASE, EDITS_KEY, data_version, query
+
+# Posizioni mostrate per ogni gioco, categoria e genere
+BOARD_PLACES = 10
+
+# Intervallo minimo fra due controlli del database, qualunque sia il numero di schermi
+POLL_INTERVAL = 2.0
+
+_TIMES_SELECT = """
+    SELECT k.id, g.name, c.name, k.gender, COALESCE(a.name, ''), k.time
+    FROM {source} k
+    JOIN games g ON g.id = k.game_id
+    JOIN categories c ON c.id = k.category_id
+    LEFT JOIN athletes a ON a.id = k.athlete_id
+"""
+
+# Migliori BOARD_PLACES tempi per gruppo dell'anno fino a un id (caricamento completo)
+_LOAD = _TIMES_SELECT.format(source="""(
+        SELECT *, ROW_NUMBER() OVER (
+            PARTITION BY game_id, category_id, gender ORDER BY time, id
+        ) AS rn
+        FROM results_kids
+        WHERE year = ? AND time IS NOT NULL AND id <= ?
+    )""") + " WHERE k.rn <= ?"
+
+# Tempi dell'anno inseriti dopo l'ultimo id visto (scansione sulla chiave primaria)
+_NEW_ROWS = _TIMES_SELECT.format(source="results_kids") + (
+    " WHERE k.id > ? AND k.year = ? AND k.time IS NOT NULL ORDER BY k.id"
+)
+
+
+class LiveStandings:
+    """Classifiche di un anno, aggiornate in modo incrementale e condivise fra le sessioni."""
+
+    def __init__(self, year, places=BOARD_PLACES, interval=POLL_INTERVAL):
+        self.year = year
+        self.places = places
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._checked = None
+        self._version = None
+        self._edits = None
+        self._last_id = 0
+        # (gioco, categoria, genere) -> lista ordinata di (tempo, id, nome)
+        self._groups = {}
+        self._snapshot = ()
+        self._updated = None
+
+    def snapshot(self):
+        """
+        Classifiche correnti: tupla di ((gioco, categoria, genere), righe) con righe
+        (posizione, nome, tempo, distacco dal primo), e ora dell'ultimo cambiamento.
+        """
+        self.refresh()
+        return self._snapshot, self._updated
+
+    def refresh(self):
+        """Aggiorna le classifiche se è passato `interval` e il database è cambiato."""
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self.interval:
+            return
+        # Un solo schermo aggiorna; gli altri intanto mostrano lo stato precedente
+        # (il primo caricamento invece va atteso)
+        if not self._lock.acquire(blocking=self._version is None):
+            return
+        try:
+            self._checked = now
+            # Letta prima dei dati: un commit successivo sarà visto al prossimo controllo
+            version = data_version(DATABASE)
+            if version == self._version:
+                return
+            edits = query(DATABASE, "SELECT value FROM meta WHERE key=?", (EDITS_KEY,))
+            edits = edits[0][0] if edits else None
+            if edits != self._edits or self._version is None:
+                changed = self._load()
+            else:
+                changed = self._merge_new()
+            self._version, self._edits = version, edits
+            if changed:
+                self._snapshot = self._build_snapshot()
+                self._updated = time.strftime("%H:%M:%S")
+        finally:
+            self._lock.release()
+
+    def _load(self):
+        last_id = self._max_id()
+        self._groups = {}
+        for row in query(DATABASE, _LOAD, (self.year, last_id, self.places)):
+            self._add(row)
+        self._last_id = last_id
+        return True
+
+    def _merge_new(self):
+        rows = query(DATABASE, _NEW_ROWS, (self._last_id, self.year))
+        if not rows:
+            # Scritture su altri anni o tabelle: nessun cambiamento da mostrare
+            self._last_id = max(self._last_id, self._max_id())
+            return False
+        changed = False
+        for row in rows:
+            changed = self._add(row) or changed
+        self._last_id = rows[-1][0]
+        return changed
+
+    def _max_id(self):
+        return query(DATABASE, "SELECT COALESCE(MAX(id), 0) FROM results_kids")[0][0]
+
+    def _add(self, row):
+        """Inserisce un tempo nella classifica del suo gruppo; True se entra fra i primi."""
+        record_id, game, category, gender, name, time_ms = row
+        standings = self._groups.setdefault((game, category, gender), [])
+        entry = (time_ms, record_id, name)
+        if len(standings) >= self.places and entry > standings[-1]:
+            return False
+        bisect.insort(standings, entry)
+        del standings[self.places:]
+        return True
+
+    def _build_snapshot(self):
+        snapshot = []
+        for group in sorted(self._groups):
+            standings = self._groups[group]
+            rows, position, previous = [], 0, None
+            for seen, (time_ms, _, name) in enumerate(standings, start=1):
+                if time_ms != previous:
+                    position, previous = seen, time_ms
+                rows.append((position, name, time_ms, time_ms - standings[0][0]))
+            snapshot.append((group, tuple(rows)))
+        return tuple(snapshot)
+
+
+def latest_year():
+    """Anno più recente con tempi dei ragazzi (None se non ce ne sono)."""
+    return query(DATABASE, "SELECT MAX(year) FROM results_kids")[0][0]
+
+
+_boards = {}
+_boards_lock = threading.Lock()
+
+
+def get_standings(year):
+    """Stato condiviso delle classifiche di `year` (creato al primo schermo che lo chiede)."""
+    with _boards_lock:
+        board = _boards.get(year)
+        if board is None:
+            board = _boards[year] = LiveStandings(year)
+        return board
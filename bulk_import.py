@@ -0,0 +1,211 @@
+"""Importazione massiva di tempi da file CSV o Excel.
+
+Il file viene letto a blocchi, ogni riga è validata con le stesse regole delle
+form dell'app e le righe valide sono scritte con executemany in poche grandi
+transazioni. Uso da riga di comando:
+
+    python bulk_import.py tempi.csv --table results_kids
+"""
+import argparse
+import csv
+import io
+import sys
+
+from db import CATEGORIES, DATABASE, archived_years, bulk_insert, init_databases, write
+from formats import parse_time as parse_time_ms, validate_time_ms, validate_year
+
+# Categorie per cui, come nelle form, va indicato il genere
+GENDER_CATEGORIES = ["elementari", "medie", "adolescenti"]
+GENDERS = ["maschio", "femmina"]
+
+# Righe scritte per transazione
+CHUNK_SIZE = 20_000
+
+# Intestazioni accettate nel file (in minuscolo) -> colonna della tabella
+HEADER_ALIASES = {
+    "nome": "nome",
+    "tempo": "time",
+    "time": "time",
+    # Colonna dei file esportati dall'app (tempi già in millisecondi)
+    "tempo (ms)": "time_ms",
+    "time_ms": "time_ms",
+    "gioco": "game_name",
+    "game_name": "game_name",
+    "categoria": "category",
+    "category": "category",
+    "sesso": "gender",
+    "genere": "gender",
+    "gender": "gender",
+    "anno": "year",
+    "year": "year",
+}
+
+TARGETS = {
+    "results": {
+        "path": DATABASE,
+        "columns": ("time", "game_name", "category", "gender", "year"),
+    },
+    "results_kids": {
+        "path": DATABASE,
+        "columns": ("nome", "time", "game_name", "category", "gender", "year"),
+    },
+}
+
+
+class RowError(ValueError):
+    """Riga del file non valida."""
+
+
+def parse_time(value):
+    """Converte in millisecondi un tempo in secondi o nel formato mm:ss.cc."""
+    try:
+        return parse_time_ms(value)
+    except ValueError as exc:
+        raise RowError(str(exc))
+
+
+def _time_value(record):
+    if str(record.get("time_ms", "")).strip():
+        try:
+            return validate_time_ms(record["time_ms"])
+        except ValueError as exc:
+            raise RowError(str(exc))
+    return parse_time(record.get("time", ""))
+
+
+def validate_row(record, columns, archived=()):
+    """
+    Valida e normalizza una riga (dict colonna -> valore) come le form dell'app;
+    `archived` sono gli anni archiviati, che non accettano nuovi tempi.
+    """
+    category = str(record.get("category") or "").strip().lower()
+    if category not in CATEGORIES:
+        raise RowError(f"categoria non valida: {record.get('category')!r}")
+    if category in GENDER_CATEGORIES:
+        gender = str(record.get("gender") or "").strip().lower()
+        if gender not in GENDERS:
+            raise RowError(f"genere non valido per la categoria {category}: {record.get('gender')!r}")
+    else:
+        gender = "NA"
+    try:
+        year = validate_year(record.get("year"))
+    except ValueError as exc:
+        raise RowError(str(exc))
+    if year in archived:
+        raise RowError(f"anno archiviato: {year}")
+    values = {
+        "nome": str(record.get("nome") or "").strip(),
+        "time": _time_value(record),
+        "game_name": str(record.get("game_name") or "").strip(),
+        "category": category,
+        "gender": gender,
+        "year": year,
+    }
+    if "nome" in columns and not values["nome"]:
+        raise RowError("nome mancante")
+    return tuple(values[c] for c in columns)
+
+
+def _map_header(header):
+    mapping = []
+    for name in header:
+        mapping.append(HEADER_ALIASES.get(str(name or "").strip().lower()))
+    return mapping
+
+
+def read_csv_rows(stream):
+    """Legge un CSV binario riga per riga, senza caricarlo tutto in memoria."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    # Riconosce il separatore (virgola, punto e virgola o tab) da un campione iniziale
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(text, dialect)
+
+
+def read_excel_rows(stream):
+    """Legge il primo foglio di un file Excel in modalità streaming (read-only)."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield ["" if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def import_rows(rows, table, chunk_size=CHUNK_SIZE):
+    """
+    Importa in `table` le righe prodotte da `rows` (la prima è l'intestazione).
+    Ritorna (numero di righe inserite, lista di (numero riga, motivo) scartate).
+    """
+    target = TARGETS[table]
+    columns = target["columns"]
+
+    rows = iter(rows)
+    header = _map_header(next(rows, []))
+    present = set(header) | ({"time"} if "time_ms" in header else set())
+    missing = [c for c in columns if c not in present and c != "gender"]
+    if missing:
+        raise ValueError(f"colonne mancanti nel file: {', '.join(missing)}")
+
+    archived = archived_years()
+    inserted = 0
+    rejected = []
+    batch = []
+    for line_number, row in enumerate(rows, start=2):
+        if not any(str(value).strip() for value in row):
+            continue
+        record = {name: value for name, value in zip(header, row) if name}
+        try:
+            batch.append(validate_row(record, columns, archived))
+        except RowError as exc:
+            rejected.append((line_number, str(exc)))
+        if len(batch) >= chunk_size:
+            inserted += _write_batch(target["path"], table, columns, batch)
+            batch = []
+    if batch:
+        inserted += _write_batch(target["path"], table, columns, batch)
+    return inserted, rejected
+
+
+def _write_batch(path, table, columns, batch):
+    write(path, lambda conn: bulk_insert(conn, table, columns, batch))
+    return len(batch)
+
+
+def import_file(stream, filename, table, chunk_size=CHUNK_SIZE):
+    """Importa un file CSV o Excel (riconosciuto dall'estensione) in `table`."""
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        rows = read_excel_rows(stream)
+    else:
+        rows = read_csv_rows(stream)
+    return import_rows(rows, table, chunk_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa tempi da un file CSV o Excel.")
+    parser.add_argument("file", help="percorso del file .csv o .xlsx")
+    parser.add_argument("--table", choices=sorted(TARGETS), default="results_kids",
+                        help="tabella di destinazione (default: results_kids)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="righe per transazione")
+    args = parser.parse_args(argv)
+
+    init_databases()
+    with open(args.file, "rb") as stream:
+        inserted, rejected = import_file(stream, args.file, args.table, args.chunk_size)
+    print(f"Righe inserite: {inserted}")
+    if rejected:
+        print(f"Righe scartate: {len(rejected)}", file=sys.stderr)
+        for line_number, reason in rejected:
+            print(f"  riga {line_number}: {reason}", file=sys.stderr)
+    return 0 if not rejected else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
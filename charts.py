@@ -0,0 +1,87 @@
+"""Grafici dell'andamento dei tempi negli anni (matplotlib).
+
+I dati arrivano dalle statistiche pre-aggregate di db.py (year_stats), mantenute
+dai trigger a ogni scrittura. Le immagini PNG sono tenute in cache insieme alla
+versione del database (db.data_version) con cui sono state disegnate: un rerun
+senza scritture nel frattempo riusa i byte già pronti senza ridisegnare.
+"""
+import io
+import threading
+from collections import OrderedDict
+
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter, MaxNLocator
+
+from db import DATABASE, data_version, get_year_stats
+from formats import format_time
+
+# Grafici tenuti in cache (i meno usati di recente vengono scartati)
+CACHE_MAX_CHARTS = 64
+
+# Colore di ogni genere nelle linee e nelle barre
+GENDER_COLORS = {"maschio": "tab:blue", "femmina": "tab:red", "NA": "tab:green"}
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def trend_chart(table, game_name, category):
+    """PNG dell'andamento di un gioco e categoria, oppure None se non ci sono dati."""
+    version = data_version(DATABASE)
+    key = (table, game_name, category)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == version:
+            _cache.move_to_end(key)
+            return entry[1]
+    png = render_trend_chart(get_year_stats(table, game_name, category), f"{game_name} - {category}")
+    with _lock:
+        _cache[key] = (version, png)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_CHARTS:
+            _cache.popitem(last=False)
+    return png
+
+
+def render_trend_chart(stats, title):
+    """
+    Disegna tempo migliore e mediano per anno (una coppia di linee per genere) e,
+    sotto, le partecipazioni per anno. `stats` sono le righe di db.get_year_stats.
+    """
+    if not stats:
+        return None
+    years = sorted({row[0] for row in stats})
+    genders = sorted({row[1] for row in stats})
+    by_gender = {gender: [row for row in stats if row[1] == gender] for gender in genders}
+
+    # Figure senza pyplot: nessuno stato globale condiviso fra le sessioni
+    fig = Figure(figsize=(8, 6), tight_layout=True)
+    times, runs = fig.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [2, 1]})
+    width = 0.8 / len(genders)
+    for i, (gender, rows) in enumerate(by_gender.items()):
+        color = GENDER_COLORS.get(gender)
+        label = "" if gender == "NA" else f" ({gender})"
+        timed = [row for row in rows if row[3] is not None]
+        times.plot([r[0] for r in timed], [r[3] for r in timed], "o-", color=color, label="Migliore" + label)
+        times.plot([r[0] for r in timed], [r[4] for r in timed], "s--", color=color, alpha=0.6,
+                   label="Mediana" + label)
+        offset = (i - (len(genders) - 1) / 2) * width
+        runs.bar([r[0] + offset for r in rows], [r[2] for r in rows], width=width, color=color,
+                 label=gender if gender != "NA" else "Partecipazioni")
+
+    times.set_title(title)
+    times.set_ylabel("Tempo")
+    times.yaxis.set_major_formatter(FuncFormatter(lambda value, _: format_time(max(value, 0))))
+    times.grid(True, alpha=0.3)
+    times.legend(fontsize="small")
+    runs.set_ylabel("Partecipazioni")
+    runs.set_xlabel("Anno")
+    runs.set_xticks(years)
+    runs.yaxis.set_major_locator(MaxNLocator(integer=True))
+    runs.grid(True, axis="y", alpha=0.3)
+    if len(genders) > 1:
+        runs.legend(fontsize="small")
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=100)
+    return buffer.getvalue()
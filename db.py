@@ -0,0 +1,2183 @@
+"""Livello di accesso ai dati condiviso da tutta l'applicazione.
+
+Ogni database SQLite ha un piccolo pool di connessioni condiviso a livello di
+processo: le sessioni Streamlit (un thread per sessione) prendono in prestito
+una connessione già configurata invece di aprirne una nuova a ogni chiamata.
+
+Tempi, tempi dei ragazzi e nomi stanno in un unico database normalizzato: giochi,
+categorie e atleti sono tabelle di dimensione referenziate da chiavi intere. I
+tempi delle stagioni concluse possono essere spostati in archivi per anno in
+sola lettura (vedi archive.py): le letture li comprendono tramite partitions.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from formats import YEAR_MAX, YEAR_MIN, validate_time_ms, validate_year
+
+log = logging.getLogger(__name__)
+
+DATABASE = "treponti.db"
+DATABASE_USERS = "users.db"
+
+# Vecchi database separati, importati in DATABASE al primo avvio
+LEGACY_DATABASES = (
+    ("database1.db", "results"),
+    ("database2.db", "results_kids"),
+    ("database3.db", "players"),
+)
+
+CATEGORIES = ["materna", "elementari", "medie", "adolescenti", "adulti", "donne"]
+
+# Numero massimo di connessioni aperte per ciascun database
+POOL_SIZE = 4
+
+# Istruzioni preparate tenute in cache da ogni connessione del pool
+CACHED_STATEMENTS = 256
+
+# Attesa massima (in secondi) per un lock prima di sollevare "database is locked"
+BUSY_TIMEOUT = 5.0
+
+# Coda di scrittura: attesa per raggruppare altre scritture nella stessa
+# transazione, numero massimo di operazioni per transazione e attesa massima
+# del chiamante
+WRITE_WINDOW = 0.005
+WRITE_MAX_OPS = 500
+WRITE_TIMEOUT = 30.0
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    # Con WAL, NORMAL non fa fsync a ogni commit ma resta consistente dopo un crash
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=67108864",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+    f"PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}",
+)
+
+# Righe per pagina nelle tabelle di modifica/cancellazione
+PAGE_SIZE = 50
+
+# Limiti della cache dei risultati condivisa tra le sessioni
+CACHE_MAX_ENTRIES = 128
+CACHE_MAX_ROWS = 500_000
+
+
+def _connect(path):
+    """
+    Apre una nuova connessione e applica i PRAGMA di configurazione. `path` può
+    essere anche un URI "file:" (gli archivi per anno, in sola lettura).
+    """
+    conn = sqlite3.connect(
+        path, timeout=BUSY_TIMEOUT, check_same_thread=False, cached_statements=CACHED_STATEMENTS,
+        uri=path.startswith("file:")
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Pool di connessioni verso un singolo file SQLite."""
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return _connect(self.path)
+        # Pool esaurito: aspetta che un'altra sessione restituisca una connessione
+        return self._idle.get()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path):
+    """Restituisce il pool del database, creandolo alla prima richiesta."""
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path)
+    return pool
+
+
+def close_all():
+    """Chiude tutte le connessioni aperte (utile nei test e negli script)."""
+    # Prima i thread scrittori, che completano le scritture in coda usando il pool
+    with _pools_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+        for watcher in _watchers.values():
+            watcher.close()
+        _watchers.clear()
+    _query_cache.invalidate()
+
+
+# --- Strumentazione opzionale (vedi profiling.py) ---
+
+# Funzione chiamata dopo ogni query con (sql, secondi, righe, servita dalla cache);
+# con None le funzioni sotto non misurano nulla.
+_query_listener = None
+
+
+def set_query_listener(listener):
+    """Imposta (o con None rimuove) la funzione che riceve i tempi delle query."""
+    global _query_listener
+    _query_listener = listener
+
+
+def _statement_summary(statements):
+    """Istruzioni di una transazione ridotte alle prime parole, senza i valori."""
+    parts = []
+    for statement in statements:
+        words = statement.split()
+        if not words or words[0].startswith("--") or words[0].upper() in ("BEGIN", "COMMIT", "ROLLBACK"):
+            continue
+        part = " ".join(words[:3])
+        if part not in parts:
+            parts.append(part)
+    return "; ".join(parts)
+
+
+@contextmanager
+def connection(path):
+    """Prende in prestito una connessione dal pool e la restituisce al termine."""
+    pool = get_pool(path)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction(path):
+    """Connessione in una transazione: commit all'uscita, rollback in caso di errore."""
+    listener = _query_listener
+    with connection(path) as conn:
+        if listener is None:
+            with conn:
+                yield conn
+            return
+        # Con la strumentazione attiva si registra la transazione intera; il testo
+        # tracciato contiene i valori dei parametri, quindi se ne tengono solo
+        # le prime parole di ogni istruzione.
+        statements = []
+        changes = conn.total_changes
+        start = time.perf_counter()
+        conn.set_trace_callback(statements.append)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.set_trace_callback(None)
+        listener(_statement_summary(statements), time.perf_counter() - start, conn.total_changes - changes, False)
+
+
+def query(path, sql, params=()):
+    """Esegue una SELECT e restituisce tutte le righe."""
+    listener = _query_listener
+    start = time.perf_counter()
+    with connection(path) as conn:
+        rows = conn.execute(sql, params).fetchall()
+    if listener is not None:
+        listener(sql, time.perf_counter() - start, len(rows), False)
+    return rows
+
+
+def stream_query(path, sql, params=(), chunk_size=5000):
+    """Esegue una SELECT e restituisce le righe a blocchi con fetchmany."""
+    listener = _query_listener
+    start = time.perf_counter()
+    total = 0
+    with connection(path) as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            total += len(rows)
+            yield rows
+    if listener is not None:
+        # Comprende il tempo speso dal chiamante fra un blocco e l'altro
+        listener(sql, time.perf_counter() - start, total, False)
+
+
+def explain(path, sql, params=()):
+    """Restituisce il piano di esecuzione (EXPLAIN QUERY PLAN) di una query."""
+    with connection(path) as conn:
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+# --- Coda di scrittura con un solo thread scrittore per database ---
+
+class WriteQueue:
+    """
+    Thread che esegue tutte le scritture di un database del processo: le
+    operazioni arrivate entro WRITE_WINDOW (fino a WRITE_MAX_OPS) vengono
+    eseguite in un'unica transazione, quindi un solo commit (e fsync) per gruppo
+    e nessuna contesa per il lock fra le sessioni. Ogni operazione è isolata
+    in un SAVEPOINT: se fallisce, viene annullata solo lei.
+    """
+
+    def __init__(self, path, window=WRITE_WINDOW, max_ops=WRITE_MAX_OPS):
+        self.path = path
+        self.window = window
+        self.max_ops = max_ops
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"writer-{path}", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation):
+        """Accoda operation(conn) e restituisce un Future con il suo risultato dopo il commit."""
+        future = Future()
+        self._queue.put((operation, future))
+        return future
+
+    def close(self):
+        """Esegue le operazioni ancora in coda e ferma il thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            pending = [item]
+            deadline = time.monotonic() + self.window
+            while len(pending) < self.max_ops:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                pending.append(item)
+            self._apply(pending)
+
+    def _apply(self, pending):
+        done = []
+        try:
+            with connection(self.path) as conn:
+                # IMMEDIATE: il lock di scrittura (anche verso altri processi) è
+                # preso subito, con l'attesa di busy_timeout
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for operation, future in pending:
+                        if not future.set_running_or_notify_cancel():
+                            continue
+                        conn.execute("SAVEPOINT operation")
+                        try:
+                            result = operation(conn)
+                        except Exception as exc:
+                            conn.execute("ROLLBACK TO operation")
+                            conn.execute("RELEASE operation")
+                            future.set_exception(exc)
+                        else:
+                            conn.execute("RELEASE operation")
+                            done.append((future, result))
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+        except Exception as exc:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for future, result in done:
+            future.set_result(result)
+
+
+_writers = {}
+
+
+def get_writer(path):
+    """Restituisce la coda di scrittura del database, avviandola alla prima richiesta."""
+    writer = _writers.get(path)
+    if writer is None:
+        with _pools_lock:
+            writer = _writers.get(path)
+            if writer is None:
+                writer = _writers[path] = WriteQueue(path)
+    return writer
+
+
+def write(path, operation, timeout=WRITE_TIMEOUT):
+    """Esegue operation(conn) nel thread scrittore e ne restituisce il risultato."""
+    listener = _query_listener
+    if listener is None:
+        return get_writer(path).submit(operation).result(timeout)
+    # Con la strumentazione attiva la scrittura è registrata qui, nel thread del
+    # chiamante (quello del rerun): attesa in coda, esecuzione e commit, con le
+    # istruzioni tracciate nel thread scrittore ridotte alle prime parole.
+    statements, changes = [], []
+
+    def traced(conn):
+        before = conn.total_changes
+        conn.set_trace_callback(statements.append)
+        try:
+            return operation(conn)
+        finally:
+            conn.set_trace_callback(None)
+            changes.append(conn.total_changes - before)
+
+    start = time.perf_counter()
+    try:
+        return get_writer(path).submit(traced).result(timeout)
+    finally:
+        listener(_statement_summary(statements), time.perf_counter() - start, sum(changes), False)
+
+
+def execute(path, sql, params=()):
+    """Esegue una singola istruzione di scrittura e restituisce l'id dell'ultima riga inserita."""
+    return write(path, lambda conn: conn.execute(sql, params).lastrowid)
+
+
+# --- Cache dei risultati delle letture, invalidata dalle scritture ---
+
+class _VersionWatcher:
+    """Connessione dedicata che legge PRAGMA data_version di un database.
+
+    data_version cambia ogni volta che un'altra connessione (del pool o di un
+    altro processo) fa commit, quindi basta confrontarlo per sapere se i dati
+    sono cambiati. La connessione non scrive mai.
+    """
+
+    def __init__(self, path):
+        self._conn = _connect(path)
+        self._lock = threading.Lock()
+
+    def version(self):
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class QueryCache:
+    """Cache LRU dei risultati delle SELECT, condivisa da tutte le sessioni."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_rows=CACHE_MAX_ROWS):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, version, key):
+        with self._lock:
+            if self._versions.get(path) != version:
+                self._drop_path(path)
+                self._versions[path] = version
+            rows = self._entries.get((path, key))
+            if rows is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((path, key))
+            self.hits += 1
+            return rows
+
+    def put(self, path, version, key, rows):
+        if len(rows) > self.max_rows:
+            return
+        with self._lock:
+            # Se nel frattempo qualcuno ha scritto, il risultato è già vecchio
+            if self._versions.get(path) != version:
+                return
+            previous = self._entries.pop((path, key), None)
+            if previous is not None:
+                self._rows -= len(previous)
+            self._entries[(path, key)] = rows
+            self._rows += len(rows)
+            while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+                _, evicted = self._entries.popitem(last=False)
+                self._rows -= len(evicted)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._versions.clear()
+                self._rows = 0
+            else:
+                self._drop_path(path)
+                self._versions.pop(path, None)
+
+    def _drop_path(self, path):
+        for entry_key in [k for k in self._entries if k[0] == path]:
+            self._rows -= len(self._entries.pop(entry_key))
+
+
+_watchers = {}
+_query_cache = QueryCache()
+
+
+def clear_query_cache():
+    """Svuota la cache delle query (es. per misurare le letture a freddo)."""
+    _query_cache.invalidate()
+
+
+def data_version(path):
+    """Contatore che cambia a ogni commit sul database, da qualsiasi connessione."""
+    watcher = _watchers.get(path)
+    if watcher is None:
+        with _pools_lock:
+            watcher = _watchers.get(path)
+            if watcher is None:
+                watcher = _watchers[path] = _VersionWatcher(path)
+    return watcher.version()
+
+
+def cached_query(path, sql, params=()):
+    """Come query(), ma serve dalla cache finché il database non viene modificato."""
+    start = time.perf_counter()
+    version = data_version(path)
+    key = (sql, tuple(params))
+    rows = _query_cache.get(path, version, key)
+    if rows is None:
+        rows = query(path, sql, params)
+        _query_cache.put(path, version, key, rows)
+    elif _query_listener is not None:
+        _query_listener(sql, time.perf_counter() - start, len(rows), True)
+    return list(rows)
+
+
+# --- Schema normalizzato ---
+
+# Colonne delle tabelle dei tempi: tempo in millisecondi interi e anno validato
+# (vedi formats.py)
+TIME_TABLES = {
+    "results": f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        time INTEGER CHECK (time >= 0),
+        game_id INTEGER NOT NULL REFERENCES games (id),
+        category_id INTEGER NOT NULL REFERENCES categories (id),
+        gender TEXT NOT NULL DEFAULT 'NA',
+        year INTEGER CHECK (year BETWEEN {YEAR_MIN} AND {YEAR_MAX})
+    """,
+    "results_kids": f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        athlete_id INTEGER REFERENCES athletes (id),
+        time INTEGER CHECK (time >= 0),
+        game_id INTEGER NOT NULL REFERENCES games (id),
+        category_id INTEGER NOT NULL REFERENCES categories (id),
+        gender TEXT NOT NULL DEFAULT 'NA',
+        year INTEGER CHECK (year BETWEEN {YEAR_MIN} AND {YEAR_MAX})
+    """,
+}
+
+# Giochi, categorie e atleti sono memorizzati una volta sola nelle tabelle di
+# dimensione; i tempi e i nomi li referenziano con chiavi intere.
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS games (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE COLLATE NOCASE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS athletes (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE COLLATE NOCASE
+    )
+    """,
+    f"CREATE TABLE IF NOT EXISTS results ({TIME_TABLES['results']})",
+    f"CREATE TABLE IF NOT EXISTS results_kids ({TIME_TABLES['results_kids']})",
+    """
+    CREATE TABLE IF NOT EXISTS players (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        athlete_id INTEGER REFERENCES athletes (id),
+        first_name TEXT NOT NULL,
+        last_name TEXT NOT NULL,
+        game_id INTEGER NOT NULL REFERENCES games (id),
+        category_id INTEGER NOT NULL REFERENCES categories (id),
+        gender TEXT NOT NULL,
+        status TEXT NOT NULL
+    )
+    """,
+    # Grafie diverse di un atleta collegate all'atleta dell'elenco nomi (vedi
+    # link_player_athlete) e proposte di collegamento scartate
+    """
+    CREATE TABLE IF NOT EXISTS athlete_aliases (
+        name TEXT PRIMARY KEY COLLATE NOCASE,
+        athlete_id INTEGER NOT NULL REFERENCES athletes (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rejected_links (
+        player_id INTEGER NOT NULL,
+        athlete_id INTEGER NOT NULL,
+        PRIMARY KEY (player_id, athlete_id)
+    ) WITHOUT ROWID
+    """,
+    # Stato delle migrazioni e altre informazioni sul database
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    # Viste con i nomi al posto delle chiavi, usate da letture, filtri ed export
+    """
+    CREATE VIEW IF NOT EXISTS results_view AS
+    SELECT r.id, r.time, g.name AS game_name, c.name AS category, r.gender, r.year,
+           r.game_id, r.category_id
+    FROM results r
+    JOIN games g ON g.id = r.game_id
+    JOIN categories c ON c.id = r.category_id
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS results_kids_view AS
+    SELECT k.id, COALESCE(a.name, '') AS nome, k.time, g.name AS game_name,
+           c.name AS category, k.gender, k.year, k.athlete_id, k.game_id, k.category_id
+    FROM results_kids k
+    LEFT JOIN athletes a ON a.id = k.athlete_id
+    JOIN games g ON g.id = k.game_id
+    JOIN categories c ON c.id = k.category_id
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS players_view AS
+    SELECT p.id, p.first_name, p.last_name, g.name AS game, c.name AS category,
+           p.gender, p.status, p.athlete_id, p.game_id, p.category_id
+    FROM players p
+    JOIN games g ON g.id = p.game_id
+    JOIN categories c ON c.id = p.category_id
+    """,
+)
+
+INDEXES = (
+    # Tab 1-3: classifica per anno e combinazioni di filtri (vedi filter_query)
+    "CREATE INDEX IF NOT EXISTS idx_results_year_group ON results (year, game_id, category_id, gender, time)",
+    "CREATE INDEX IF NOT EXISTS idx_results_filter ON results (category_id, gender, year, time)",
+    "CREATE INDEX IF NOT EXISTS idx_results_gender ON results (gender, year, time)",
+    "CREATE INDEX IF NOT EXISTS idx_results_game ON results (game_id)",
+    "CREATE INDEX IF NOT EXISTS idx_results_time ON results (time)",
+    "CREATE INDEX IF NOT EXISTS idx_results_year ON results (year)",
+    # Ragazzi: classifica, filtri, ordinamento delle pagine e ricerca per atleta
+    "CREATE INDEX IF NOT EXISTS idx_results_kids_year_group "
+    "ON results_kids (year, game_id, category_id, gender, time)",
+    "CREATE INDEX IF NOT EXISTS idx_results_kids_group ON results_kids (game_id, category_id, gender, time)",
+    "CREATE INDEX IF NOT EXISTS idx_results_kids_filter ON results_kids (category_id, gender, year, time)",
+    "CREATE INDEX IF NOT EXISTS idx_results_kids_gender ON results_kids (gender, year, time)",
+    # Profilo atleta: tempi, migliori per anno e per gioco, ricerca per atleta
+    "CREATE INDEX IF NOT EXISTS idx_results_kids_athlete_game "
+    "ON results_kids (athlete_id, game_id, year, time)",
+    "CREATE INDEX IF NOT EXISTS idx_results_kids_time ON results_kids (time)",
+    "CREATE INDEX IF NOT EXISTS idx_results_kids_year ON results_kids (year)",
+    # Nomi ragazzi
+    "CREATE INDEX IF NOT EXISTS idx_players_category ON players (category_id, game_id, status)",
+    "CREATE INDEX IF NOT EXISTS idx_players_first_name ON players (first_name)",
+    "CREATE INDEX IF NOT EXISTS idx_players_last_name ON players (last_name)",
+    "CREATE INDEX IF NOT EXISTS idx_players_athlete ON players (athlete_id)",
+)
+
+# Tabelle di dimensione referenziate da ciascuna colonna con il nome
+DIMENSIONS = {
+    "nome": ("athlete_id", "athletes"),
+    "game_name": ("game_id", "games"),
+    "game": ("game_id", "games"),
+    "category": ("category_id", "categories"),
+}
+
+
+def dimension_id(conn, table, name):
+    """
+    Chiave di `name` nella tabella di dimensione `table`, creando la riga se manca.
+    Un nome di atleta vuoto non ha chiave (None); una grafia collegata a un altro
+    atleta (athlete_aliases) restituisce la chiave di quell'atleta.
+    """
+    name = (name or "").strip()
+    if table == "athletes" and not name:
+        return None
+    row = conn.execute(f"SELECT id FROM {table} WHERE name=?", (name,)).fetchone()
+    if row is None and table == "athletes":
+        row = conn.execute("SELECT athlete_id FROM athlete_aliases WHERE name=?", (name,)).fetchone()
+    if row is None:
+        # ON CONFLICT: un'altra sessione può averlo appena inserito
+        conn.execute(f"INSERT INTO {table} (name) VALUES (?) ON CONFLICT (name) DO NOTHING", (name,))
+        row = conn.execute(f"SELECT id FROM {table} WHERE name=?", (name,)).fetchone()
+    return row[0]
+
+
+def player_athlete_name(first_name, last_name):
+    """Nome dell'atleta corrispondente a un giocatore dell'elenco nomi."""
+    return f"{(first_name or '').strip()} {(last_name or '').strip()}".strip()
+
+
+# --- Classifica materializzata dei tempi migliori (ragazzi) ---
+
+# Valore di "year" in best_times per il record assoluto su tutti gli anni
+ALL_YEARS = 0
+
+# Ricalcola il migliore di un gruppo dopo che il detentore è stato modificato o
+# eliminato; se il gruppo ha già un detentore valido l'inserimento non fa nulla.
+# Come il vecchio MIN(time), i tempi mancanti non sono mai il migliore e le
+# righe senza anno contano solo per il record su tutti gli anni.
+_REFILL_GROUP = """
+    INSERT INTO best_times (year, game_id, category_id, gender, result_id, athlete_id, time)
+    SELECT {key_year}, game_id, category_id, gender, id, athlete_id, time
+    FROM results_kids
+    WHERE {year_filter} game_id = OLD.game_id
+      AND category_id = OLD.category_id AND gender = OLD.gender
+      AND time IS NOT NULL
+    ORDER BY time, id
+    LIMIT 1
+    ON CONFLICT (year, game_id, category_id, gender) DO NOTHING;
+"""
+
+# Propone la riga NEW come migliore del gruppo: vince il tempo minore e, a parità,
+# l'id minore (stesso criterio di ordinamento di rebuild_best_times).
+_OFFER_NEW = """
+    INSERT INTO best_times (year, game_id, category_id, gender, result_id, athlete_id, time)
+    SELECT {key_year}, NEW.game_id, NEW.category_id, NEW.gender, NEW.id, NEW.athlete_id, NEW.time
+    WHERE NEW.time IS NOT NULL AND {key_year} IS NOT NULL
+    ON CONFLICT (year, game_id, category_id, gender) DO UPDATE
+    SET result_id = excluded.result_id, athlete_id = excluded.athlete_id, time = excluded.time
+    WHERE excluded.time < best_times.time
+       OR (excluded.time = best_times.time AND excluded.result_id < best_times.result_id);
+"""
+
+_REFILL_OLD = (
+    "DELETE FROM best_times WHERE result_id = OLD.id;"
+    + _REFILL_GROUP.format(key_year="OLD.year", year_filter="year = OLD.year AND")
+    + _REFILL_GROUP.format(key_year=ALL_YEARS, year_filter="")
+)
+_OFFER_NEW_ALL = (
+    _OFFER_NEW.format(key_year="NEW.year")
+    + _OFFER_NEW.format(key_year=ALL_YEARS)
+)
+
+BEST_TIMES_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS best_times (
+        year INTEGER NOT NULL,
+        game_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL,
+        gender TEXT NOT NULL,
+        result_id INTEGER NOT NULL,
+        athlete_id INTEGER,
+        time INTEGER,
+        PRIMARY KEY (year, game_id, category_id, gender)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_best_times_result ON best_times (result_id)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_results_kids_best_insert
+    AFTER INSERT ON results_kids
+    BEGIN {_OFFER_NEW_ALL} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_results_kids_best_update
+    AFTER UPDATE ON results_kids
+    BEGIN {_REFILL_OLD} {_OFFER_NEW_ALL} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_results_kids_best_delete
+    AFTER DELETE ON results_kids
+    BEGIN {_REFILL_OLD} END
+    """,
+)
+
+_BEST_TIMES_SELECT = """
+    INSERT INTO best_times (year, game_id, category_id, gender, result_id, athlete_id, time)
+    SELECT {key_year}, game_id, category_id, gender, id, athlete_id, time
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (
+            PARTITION BY {partition}game_id, category_id, gender
+            ORDER BY time, id
+        ) AS rn
+        FROM results_kids
+        WHERE {year_filter} time IS NOT NULL AND id > ?
+    )
+    WHERE rn = 1
+"""
+
+# Chiave, partizione e filtro di _BEST_TIMES_SELECT per i record di ogni anno e
+# per quello su tutti gli anni
+_BEST_TIMES_KEYS = (
+    {"key_year": "year", "partition": "year, ", "year_filter": "year IS NOT NULL AND"},
+    {"key_year": str(ALL_YEARS), "partition": "", "year_filter": ""},
+)
+
+
+def rebuild_best_times(conn):
+    """Ricostruisce da zero best_times a partire da results_kids."""
+    conn.execute("DELETE FROM best_times")
+    for keys in _BEST_TIMES_KEYS:
+        conn.execute(_BEST_TIMES_SELECT.format(**keys), (0,))
+
+
+# --- Record personali per atleta e gioco (ragazzi) ---
+
+# Stesso schema di best_times, con gruppo (atleta, gioco): i tempi senza atleta
+# o senza tempo non sono record personali.
+_PB_REFILL_OLD = """
+    DELETE FROM personal_bests WHERE result_id = OLD.id;
+    INSERT INTO personal_bests (athlete_id, game_id, result_id, time, year)
+    SELECT athlete_id, game_id, id, time, year
+    FROM results_kids
+    WHERE athlete_id = OLD.athlete_id AND game_id = OLD.game_id AND time IS NOT NULL
+    ORDER BY time, id
+    LIMIT 1
+    ON CONFLICT (athlete_id, game_id) DO NOTHING;
+"""
+
+_PB_OFFER_NEW = """
+    INSERT INTO personal_bests (athlete_id, game_id, result_id, time, year)
+    SELECT NEW.athlete_id, NEW.game_id, NEW.id, NEW.time, NEW.year
+    WHERE NEW.athlete_id IS NOT NULL AND NEW.time IS NOT NULL
+    ON CONFLICT (athlete_id, game_id) DO UPDATE
+    SET result_id = excluded.result_id, time = excluded.time, year = excluded.year
+    WHERE excluded.time < personal_bests.time
+       OR (excluded.time = personal_bests.time AND excluded.result_id < personal_bests.result_id);
+"""
+
+PERSONAL_BESTS_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS personal_bests (
+        athlete_id INTEGER NOT NULL,
+        game_id INTEGER NOT NULL,
+        result_id INTEGER NOT NULL,
+        time INTEGER,
+        year INTEGER,
+        PRIMARY KEY (athlete_id, game_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_personal_bests_result ON personal_bests (result_id)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_results_kids_pb_insert
+    AFTER INSERT ON results_kids
+    BEGIN {_PB_OFFER_NEW} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_results_kids_pb_update
+    AFTER UPDATE ON results_kids
+    BEGIN {_PB_REFILL_OLD} {_PB_OFFER_NEW} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_results_kids_pb_delete
+    AFTER DELETE ON results_kids
+    BEGIN {_PB_REFILL_OLD} END
+    """,
+)
+
+_PERSONAL_BESTS_SELECT = """
+    INSERT INTO personal_bests (athlete_id, game_id, result_id, time, year)
+    SELECT athlete_id, game_id, id, time, year
+    FROM (
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY athlete_id, game_id ORDER BY time, id) AS rn
+        FROM results_kids
+        WHERE athlete_id IS NOT NULL AND time IS NOT NULL AND id > ?
+    )
+    WHERE rn = 1
+"""
+
+
+def rebuild_personal_bests(conn):
+    """Ricostruisce da zero personal_bests a partire da results_kids."""
+    conn.execute("DELETE FROM personal_bests")
+    conn.execute(_PERSONAL_BESTS_SELECT, (0,))
+
+
+def merge_personal_bests(conn, after_id):
+    """Aggiorna personal_bests con le sole righe di results_kids con id > after_id."""
+    conn.execute(
+        _PERSONAL_BESTS_SELECT
+        + """
+        ON CONFLICT (athlete_id, game_id) DO UPDATE
+        SET result_id = excluded.result_id, time = excluded.time, year = excluded.year
+        WHERE excluded.time < personal_bests.time
+           OR (excluded.time = personal_bests.time AND excluded.result_id < personal_bests.result_id)
+        """, (after_id,)
+    )
+
+
+# --- Contatore delle modifiche ai tempi dei ragazzi (vedi board.py) ---
+
+# Chiave in meta incrementata a ogni modifica o eliminazione in results_kids:
+# chi segue i nuovi tempi per id sa così quando deve rileggere tutto.
+EDITS_KEY = "results_kids_edits"
+
+_COUNT_EDIT = f"""
+    INSERT INTO meta (key, value) VALUES ('{EDITS_KEY}', 1)
+    ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1;
+"""
+
+EDITS_SCHEMA = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_results_kids_edits_update
+    AFTER UPDATE ON results_kids
+    BEGIN {_COUNT_EDIT} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_results_kids_edits_delete
+    AFTER DELETE ON results_kids
+    BEGIN {_COUNT_EDIT} END
+    """,
+)
+
+
+# --- Statistiche annuali pre-aggregate (grafici) ---
+
+# Tabelle dei tempi con statistiche per (anno, gioco, categoria, genere)
+STATS_TABLES = ("results", "results_kids")
+
+# Partecipazioni, tempo migliore e mediana dei gruppi che soddisfano `where`.
+# La mediana è la media dei due tempi centrali (dell'unico, se sono dispari);
+# le righe senza tempo contano solo come partecipazioni, quelle senza anno
+# non hanno un gruppo (year_stats.year non può essere NULL).
+_YEAR_STATS_SELECT = """
+    INSERT INTO year_stats (source, year, game_id, category_id, gender, runs, best_time, median_time)
+    SELECT '{table}', year, game_id, category_id, gender, COUNT(*), MIN(time),
+           CAST(ROUND(AVG(CASE WHEN rn IN ((timed + 1) / 2, (timed + 2) / 2) THEN time END)) AS INTEGER)
+    FROM (
+        SELECT year, game_id, category_id, gender, time,
+               ROW_NUMBER() OVER (PARTITION BY year, game_id, category_id, gender
+                                  ORDER BY time NULLS LAST) AS rn,
+               COUNT(time) OVER (PARTITION BY year, game_id, category_id, gender) AS timed
+        FROM {table}
+        WHERE year IS NOT NULL AND ({where})
+    )
+    GROUP BY year, game_id, category_id, gender;
+"""
+
+# Ricalcola il solo gruppo della riga OLD o NEW: una scansione sull'indice
+# idx_<tabella>_year_group, proporzionale alle righe del gruppo.
+_GROUP_WHERE = (
+    "year = {row}.year AND game_id = {row}.game_id "
+    "AND category_id = {row}.category_id AND gender = {row}.gender"
+)
+
+
+def _refresh_group(table, row):
+    where = _GROUP_WHERE.format(row=row)
+    return (
+        f"DELETE FROM year_stats WHERE source = '{table}' AND {where};"
+        + _YEAR_STATS_SELECT.format(table=table, where=where)
+    )
+
+
+YEAR_STATS_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS year_stats (
+        source TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        game_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL,
+        gender TEXT NOT NULL,
+        runs INTEGER NOT NULL,
+        best_time INTEGER,
+        median_time INTEGER,
+        PRIMARY KEY (source, game_id, category_id, year, gender)
+    ) WITHOUT ROWID
+    """,
+) + tuple(
+    statement
+    for table in STATS_TABLES
+    for statement in (
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_insert
+        AFTER INSERT ON {table}
+        BEGIN {_refresh_group(table, "NEW")} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_update
+        AFTER UPDATE ON {table}
+        BEGIN {_refresh_group(table, "OLD")} {_refresh_group(table, "NEW")} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_stats_delete
+        AFTER DELETE ON {table}
+        BEGIN {_refresh_group(table, "OLD")} END
+        """,
+    )
+)
+
+
+def rebuild_year_stats(conn):
+    """Ricostruisce da zero year_stats a partire dalle tabelle dei tempi."""
+    conn.execute("DELETE FROM year_stats")
+    for table in STATS_TABLES:
+        conn.execute(_YEAR_STATS_SELECT.format(table=table, where="1"))
+
+
+def refresh_year_stats(conn, table, after_id):
+    """Ricalcola i soli gruppi di `table` toccati dalle righe con id > after_id."""
+    touched = (
+        "(year, game_id, category_id, gender) IN "
+        f"(SELECT DISTINCT year, game_id, category_id, gender FROM {table} WHERE id > ?)"
+    )
+    conn.execute(f"DELETE FROM year_stats WHERE source = ? AND {touched}", (table, after_id))
+    conn.execute(_YEAR_STATS_SELECT.format(table=table, where=touched), (after_id,))
+
+
+# --- Indici full-text (FTS5, tokenizer trigram) per la ricerca sui nomi ---
+
+# Testi più corti di un trigramma non possono usare l'indice
+FTS_MIN_LENGTH = 3
+
+# Colonne indicizzate per ciascuna tabella
+FTS_COLUMNS = {
+    "games": ("name",),
+    "athletes": ("name",),
+    "players": ("first_name", "last_name"),
+}
+
+# Per ogni tabella consultabile: colonne chiave e tabella in cui cercare il testo
+SEARCH_TARGETS = {
+    "results": (("game_id", "games"),),
+    "results_kids": (("athlete_id", "athletes"), ("game_id", "games")),
+    "players": (("id", "players"), ("game_id", "games")),
+}
+
+# Tabelle per cui l'indice è disponibile (FTS5 con trigram richiede SQLite >= 3.34)
+_fts_tables = set()
+
+
+def _fts_statements(table, columns):
+    fts = f"{table}_fts"
+    cols = ", ".join(columns)
+    new_values = ", ".join(f"NEW.{c}" for c in columns)
+    old_values = ", ".join(f"OLD.{c}" for c in columns)
+    delete_old = f"INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', OLD.id, {old_values});"
+    insert_new = f"INSERT INTO {fts} (rowid, {cols}) VALUES (NEW.id, {new_values});"
+    return (
+        f"CREATE VIRTUAL TABLE {fts} USING fts5("
+        f"{cols}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {cols} ON {table} "
+        f"BEGIN {delete_old} {insert_new} END",
+        # Indicizza le righe già presenti
+        f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+    )
+
+
+def create_fts_index(conn, table):
+    """Crea (una volta sola) l'indice full-text di `table` e i trigger che lo aggiornano."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (f"{table}_fts",)
+    ).fetchone()
+    if not exists:
+        try:
+            conn.execute("SAVEPOINT create_fts")
+            for statement in _fts_statements(table, FTS_COLUMNS[table]):
+                conn.execute(statement)
+            conn.execute("RELEASE create_fts")
+        except sqlite3.OperationalError:
+            # SQLite senza FTS5/trigram: la ricerca ripiega su LIKE
+            conn.execute("ROLLBACK TO create_fts")
+            conn.execute("RELEASE create_fts")
+            return
+    _fts_tables.add(table)
+
+
+def fts_phrase(text):
+    """Converte il testo cercato in una frase FTS5 (sottostringa, maiuscole ignorate)."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def match_ids(table, text):
+    """
+    Sottoquery (e parametri) con gli id delle righe di `table` che contengono
+    `text`: usa l'indice full-text se disponibile, altrimenti LIKE.
+    """
+    text = text.strip()
+    if table in _fts_tables and len(text) >= FTS_MIN_LENGTH:
+        return f"SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?", [fts_phrase(text)]
+    columns = FTS_COLUMNS[table]
+    return (
+        f"SELECT id FROM {table} WHERE " + " OR ".join(f"{c} LIKE ?" for c in columns),
+        [f"%{text}%"] * len(columns),
+    )
+
+
+def search_condition(table, text, targets=None):
+    """
+    Condizione WHERE (e parametri) che filtra `table` sulle righe il cui atleta,
+    gioco o nome contiene `text` (vedi SEARCH_TARGETS).
+    """
+    conditions, params = [], []
+    for column, target in targets or SEARCH_TARGETS[table]:
+        subquery, sub_params = match_ids(target, text)
+        conditions.append(f"{column} IN ({subquery})")
+        params.extend(sub_params)
+    return "(" + " OR ".join(conditions) + ")", params
+
+
+# --- Inserimenti massivi ---
+
+# Trigger di riga sostituiti, durante un inserimento massivo, da un unico
+# aggiornamento per blocco (vedi bulk_insert)
+BULK_PAUSED_TRIGGERS = {
+    "results": ("trg_results_stats_insert",),
+    "results_kids": ("trg_results_kids_best_insert", "trg_results_kids_pb_insert", "trg_results_kids_stats_insert"),
+    "players": ("players_fts_insert",),
+}
+
+
+def merge_best_times(conn, after_id):
+    """Aggiorna best_times con le sole righe di results_kids con id > after_id."""
+    for keys in _BEST_TIMES_KEYS:
+        conn.execute(
+            _BEST_TIMES_SELECT.format(**keys)
+            + """
+            ON CONFLICT (year, game_id, category_id, gender) DO UPDATE
+            SET result_id = excluded.result_id, athlete_id = excluded.athlete_id, time = excluded.time
+            WHERE excluded.time < best_times.time
+               OR (excluded.time = best_times.time AND excluded.result_id < best_times.result_id)
+            """, (after_id,)
+        )
+
+
+def _resolve_dimensions(conn, table, columns, rows):
+    """Sostituisce nelle righe i nomi di gioco, categoria e atleta con le loro chiavi."""
+    positions = [i for i, c in enumerate(columns) if c in DIMENSIONS]
+    if not positions:
+        return columns, rows
+    stored = tuple(DIMENSIONS[c][0] if c in DIMENSIONS else c for c in columns)
+    if table == "players" and "athlete_id" not in stored:
+        stored += ("athlete_id",)
+    first, last = (columns.index("first_name"), columns.index("last_name")) if table == "players" else (None, None)
+    keys = {}
+
+    def key(dimension, name):
+        if (dimension, name) not in keys:
+            keys[dimension, name] = dimension_id(conn, dimension, name)
+        return keys[dimension, name]
+
+    resolved = []
+    for row in rows:
+        row = list(row)
+        for i in positions:
+            row[i] = key(DIMENSIONS[columns[i]][1], row[i])
+        if first is not None:
+            row.append(key("athletes", player_athlete_name(row[first], row[last])))
+        resolved.append(row)
+    return stored, resolved
+
+
+def insert_rows(conn, table, columns, rows):
+    """
+    Inserisce le righe nella transazione aperta su `conn` con un solo executemany;
+    le colonne con il nome di gioco, categoria o atleta sono convertite nelle
+    rispettive chiavi. Adatta a blocchi piccoli: i trigger restano attivi.
+    """
+    columns, rows = _resolve_dimensions(conn, table, columns, rows)
+    conn.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        rows
+    )
+
+
+@contextmanager
+def paused_triggers(conn, names):
+    """
+    Sospende i trigger `names` dentro la transazione in corso e li ricrea
+    all'uscita: chi li sospende deve fare lo stesso lavoro in blocco.
+    """
+    saved = conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name IN ({', '.join('?' * len(names))})",
+        tuple(names)
+    ).fetchall() if names else []
+    for name, _ in saved:
+        conn.execute(f"DROP TRIGGER {name}")
+    yield
+    for _, sql in saved:
+        conn.execute(sql)
+
+
+def bulk_insert(conn, table, columns, rows):
+    """
+    Come insert_rows, per molte righe.
+    I trigger di inserimento per riga (indice full-text, classifica) vengono
+    sospesi e il loro lavoro è fatto con una sola istruzione per tutto il blocco:
+    un INSERT per riga nell'indice FTS5 ne svuota il buffer ogni volta ed è circa
+    dieci volte più lento. La sospensione vale solo dentro la transazione.
+    """
+    after_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+    with paused_triggers(conn, BULK_PAUSED_TRIGGERS.get(table, ())):
+        insert_rows(conn, table, columns, rows)
+        if table in _fts_tables:
+            fts_columns = ", ".join(FTS_COLUMNS[table])
+            conn.execute(
+                f"INSERT INTO {table}_fts (rowid, {fts_columns}) "
+                f"SELECT id, {fts_columns} FROM {table} WHERE id > ?",
+                (after_id,)
+            )
+        if table == "results_kids":
+            merge_best_times(conn, after_id)
+            merge_personal_bests(conn, after_id)
+        if table in STATS_TABLES:
+            refresh_year_stats(conn, table, after_id)
+
+
+# --- Archivi per anno delle stagioni concluse (vedi archive.py) ---
+
+# Cartella dei file di archivio, uno per anno: <database>-<anno>.db
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "archive")
+
+# Anni archiviati, con il file e il numero di righe spostate. I tempi di un anno
+# archiviato non si possono più inserire né modificare in DATABASE: ci pensano i
+# trigger, qualunque sia la strada della scrittura (app, importazione, servizio).
+ARCHIVES_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS archives (
+        year INTEGER PRIMARY KEY,
+        path TEXT NOT NULL,
+        results INTEGER NOT NULL,
+        results_kids INTEGER NOT NULL,
+        created TEXT NOT NULL
+    )
+    """,
+) + tuple(
+    statement
+    for table in STATS_TABLES
+    for statement in (
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_archived_insert
+        BEFORE INSERT ON {table}
+        WHEN NEW.year IN (SELECT year FROM archives)
+        BEGIN SELECT RAISE(ABORT, 'anno archiviato'); END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_archived_update
+        BEFORE UPDATE OF year ON {table}
+        WHEN NEW.year IN (SELECT year FROM archives)
+        BEGIN SELECT RAISE(ABORT, 'anno archiviato'); END
+        """,
+    )
+)
+
+# Trigger di riga sospesi quando un anno intero esce da DATABASE: classifica,
+# record personali e statistiche vengono poi ricalcolati una volta sola
+ARCHIVE_PAUSED_TRIGGERS = (
+    "trg_results_stats_delete",
+    "trg_results_kids_best_delete",
+    "trg_results_kids_pb_delete",
+    "trg_results_kids_stats_delete",
+    "trg_results_kids_edits_delete",
+)
+
+# Dimensioni mancanti in DATABASE quando un anno torna dall'archivio; le grafie
+# collegate nel frattempo a un altro atleta (athlete_aliases) non tornano atleti
+_RESTORE_DIMENSIONS = (
+    "INSERT OR IGNORE INTO main.games (name) SELECT name FROM archive.games",
+    "INSERT OR IGNORE INTO main.categories (name) SELECT name FROM archive.categories",
+    "INSERT OR IGNORE INTO main.athletes (name) SELECT name FROM archive.athletes "
+    "WHERE name NOT IN (SELECT name FROM main.athlete_aliases)",
+)
+
+# Righe dell'archivio con le chiavi di DATABASE, ritrovate per nome
+_RESTORE_ROWS = {
+    "results": """
+        INSERT INTO main.results (id, time, game_id, category_id, gender, year)
+        SELECT r.id, r.time, g.id, c.id, r.gender, r.year
+        FROM archive.results r
+        JOIN archive.games ag ON ag.id = r.game_id
+        JOIN main.games g ON g.name = ag.name
+        JOIN archive.categories ac ON ac.id = r.category_id
+        JOIN main.categories c ON c.name = ac.name
+    """,
+    "results_kids": """
+        INSERT INTO main.results_kids (id, athlete_id, time, game_id, category_id, gender, year)
+        SELECT k.id, COALESCE(a.id, al.athlete_id), k.time, g.id, c.id, k.gender, k.year
+        FROM archive.results_kids k
+        LEFT JOIN archive.athletes aa ON aa.id = k.athlete_id
+        LEFT JOIN main.athletes a ON a.name = aa.name
+        LEFT JOIN main.athlete_aliases al ON al.name = aa.name
+        JOIN archive.games ag ON ag.id = k.game_id
+        JOIN main.games g ON g.name = ag.name
+        JOIN archive.categories ac ON ac.id = k.category_id
+        JOIN main.categories c ON c.name = ac.name
+    """,
+}
+
+
+def archive_file(year, directory=ARCHIVE_DIR):
+    """Percorso del file di archivio di `year`."""
+    stem = os.path.splitext(os.path.basename(DATABASE))[0]
+    return os.path.join(directory, f"{stem}-{year}.db")
+
+
+def archive_uri(path, created=""):
+    """
+    URI di sola lettura di un archivio. Con immutable SQLite non prende lock né
+    controlla se il file è cambiato; `created` distingue un archivio ricreato
+    (SQLite ignora il parametro), così le sessioni aprono nuove connessioni.
+    """
+    uri = f"file:{path}?mode=ro&immutable=1"
+    return f"{uri}&created={created}" if created else uri
+
+
+def archived_years():
+    """Anni archiviati -> URI di sola lettura del loro archivio."""
+    return {
+        year: archive_uri(path, created)
+        for year, path, created in cached_query(DATABASE, "SELECT year, path, created FROM archives")
+    }
+
+
+def partitions(year=None):
+    """
+    Database in cui leggere i tempi di `year`: l'archivio dell'anno se è
+    archiviato, altrimenti DATABASE. Con year=None (tutti gli anni) gli archivi
+    dal più vecchio e per ultimo DATABASE.
+    """
+    archives = archived_years()
+    if year is not None:
+        return [archives.get(int(year), DATABASE)]
+    return [archives[y] for y in sorted(archives)] + [DATABASE]
+
+
+def partitioned_query(sql, params=(), year=None):
+    """
+    Esegue la stessa SELECT su ogni database di partitions(year) e ne concatena
+    le righe: gli archivi hanno lo schema di DATABASE (tabelle, viste, classifica,
+    record personali e statistiche dei propri tempi). Ogni archivio ha la sua
+    cache, che non scade mai perché il file non cambia.
+    """
+    rows = []
+    for path in partitions(year):
+        rows.extend(cached_query(path, sql, params))
+    return rows
+
+
+def _refresh_year(conn, year):
+    """Classifica, record personali e statistiche dopo che `year` è uscito o rientrato."""
+    # DATABASE contiene solo le stagioni non archiviate: ricostruire costa poco
+    rebuild_best_times(conn)
+    rebuild_personal_bests(conn)
+    conn.execute("DELETE FROM year_stats WHERE year = ?", (year,))
+    for table in STATS_TABLES:
+        conn.execute(_YEAR_STATS_SELECT.format(table=table, where="year = ?"), (year,))
+    # Le classifiche in diretta (board.py) vanno rilette per intero
+    conn.execute(_COUNT_EDIT)
+
+
+def remove_archived_year(conn, year):
+    """
+    Elimina da DATABASE i tempi di `year`, già copiati e verificati nell'archivio
+    (vedi archive.py). Va eseguita nella transazione della verifica, che registra
+    poi l'anno in archives; restituisce le righe eliminate per tabella.
+    """
+    removed = {}
+    with paused_triggers(conn, ARCHIVE_PAUSED_TRIGGERS):
+        for table in TIME_TABLES:
+            removed[table] = conn.execute(f"DELETE FROM {table} WHERE year = ?", (year,)).rowcount
+    _refresh_year(conn, year)
+    return removed
+
+
+def restore_archived_year(conn, year):
+    """
+    Riporta in DATABASE i tempi di `year` dall'archivio collegato come "archive"
+    (ATTACH), con gli stessi id. Va eseguita in una transazione; restituisce le
+    righe inserite per tabella.
+    """
+    conn.execute("DELETE FROM archives WHERE year = ?", (year,))
+    for statement in _RESTORE_DIMENSIONS:
+        conn.execute(statement)
+    restored = {}
+    names = BULK_PAUSED_TRIGGERS["results"] + BULK_PAUSED_TRIGGERS["results_kids"]
+    with paused_triggers(conn, names):
+        for table, statement in _RESTORE_ROWS.items():
+            restored[table] = conn.execute(statement).rowcount
+    _refresh_year(conn, year)
+    return restored
+
+
+# --- Migrazioni dello schema ---
+
+# I vecchi tempi non avevano vincoli: un anno fuori da YEAR_MIN-YEAR_MAX o un
+# tempo negativo violerebbero i CHECK delle nuove tabelle e bloccherebbero
+# l'avvio. Le righe vengono copiate senza il valore non valido (NULL) e
+# contate nel log.
+def _checked_year(column):
+    """Espressione SQL: l'anno di `column`, NULL se fuori intervallo."""
+    return f"CASE WHEN {column} BETWEEN {YEAR_MIN} AND {YEAR_MAX} THEN {column} END"
+
+
+def _seconds_to_ms(column):
+    """Espressione SQL: il tempo in secondi di `column` in millisecondi interi, NULL se negativo."""
+    return f"CASE WHEN {column} >= 0 THEN CAST(ROUND({column} * 1000) AS INTEGER) END"
+
+
+def _warn_invalid_rows(conn, table, source):
+    """Segnala nel log le righe di `table` che verranno copiate senza anno o senza tempo."""
+    years, times = conn.execute(
+        f"SELECT COUNT(CASE WHEN year NOT BETWEEN {YEAR_MIN} AND {YEAR_MAX} THEN 1 END), "
+        f"COUNT(CASE WHEN time < 0 THEN 1 END) FROM {table}"
+    ).fetchone()
+    if years:
+        log.warning("%s: %d righe con anno fuori da %d-%d copiate senza anno", source, years, YEAR_MIN, YEAR_MAX)
+    if times:
+        log.warning("%s: %d righe con tempo negativo copiate senza tempo", source, times)
+
+
+def _migrate_times_to_ms(conn):
+    """Tempi da secondi REAL a millisecondi interi, con i vincoli su tempo e anno."""
+    if conn.execute("SELECT type FROM pragma_table_info('results') WHERE name='time'").fetchone() != ("REAL",):
+        return
+    # Viste e classifica dipendono dalle tabelle ricostruite: init_db le ricrea
+    conn.execute("DROP VIEW IF EXISTS results_view")
+    conn.execute("DROP VIEW IF EXISTS results_kids_view")
+    for trigger in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_results_kids_best_{trigger}")
+    conn.execute("DROP TABLE IF EXISTS best_times")
+    for table, columns in TIME_TABLES.items():
+        names = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        checked = {"time": _seconds_to_ms("time"), "year": _checked_year("year")}
+        values = ", ".join(checked.get(name, name) for name in names)
+        _warn_invalid_rows(conn, table, table)
+        sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (table,)).fetchone()
+        conn.execute(f"CREATE TABLE {table}_new ({columns})")
+        conn.execute(f"INSERT INTO {table}_new ({', '.join(names)}) SELECT {values} FROM {table}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        if sequence:
+            # Gli id eliminati in coda non vengono riassegnati
+            conn.execute("UPDATE sqlite_sequence SET seq=? WHERE name=?", (sequence[0], table))
+
+
+# Migrazioni in ordine di versione (PRAGMA user_version). Ogni funzione deve
+# lasciare invariato un database che non ne ha bisogno, compreso uno vuoto.
+def _drop_athlete_index(conn):
+    """L'indice sul solo atleta è un prefisso di idx_results_kids_athlete_game."""
+    conn.execute("DROP INDEX IF EXISTS idx_results_kids_athlete")
+
+
+def _reset_best_times(conn):
+    """Classifica ricostruita da init_db con i trigger che ignorano i tempi mancanti."""
+    for trigger in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_results_kids_best_{trigger}")
+    conn.execute("DROP TABLE IF EXISTS best_times")
+
+
+def _reset_personal_bests(conn):
+    """Record personali ricostruiti da init_db con i trigger che ignorano i tempi mancanti."""
+    for trigger in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_results_kids_pb_{trigger}")
+    conn.execute("DROP TABLE IF EXISTS personal_bests")
+
+
+MIGRATIONS = (
+    (1, _migrate_times_to_ms),
+    (2, _drop_athlete_index),
+    (3, _reset_best_times),
+    (4, _reset_personal_bests),
+)
+
+
+def run_migrations(conn):
+    """Porta il database all'ultima versione, una migrazione per transazione."""
+    conn.commit()
+    for version, migrate in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Letta sotto lock: un altro processo può averla appena applicata
+            if conn.execute("PRAGMA user_version").fetchone()[0] < version:
+                migrate(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+# --- Migrazione dai vecchi database separati ---
+
+# Per ogni tabella dei vecchi database: dimensioni da popolare (tabella, espressione
+# sul nome) e copia delle righe con i nomi sostituiti dalle chiavi. Gli id delle
+# righe sono conservati e i tempi convertiti da secondi a millisecondi. {legacy}
+# è il nome con cui il vecchio database è collegato (ATTACH).
+_LEGACY_COPY = {
+    "results": (
+        (
+            "INSERT OR IGNORE INTO games (name) SELECT DISTINCT COALESCE(TRIM(game_name), '') FROM {legacy}.results",
+            "INSERT OR IGNORE INTO categories (name) SELECT DISTINCT COALESCE(category, '') FROM {legacy}.results",
+        ),
+        f"""
+        INSERT INTO results (id, time, game_id, category_id, gender, year)
+        SELECT r.id, {_seconds_to_ms("r.time")}, g.id, c.id, COALESCE(r.gender, 'NA'), {_checked_year("r.year")}
+        FROM {{legacy}}.results r
+        JOIN games g ON g.name = COALESCE(TRIM(r.game_name), '')
+        JOIN categories c ON c.name = COALESCE(r.category, '')
+        """,
+    ),
+    "results_kids": (
+        (
+            "INSERT OR IGNORE INTO games (name) "
+            "SELECT DISTINCT COALESCE(TRIM(game_name), '') FROM {legacy}.results_kids",
+            "INSERT OR IGNORE INTO categories (name) "
+            "SELECT DISTINCT COALESCE(category, '') FROM {legacy}.results_kids",
+            "INSERT OR IGNORE INTO athletes (name) SELECT DISTINCT TRIM(nome) FROM {legacy}.results_kids "
+            "WHERE TRIM(COALESCE(nome, '')) <> ''",
+        ),
+        f"""
+        INSERT INTO results_kids (id, athlete_id, time, game_id, category_id, gender, year)
+        SELECT k.id, a.id, {_seconds_to_ms("k.time")}, g.id, c.id, COALESCE(k.gender, 'NA'),
+               {_checked_year("k.year")}
+        FROM {{legacy}}.results_kids k
+        LEFT JOIN athletes a ON a.name = TRIM(k.nome)
+        JOIN games g ON g.name = COALESCE(TRIM(k.game_name), '')
+        JOIN categories c ON c.name = COALESCE(k.category, '')
+        """,
+    ),
+    "players": (
+        (
+            "INSERT OR IGNORE INTO games (name) SELECT DISTINCT TRIM(game) FROM {legacy}.players",
+            "INSERT OR IGNORE INTO categories (name) SELECT DISTINCT category FROM {legacy}.players",
+            "INSERT OR IGNORE INTO athletes (name) "
+            "SELECT DISTINCT TRIM(TRIM(first_name) || ' ' || TRIM(last_name)) FROM {legacy}.players "
+            "WHERE TRIM(first_name || last_name) <> ''",
+        ),
+        """
+        INSERT INTO players (id, athlete_id, first_name, last_name, game_id, category_id, gender, status)
+        SELECT p.id, a.id, p.first_name, p.last_name, g.id, c.id, p.gender, p.status
+        FROM {legacy}.players p
+        LEFT JOIN athletes a ON a.name = TRIM(TRIM(p.first_name) || ' ' || TRIM(p.last_name))
+        JOIN games g ON g.name = TRIM(p.game)
+        JOIN categories c ON c.name = p.category
+        """,
+    ),
+}
+
+
+def migrate_legacy_databases(conn):
+    """
+    Copia in DATABASE i dati di database1/2/3.db, se presenti, una volta sola.
+    Va eseguita prima di creare indici, trigger e classifica, che vengono poi
+    popolati in blocco sulle righe copiate.
+
+    Tutte le copie e il marcatore legacy_migrated sono scritti in un'unica
+    transazione: se una copia fallisce non resta nulla di importato e al
+    prossimo avvio l'importazione riparte da capo.
+    """
+    if conn.execute("SELECT 1 FROM meta WHERE key='legacy_migrated'").fetchone():
+        return
+    # ATTACH non è ammesso dentro una transazione: i vecchi database vengono
+    # collegati tutti prima, ciascuno con il proprio nome
+    conn.commit()
+    attached = []
+    try:
+        for filename, table in LEGACY_DATABASES:
+            if os.path.exists(filename):
+                schema = f"legacy_{table}"
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (filename,))
+                attached.append((filename, schema, table))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Riletto sotto lock: un altro processo può aver appena importato
+            if not conn.execute("SELECT 1 FROM meta WHERE key='legacy_migrated'").fetchone():
+                for filename, schema, table in attached:
+                    exists = conn.execute(
+                        f"SELECT 1 FROM {schema}.sqlite_master WHERE type='table' AND name=?", (table,)
+                    ).fetchone()
+                    if exists:
+                        if table in TIME_TABLES:
+                            _warn_invalid_rows(conn, f"{schema}.{table}", filename)
+                        dimensions, copy = _LEGACY_COPY[table]
+                        for statement in dimensions + (copy,):
+                            conn.execute(statement.format(legacy=schema))
+                conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_migrated', '1')")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    finally:
+        for _, schema, _ in attached:
+            conn.execute(f"DETACH DATABASE {schema}")
+
+
+# --- Inizializza i database creando le tabelle se non esistono ---
+
+def init_db():
+    """
+    Aggiorna lo schema con le migrazioni, crea le tabelle mancanti e importa al
+    primo avvio i vecchi database.
+    """
+    with connection(DATABASE) as conn:
+        run_migrations(conn)
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.executemany("INSERT OR IGNORE INTO categories (name) VALUES (?)", [(c,) for c in CATEGORIES])
+        migrate_legacy_databases(conn)
+    with transaction(DATABASE) as conn:
+        for statement in INDEXES:
+            conn.execute(statement)
+        for statement in BEST_TIMES_SCHEMA:
+            conn.execute(statement)
+        if conn.execute("SELECT 1 FROM best_times LIMIT 1").fetchone() is None:
+            rebuild_best_times(conn)
+        for statement in PERSONAL_BESTS_SCHEMA:
+            conn.execute(statement)
+        if conn.execute("SELECT 1 FROM personal_bests LIMIT 1").fetchone() is None:
+            rebuild_personal_bests(conn)
+        for statement in YEAR_STATS_SCHEMA + EDITS_SCHEMA:
+            conn.execute(statement)
+        if conn.execute("SELECT 1 FROM year_stats LIMIT 1").fetchone() is None:
+            rebuild_year_stats(conn)
+        for statement in ARCHIVES_SCHEMA:
+            conn.execute(statement)
+        for table in FTS_COLUMNS:
+            create_fts_index(conn, table)
+
+
+def init_db_users():
+    """Crea la tabella degli utenti (password già sottoposte a hash con bcrypt)."""
+    with transaction(DATABASE_USERS) as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                password_hash BLOB NOT NULL,
+                is_admin INTEGER NOT NULL DEFAULT 0,
+                active INTEGER NOT NULL DEFAULT 1
+            )
+            """
+        )
+        # Impostazioni persistenti (es. chiave di firma dei token di sessione)
+        conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+
+_initialized = False
+_init_lock = threading.Lock()
+
+
+def init_databases():
+    """Crea gli schemi una sola volta per processo, non a ogni rerun."""
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if not _initialized:
+            init_db()
+            init_db_users()
+            _initialized = True
+
+
+# --- Funzioni di utilità per i tempi (Tab 1-3) ---
+
+# I tempi passati e restituiti dalle funzioni seguenti sono in millisecondi interi
+# (vedi formats.py per conversione e formattazione). Le scritture passano dalla
+# coda del thread scrittore (write); gli inserimenti restituiscono l'id della
+# nuova riga. Le letture comprendono anche gli anni archiviati (partitions).
+
+
+def _time_key(time_ms, record_id):
+    """Ordine per (tempo, id) con i tempi mancanti in fondo."""
+    return time_ms is None, time_ms or 0, record_id
+
+
+def _checked(time_ms, year):
+    """Tempo e anno validati prima della scrittura (ValueError se non validi o se l'anno è archiviato)."""
+    time_ms = validate_time_ms(time_ms)
+    year = validate_year(year)
+    if year in archived_years():
+        raise ValueError(f"l'anno {year} è archiviato: i suoi tempi non si possono modificare")
+    return time_ms, year
+
+
+def insert_record_db1(time_value, game_name, category, gender, year):
+    time_value, year = _checked(time_value, year)
+
+    def insert(conn):
+        return conn.execute(
+            "INSERT INTO results (time, game_id, category_id, gender, year) VALUES (?, ?, ?, ?, ?)",
+            (time_value, dimension_id(conn, "games", game_name),
+             dimension_id(conn, "categories", category), gender, year)
+        ).lastrowid
+
+    return write(DATABASE, insert)
+
+
+def get_records_db1():
+    return partitioned_query("SELECT id, time, game_name, category, gender, year FROM results_view")
+
+
+def update_record_db1(record_id, new_time, new_game_name, new_category, new_gender, new_year):
+    new_time, new_year = _checked(new_time, new_year)
+
+    def update(conn):
+        conn.execute(
+            "UPDATE results SET time=?, game_id=?, category_id=?, gender=?, year=? WHERE id=?",
+            (new_time, dimension_id(conn, "games", new_game_name),
+             dimension_id(conn, "categories", new_category), new_gender, new_year, record_id)
+        )
+
+    write(DATABASE, update)
+
+
+def delete_record_db1(record_id):
+    execute(DATABASE, "DELETE FROM results WHERE id=?", (record_id,))
+
+
+# --- Funzioni di utilità per i tempi dei ragazzi ---
+
+def insert_record_db2(nome, time_value, game_name, category, year, gender):
+    if gender is None:
+        gender = "NA"
+    time_value, year = _checked(time_value, year)
+
+    def insert(conn):
+        return conn.execute(
+            "INSERT INTO results_kids (athlete_id, time, game_id, category_id, year, gender) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (dimension_id(conn, "athletes", nome), time_value, dimension_id(conn, "games", game_name),
+             dimension_id(conn, "categories", category), year, gender)
+        ).lastrowid
+
+    return write(DATABASE, insert)
+
+
+def get_records_db2():
+    return partitioned_query("SELECT id, nome, time, game_name, category, gender, year FROM results_kids_view")
+
+
+def update_record_db2(record_id, nome, new_time, new_game_name, new_category, new_year, new_gender):
+    if new_gender is None:
+        new_gender = "NA"
+    new_time, new_year = _checked(new_time, new_year)
+
+    def update(conn):
+        conn.execute(
+            "UPDATE results_kids SET athlete_id=?, time=?, game_id=?, category_id=?, year=?, gender=? "
+            "WHERE id=?",
+            (dimension_id(conn, "athletes", nome), new_time, dimension_id(conn, "games", new_game_name),
+             dimension_id(conn, "categories", new_category), new_year, new_gender, record_id)
+        )
+
+    write(DATABASE, update)
+
+
+def delete_record_db2(record_id):
+    execute(DATABASE, "DELETE FROM results_kids WHERE id=?", (record_id,))
+
+
+def get_min_times(year_filter=None):
+    # Lettura diretta della classifica materializzata (mantenuta dai trigger):
+    # una ricerca sulla chiave primaria, indipendente dalla dimensione dello storico.
+    # Per tutti gli anni si confrontano i record assoluti di DATABASE e di ogni archivio.
+    year = int(year_filter) if year_filter and year_filter != "Tutti" else None
+    best = {}
+    for row in partitioned_query(
+        "SELECT g.name, c.name, COALESCE(a.name, ''), b.gender, b.time AS min_time, b.result_id "
+        "FROM best_times b "
+        "JOIN games g ON g.id = b.game_id "
+        "JOIN categories c ON c.id = b.category_id "
+        "LEFT JOIN athletes a ON a.id = b.athlete_id "
+        "WHERE b.year=?",
+        (ALL_YEARS if year is None else year,),
+        year
+    ):
+        group = (row[0], row[1], row[3])
+        if group not in best or _time_key(row[4], row[5]) < _time_key(best[group][4], best[group][5]):
+            best[group] = row
+    return [row[:5] for row in best.values()]
+
+
+# --- Classifiche complete per gioco, categoria e genere (ragazzi) ---
+
+def get_leaderboard(game_name, category, gender, year=None, after=None, page_size=PAGE_SIZE):
+    """
+    Una pagina della classifica di un gioco, categoria e genere, di un anno o di
+    tutti gli anni (year=None). Righe (posizione, nome, tempo, distacco dal primo,
+    id) in ordine di tempo; a parità di tempo la posizione è la stessa (1, 2, 2, 4).
+
+    `after` è il cursore restituito dalla pagina precedente: ultima chiave
+    (tempo, id), posizione e righe già contate, tempo del primo. Ogni pagina è
+    quindi una sola lettura sull'indice del gruppo, senza OFFSET né conteggi,
+    qualunque sia la sua posizione. Per tutti gli anni la stessa lettura è fatta
+    su DATABASE e su ogni archivio e le righe sono fuse per (tempo, id): gli id
+    restano unici anche negli archivi. Ritorna (righe, cursore successivo oppure None).
+    """
+    conditions = [
+        "k.game_id = (SELECT id FROM games WHERE name=?)",
+        "k.category_id = (SELECT id FROM categories WHERE name=?)",
+        "k.gender = ?",
+        "k.time IS NOT NULL",
+    ]
+    params = [game_name, category, gender]
+    if year is not None:
+        conditions.append("k.year = ?")
+        params.append(year)
+    if after is not None:
+        last_time, last_id, position, seen, leader = after
+        conditions.append("(k.time, k.id) > (?, ?)")
+        params.extend((last_time, last_id))
+    else:
+        last_time, position, seen, leader = None, 0, 0, None
+    params.append(page_size + 1)
+    rows = partitioned_query(
+        "SELECT k.id, COALESCE(a.name, ''), k.time FROM results_kids k "
+        "LEFT JOIN athletes a ON a.id = k.athlete_id "
+        f"WHERE {' AND '.join(conditions)} ORDER BY k.time, k.id LIMIT ?",
+        params,
+        year
+    )
+    rows = sorted(rows, key=lambda row: (row[2], row[0]))[:page_size + 1]
+    standings = []
+    for record_id, name, time_ms in rows[:page_size]:
+        seen += 1
+        if time_ms != last_time:
+            position, last_time = seen, time_ms
+        if leader is None:
+            leader = time_ms
+        standings.append((position, name, time_ms, time_ms - leader, record_id))
+    if len(rows) <= page_size:
+        return standings, None
+    return standings, (last_time, standings[-1][4], position, seen, leader)
+
+
+def get_podium(game_name, category, gender, year=None, places=3):
+    """Prime `places` posizioni della classifica, compresi tutti gli ex aequo dell'ultima."""
+    podium, cursor = get_leaderboard(game_name, category, gender, year, page_size=places)
+    while cursor is not None and podium[-1][0] <= places:
+        more, cursor = get_leaderboard(game_name, category, gender, year, after=cursor, page_size=places)
+        podium.extend(more)
+    return [row for row in podium if row[0] <= places]
+
+
+# --- Profilo atleta (ragazzi) ---
+
+# Ogni lettura parte dalle chiavi dell'atleta e legge solo le sue righe
+# (personal_bests e idx_results_kids_athlete_game), qualunque sia lo storico.
+
+
+def _athlete_ids(nome):
+    """
+    Sottoquery (e parametri) con le chiavi dell'atleta `nome` e delle grafie
+    collegate a lui (athlete_aliases): negli archivi i tempi restano sotto il
+    nome con cui erano stati registrati.
+    """
+    nome = nome.strip()
+    aliases = cached_query(
+        DATABASE,
+        "SELECT al.name FROM athlete_aliases al JOIN athletes a ON a.id = al.athlete_id WHERE a.name=?",
+        (nome,)
+    )
+    names = [nome] + [row[0] for row in aliases]
+    return f"(SELECT id FROM athletes WHERE name IN ({', '.join('?' * len(names))}))", names
+
+
+def get_personal_bests(nome):
+    """Record personale dell'atleta per ogni gioco: (gioco, tempo, anno, id del tempo)."""
+    ids, params = _athlete_ids(nome)
+    best = {}
+    for row in partitioned_query(
+        "SELECT g.name, pb.time, pb.year, pb.result_id FROM personal_bests pb "
+        "JOIN games g ON g.id = pb.game_id "
+        f"WHERE pb.athlete_id IN {ids}",
+        params
+    ):
+        game = row[0].lower()
+        if game not in best or _time_key(row[1], row[3]) < _time_key(best[game][1], best[game][3]):
+            best[game] = row
+    return [best[game] for game in sorted(best)]
+
+
+def get_athlete_progress(nome):
+    """
+    Andamento anno per anno dell'atleta in ogni gioco: (gioco, anno, tempi
+    registrati, migliore dell'anno, differenza rispetto all'anno precedente).
+    """
+    ids, params = _athlete_ids(nome)
+    # Ogni anno sta in un solo database: le righe si fondono senza sommarle
+    rows = partitioned_query(
+        "SELECT g.name, y.year, y.runs, y.best "
+        "FROM ("
+        "    SELECT game_id, year, COUNT(*) AS runs, MIN(time) AS best FROM results_kids "
+        f"    WHERE athlete_id IN {ids} GROUP BY game_id, year"
+        ") y JOIN games g ON g.id = y.game_id",
+        params
+    )
+    rows.sort(key=lambda row: (row[0].lower(), row[1] is not None, row[1] or 0))
+    progress, previous = [], None
+    for game, year, runs, best in rows:
+        diff = None
+        if previous is not None and previous[0].lower() == game.lower() and None not in (best, previous[3]):
+            diff = best - previous[3]
+        progress.append((game, year, runs, best, diff))
+        previous = (game, year, runs, best)
+    return progress
+
+
+def get_athlete_results(nome):
+    """Tutti i tempi dell'atleta, dal più recente: (id, tempo, gioco, categoria, sesso, anno)."""
+    ids, params = _athlete_ids(nome)
+    rows = partitioned_query(
+        "SELECT id, time, game_name, category, gender, year FROM results_kids_view "
+        f"WHERE athlete_id IN {ids}",
+        params
+    )
+    rows.sort(key=lambda row: (row[2].lower(), _time_key(row[1], row[0])))
+    # Ordinamento stabile: per anno decrescente, a parità per gioco e tempo
+    rows.sort(key=lambda row: (row[5] is None, -(row[5] or 0)))
+    return rows
+
+# --- Funzioni di utilità per i nomi dei ragazzi ---
+
+def add_player(first_name, last_name, game, category, gender, status):
+    """Inserisce un nuovo record nel database e ne restituisce l'id."""
+
+    def insert(conn):
+        return conn.execute(
+            "INSERT INTO players (athlete_id, first_name, last_name, game_id, category_id, gender, status) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (dimension_id(conn, "athletes", player_athlete_name(first_name, last_name)),
+             first_name, last_name, dimension_id(conn, "games", game),
+             dimension_id(conn, "categories", category), gender, status)
+        ).lastrowid
+
+    return write(DATABASE, insert)
+
+
+def get_all_players():
+    """Recupera tutti i record dal database."""
+    return cached_query(
+        DATABASE, "SELECT id, first_name, last_name, game, category, gender, status FROM players_view"
+    )
+
+
+def update_player(record_id, first_name, last_name, game, category, gender, status):
+    """Aggiorna un record esistente nel database."""
+
+    def update(conn):
+        conn.execute(
+            "UPDATE players SET athlete_id=?, first_name=?, last_name=?, game_id=?, category_id=?, "
+            "gender=?, status=? WHERE id=?",
+            (dimension_id(conn, "athletes", player_athlete_name(first_name, last_name)),
+             first_name, last_name, dimension_id(conn, "games", game),
+             dimension_id(conn, "categories", category), gender, status, record_id)
+        )
+
+    write(DATABASE, update)
+
+
+def delete_player(record_id):
+    """Elimina un record dal database."""
+    execute(DATABASE, "DELETE FROM players WHERE id=?", (record_id,))
+
+
+def get_players_by_category(category):
+    """
+    Recupera i giocatori (first_name, status, game) appartenenti alla categoria selezionata.
+    Ritorna una lista di tuple: (first_name, status, game)
+    """
+    return cached_query(
+        DATABASE,
+        "SELECT first_name, status, game FROM players_view "
+        "WHERE category_id = (SELECT id FROM categories WHERE name=?)",
+        (category,)
+    )
+
+
+
+# --- Statistiche per i grafici (lette da year_stats) ---
+
+def get_stats_groups(table):
+    """Coppie (gioco, categoria) con dati in `table` e numero totale di partecipazioni."""
+    totals = {}
+    for game, category, category_id, runs in partitioned_query(
+        "SELECT g.name, c.name, c.id, SUM(s.runs) FROM year_stats s "
+        "JOIN games g ON g.id = s.game_id "
+        "JOIN categories c ON c.id = s.category_id "
+        "WHERE s.source=? GROUP BY s.game_id, s.category_id",
+        (table,)
+    ):
+        group = (game, category, category_id)
+        totals[group] = totals.get(group, 0) + runs
+    groups = sorted(totals, key=lambda group: (group[0].lower(), group[2]))
+    return [(game, category, totals[game, category, category_id]) for game, category, category_id in groups]
+
+
+def get_years(table):
+    """Anni con almeno un tempo in `table`, dal più recente, compresi quelli archiviati."""
+    rows = partitioned_query("SELECT DISTINCT year FROM year_stats WHERE source=?", (table,))
+    return sorted({row[0] for row in rows}, reverse=True)
+
+
+def get_year_stats(table, game_name, category):
+    """Per ogni anno e genere di un gioco e categoria: partecipazioni, tempo migliore e mediano."""
+    rows = partitioned_query(
+        "SELECT year, gender, runs, best_time, median_time FROM year_stats "
+        "WHERE source=? AND game_id = (SELECT id FROM games WHERE name=?) "
+        "AND category_id = (SELECT id FROM categories WHERE name=?)",
+        (table, game_name, category)
+    )
+    return sorted(rows, key=lambda row: (row[0], row[1]))
+
+
+# --- Collegamento fra elenco nomi e atleti dei tempi (vedi reconcile.py) ---
+
+def get_roster():
+    """Giocatori dell'elenco nomi: (id, nome, cognome, gioco, categoria)."""
+    return cached_query(DATABASE, "SELECT id, first_name, last_name, game, category FROM players_view")
+
+
+def get_unlinked_athletes():
+    """Atleti con tempi registrati ma senza giocatore nell'elenco nomi: (id, nome, numero di tempi)."""
+    return cached_query(
+        DATABASE,
+        "SELECT a.id, a.name, COUNT(*) FROM athletes a "
+        "JOIN results_kids k ON k.athlete_id = a.id "
+        "WHERE NOT EXISTS (SELECT 1 FROM players p WHERE p.athlete_id = a.id) "
+        "GROUP BY a.id"
+    )
+
+
+def get_rejected_links():
+    """Coppie (giocatore, atleta) già scartate, da non proporre di nuovo."""
+    return cached_query(DATABASE, "SELECT player_id, athlete_id FROM rejected_links")
+
+
+def link_player_athlete(player_id, athlete_id):
+    """
+    Collega il giocatore all'atleta `athlete_id`, lo stesso ragazzo scritto in un
+    altro modo: i suoi tempi passano all'atleta del giocatore e la grafia diversa
+    resta in athlete_aliases, così anche i tempi inseriti in seguito con quel nome
+    finiscono allo stesso atleta.
+    """
+
+    def link(conn):
+        row = conn.execute("SELECT athlete_id FROM players WHERE id=?", (player_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"giocatore inesistente: {player_id}")
+        target = row[0]
+        if target is None:
+            conn.execute("UPDATE players SET athlete_id=? WHERE id=?", (athlete_id, player_id))
+            return
+        if target == athlete_id:
+            return
+        name = conn.execute("SELECT name FROM athletes WHERE id=?", (athlete_id,)).fetchone()
+        if name is None:
+            raise ValueError(f"atleta inesistente: {athlete_id}")
+        # I trigger aggiornano classifica, record personali e statistiche
+        for table in ("results_kids", "players", "athlete_aliases"):
+            conn.execute(f"UPDATE {table} SET athlete_id=? WHERE athlete_id=?", (target, athlete_id))
+        conn.execute(
+            "INSERT INTO athlete_aliases (name, athlete_id) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET athlete_id = excluded.athlete_id",
+            (name[0], target)
+        )
+        conn.execute("DELETE FROM athletes WHERE id=?", (athlete_id,))
+
+    write(DATABASE, link)
+
+
+def reject_player_link(player_id, athlete_id):
+    """Registra che l'atleta non è il giocatore, per non riproporre la coppia."""
+    execute(
+        DATABASE,
+        "INSERT OR IGNORE INTO rejected_links (player_id, athlete_id) VALUES (?, ?)",
+        (player_id, athlete_id)
+    )
+
+# --- Paginazione per chiave (keyset) delle tabelle di modifica/cancellazione ---
+
+# Per ogni tabella: vista da cui leggere, colonne mostrate e colonne ordinabili
+# (etichetta -> colonna, ognuna coperta da un indice). La ricerca usa SEARCH_TARGETS.
+PAGED_TABLES = {
+    "results": {
+        "view": "results_view",
+        "columns": ("id", "time", "game_name", "category", "gender", "year"),
+        "sort": {"ID": "id", "Tempo": "time", "Anno": "year"},
+    },
+    "results_kids": {
+        "view": "results_kids_view",
+        "columns": ("id", "nome", "time", "game_name", "category", "gender", "year"),
+        "sort": {"ID": "id", "Tempo": "time", "Anno": "year"},
+    },
+    "players": {
+        "view": "players_view",
+        "columns": ("id", "first_name", "last_name", "game", "category", "gender", "status"),
+        "sort": {"ID": "id", "Nome": "first_name", "Cognome": "last_name"},
+    },
+}
+
+
+def _after_cursor(column, descending, value, record_id):
+    """
+    Condizione (e parametri) delle righe che seguono il cursore (value, record_id)
+    nell'ordine di SQLite su (column, id), dove i NULL vengono prima di ogni
+    valore. Il confronto fra tuple con un NULL è NULL: tempi e anni mancanti
+    vanno trattati a parte, altrimenti la paginazione si ferma su di loro.
+    """
+    if value is None:
+        if descending:
+            return f"({column} IS NULL AND id < ?)", [record_id]
+        return f"({column} IS NOT NULL OR id > ?)", [record_id]
+    if descending:
+        return f"(({column}, id) < (?, ?) OR {column} IS NULL)", [value, record_id]
+    return f"({column}, id) > (?, ?)", [value, record_id]
+
+
+def get_page(table, sort="ID", descending=False, after=None, search="", page_size=PAGE_SIZE):
+    """
+    Restituisce una pagina di `table` ordinata lato server (solo DATABASE: i
+    tempi degli anni archiviati non si modificano).
+    `after` è il cursore (valore di ordinamento, id) dell'ultima riga della pagina
+    precedente: la query riparte da lì sull'indice invece di usare OFFSET, quindi
+    il costo non cresce con il numero di pagine. Ritorna (righe, cursore successivo
+    oppure None se è l'ultima pagina).
+    """
+    spec = PAGED_TABLES[table]
+    column = spec["sort"][sort]
+    direction = "DESC" if descending else "ASC"
+    conditions, params = [], []
+    if search.strip():
+        condition, search_params = search_condition(table, search)
+        conditions.append(condition)
+        params.extend(search_params)
+    if after is not None:
+        condition, after_params = _after_cursor(column, descending, *after)
+        conditions.append(condition)
+        params.extend(after_params)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    # Una riga in più per sapere se esiste una pagina successiva
+    params.append(page_size + 1)
+    rows = cached_query(
+        DATABASE,
+        f"SELECT {', '.join(spec['columns'])} FROM {spec['view']} {where} "
+        f"ORDER BY {column} {direction}, id {direction} LIMIT ?",
+        params
+    )
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, (last[spec["columns"].index(column)], last[0])
+
+
+# --- Ricerca durante la digitazione ---
+
+def search_game_names(text, limit=10):
+    """Nomi di gioco che contengono `text`, i più pertinenti prima."""
+    return _search_distinct("games", text, limit)
+
+
+def search_kid_names(text, limit=10):
+    """Nomi degli atleti che contengono `text`, i più pertinenti prima."""
+    return _search_distinct("athletes", text, limit)
+
+
+def _search_distinct(table, text, limit):
+    text = text.strip()
+    if not text:
+        return []
+    # Stessa ricerca per sottostringa dei filtri (indice full-text da tre
+    # caratteri, LIKE sotto), ordinata in SQL su tutte le corrispondenze prima
+    # del LIMIT: prima i nomi che iniziano con il testo cercato, poi i più corti.
+    # I nomi delle dimensioni sono già distinti.
+    subquery, params = match_ids(table, text)
+    rows = cached_query(
+        DATABASE,
+        f"SELECT name FROM {table} WHERE id IN ({subquery}) AND name <> '' "
+        "ORDER BY instr(lower(name), lower(?)) <> 1, length(name), name LIMIT ?",
+        (*params, text, limit)
+    )
+    return [row[0] for row in rows]
+
+
+# --- Filtri combinabili per le viste dei tempi (results e results_kids) ---
+
+# Filtri riconosciuti, nell'ordine in cui compaiono nella query: mantenere un ordine
+# fisso fa sì che la stessa combinazione produca sempre lo stesso SQL e riusi
+# l'istruzione già preparata nella cache della connessione.
+FILTER_FIELDS = ("year", "category", "gender", "game", "time_min", "time_max")
+
+
+def filter_query(table, filters):
+    """
+    SQL e parametri che applicano a `table` ("results" o "results_kids") tutti i
+    filtri presenti in `filters` (chiavi di FILTER_FIELDS; None o "" = non filtrare).
+    """
+    spec = PAGED_TABLES[table]
+    conditions, params = [], []
+    for field in FILTER_FIELDS:
+        value = filters.get(field)
+        if value is None or value == "":
+            continue
+        if field in ("year", "gender"):
+            conditions.append(f"{field}=?")
+            params.append(value)
+        elif field == "category":
+            # Confronto sulla chiave, coperto da idx_*_filter
+            conditions.append("category_id = (SELECT id FROM categories WHERE name=?)")
+            params.append(value)
+        elif field == "game":
+            condition, search_params = search_condition(table, value, targets=(("game_id", "games"),))
+            conditions.append(condition)
+            params.extend(search_params)
+        elif field == "time_min":
+            conditions.append("time>=?")
+            params.append(value)
+        elif field == "time_max":
+            conditions.append("time<=?")
+            params.append(value)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    return f"SELECT {', '.join(spec['columns'])} FROM {spec['view']} {where}", tuple(params)
+
+
+def get_filtered_records(table, filters):
+    """
+    Record di `table` che soddisfano tutti i filtri indicati: con un anno solo
+    dal suo database (vivo o archivio), altrimenti da tutti.
+    """
+    sql, params = filter_query(table, filters)
+    return partitioned_query(sql, params, filters.get("year") or None)
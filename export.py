@@ -0,0 +1,92 @@
+"""Esportazione in CSV e Parquet leggendo le righe dal cursore a blocchi.
+
+Le righe non vengono mai caricate tutte insieme (niente fetchall né DataFrame):
+ogni blocco letto da SQLite è scritto subito nel file di destinazione. I tempi
+degli anni archiviati sono letti dai rispettivi archivi (db.partitions), uno
+dopo l'altro.
+"""
+import csv
+import io
+
+from db import DATABASE, filter_query, partitions, stream_query
+
+# Righe lette dal cursore per ogni blocco
+EXPORT_CHUNK_SIZE = 5000
+
+# Intestazioni delle viste filtrate (vedi db.filter_query)
+FILTERED_COLUMNS = {
+    "results": ["ID", "Tempo (ms)", "Gioco", "Categoria", "Sesso", "Anno"],
+    "results_kids": ["ID", "Nome", "Tempo (ms)", "Gioco", "Categoria", "Genere", "Anno"],
+}
+
+# Intestazioni con valori interi (anche NULL); tutte le altre sono testo
+INTEGER_COLUMNS = {"ID", "Tempo (ms)", "Anno"}
+
+# Tabelle esportabili per intero: etichetta -> (database, query, intestazioni);
+# database None = DATABASE e tutti gli archivi per anno
+EXPORTS = {
+    "Tempi ragazzi": (
+        None,
+        "SELECT id, nome, time, game_name, category, gender, year FROM results_kids_view ORDER BY id",
+        ["ID", "Nome", "Tempo (ms)", "Gioco", "Categoria", "Genere", "Anno"],
+    ),
+    "Nomi ragazzi": (
+        DATABASE,
+        "SELECT id, first_name, last_name, game, category, gender, status FROM players_view ORDER BY id",
+        ["ID", "Nome", "Cognome", "Gioco", "Categoria", "Genere", "Stato"],
+    ),
+}
+
+
+def write_csv(chunks, columns, out):
+    """Scrive i blocchi di righe in `out` (file binario) come CSV UTF-8."""
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+    text.flush()
+    # Stacca il wrapper senza chiudere il file sottostante
+    text.detach()
+
+
+def write_parquet(chunks, columns, out):
+    """Scrive i blocchi di righe in `out` come Parquet, un row group per blocco."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Schema fisso dalle intestazioni, non dedotto dal primo blocco: una colonna
+    # tutta NULL in quel blocco (tempi o anni mancanti) avrebbe tipo null e i
+    # blocchi successivi con valori verrebbero rifiutati.
+    schema = pa.schema([
+        (name, pa.int64() if name in INTEGER_COLUMNS else pa.string()) for name in columns
+    ])
+    with pq.ParquetWriter(out, schema) as writer:
+        for rows in chunks:
+            arrays = [list(column) for column in zip(*rows)]
+            writer.write_table(pa.table(dict(zip(columns, arrays)), schema=schema))
+
+
+WRITERS = {
+    "CSV": (write_csv, "text/csv", "csv"),
+    "Parquet": (write_parquet, "application/vnd.apache.parquet", "parquet"),
+}
+
+
+def export_query(paths, sql, params, columns, out, fmt="CSV", chunk_size=EXPORT_CHUNK_SIZE):
+    """Esporta in `out` nel formato indicato il risultato di una query su ciascuno dei database `paths`."""
+    write, _, _ = WRITERS[fmt]
+    chunks = (rows for path in paths for rows in stream_query(path, sql, params, chunk_size))
+    write(chunks, columns, out)
+
+
+def export_filtered(table, filters, out, fmt="CSV"):
+    """Esporta i record di `table` che soddisfano i filtri della vista."""
+    sql, params = filter_query(table, filters)
+    export_query(partitions(filters.get("year") or None), sql, params, FILTERED_COLUMNS[table], out, fmt)
+
+
+def export_table(label, out, fmt="CSV"):
+    """Esporta per intero una delle tabelle di EXPORTS."""
+    path, sql, columns = EXPORTS[label]
+    export_query(partitions() if path is None else [path], sql, (), columns, out, fmt)
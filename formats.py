@@ -0,0 +1,101 @@
+"""Rappresentazione dei tempi e degli anni.
+
+I tempi sono salvati come interi in millisecondi, così minimi, parità e filtri
+sono confronti esatti; questo modulo è l'unico punto in cui si convertono da e
+verso minuti/secondi e il formato mm:ss.cc mostrato all'utente.
+"""
+import math
+
+MS_PER_SECOND = 1000
+MS_PER_MINUTE = 60 * MS_PER_SECOND
+
+# Tempo più lungo accettato (24 ore): oltre è un errore di inserimento
+MAX_TIME_MS = 24 * 60 * MS_PER_MINUTE
+
+# Anni ammessi (stesso intervallo del vincolo CHECK nel database)
+YEAR_MIN = 1900
+YEAR_MAX = 2999
+
+
+def to_ms(minutes, seconds):
+    """Tempo in millisecondi a partire da minuti e secondi (anche decimali)."""
+    return round(minutes * MS_PER_MINUTE + seconds * MS_PER_SECOND)
+
+
+def seconds_to_ms(seconds):
+    """Converte secondi (anche decimali) in millisecondi."""
+    return round(seconds * MS_PER_SECOND)
+
+
+def is_missing(value):
+    """Vero per un tempo o un anno assente: None, oppure NaN nelle colonne dei DataFrame."""
+    return value is None or value != value
+
+
+def split_ms(ms):
+    """Divide un tempo in millisecondi in (minuti interi, secondi decimali); (None, None) se manca."""
+    if is_missing(ms):
+        return None, None
+    minutes, rest = divmod(int(ms), MS_PER_MINUTE)
+    return minutes, rest / MS_PER_SECOND
+
+
+def format_time(ms):
+    """Formatta un tempo in millisecondi come mm:ss.cc (centesimi arrotondati)."""
+    if is_missing(ms):
+        return ""
+    centiseconds = (int(ms) + 5) // 10
+    minutes, rest = divmod(centiseconds, 6000)
+    seconds, hundredths = divmod(rest, 100)
+    return f"{minutes:02d}:{seconds:02d}.{hundredths:02d}"
+
+
+def parse_time(value):
+    """
+    Converte in millisecondi un tempo scritto come secondi ("75.3") o come
+    mm:ss.cc ("1:15.30"); accetta la virgola come separatore decimale.
+    """
+    text = str(value).strip().replace(",", ".")
+    if not text:
+        raise ValueError("tempo mancante")
+    try:
+        if ":" in text:
+            minutes, seconds = text.split(":", 1)
+            ms = to_ms(int(minutes), float(seconds))
+        else:
+            ms = seconds_to_ms(float(text))
+    except (ValueError, OverflowError):
+        raise ValueError(f"tempo non valido: {value!r}")
+    if ms < 0:
+        raise ValueError(f"tempo negativo: {value!r}")
+    if ms > MAX_TIME_MS:
+        raise ValueError(f"tempo troppo lungo: {value!r}")
+    return ms
+
+
+def validate_time_ms(value):
+    """Tempo già in millisecondi come intero fra 0 e MAX_TIME_MS, altrimenti ValueError."""
+    try:
+        ms = float(str(value).strip())
+    except ValueError:
+        raise ValueError(f"tempo non valido: {value!r}")
+    if not math.isfinite(ms):
+        raise ValueError(f"tempo non valido: {value!r}")
+    if ms < 0:
+        raise ValueError(f"tempo negativo: {value!r}")
+    if ms > MAX_TIME_MS:
+        raise ValueError(f"tempo troppo lungo: {value!r}")
+    if ms != int(ms):
+        raise ValueError(f"tempo in millisecondi non intero: {value!r}")
+    return int(ms)
+
+
+def validate_year(value):
+    """Anno come intero nell'intervallo ammesso, altrimenti ValueError."""
+    try:
+        year = int(float(str(value).strip()))
+    except (ValueError, OverflowError):
+        raise ValueError(f"anno non valido: {value!r}")
+    if not YEAR_MIN <= year <= YEAR_MAX:
+        raise ValueError(f"anno fuori intervallo: {year}")
+    return year
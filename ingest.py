@@ -0,0 +1,224 @@
+"""Servizio HTTP di acquisizione dei tempi dai cronometri elettronici.
+
+Condivide con l'app il livello dati (db.py), le regole di validazione delle righe
+(bulk_import.validate_row) e gli utenti (auth.py). Le righe ricevute passano
+dalla coda del thread scrittore (db.write), che raggruppa le richieste
+ravvicinate in poche transazioni brevi. Uso da riga di comando:
+
+    python ingest.py --host 0.0.0.0 --port 8502
+
+Endpoint (JSON; autenticazione HTTP Basic oppure "Authorization: Bearer <token>"):
+
+    POST /token          -> {"token": ..., "expires_in": secondi}
+    POST /results        -> un tempo (oggetto) o più tempi (lista) per i Tempi
+    POST /results_kids   -> idem per i tempi dei ragazzi
+    GET  /health         -> {"status": "ok"} (senza autenticazione)
+
+Ogni tempo ha le stesse colonne dei file di bulk_import (nome, tempo o time_ms,
+gioco, categoria, sesso, anno); la risposta indica le righe scritte e quelle
+scartate con il motivo.
+"""
+import argparse
+import base64
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from auth import (
+    SESSION_TTL,
+    LoginBusy,
+    LoginThrottled,
+    check_login,
+    ensure_default_users,
+    issue_session_token,
+    verify_session_token,
+)
+from bulk_import import HEADER_ALIASES, TARGETS, RowError, validate_row
+from db import DATABASE, archived_years, bulk_insert, init_databases, insert_rows, write
+
+# Blocchi da almeno tante righe usano bulk_insert (trigger sospesi)
+BULK_THRESHOLD = 1000
+MAX_BODY_BYTES = 4 * 1024 * 1024
+
+
+def write_rows(table, rows):
+    """Scrive le righe validate di una richiesta tramite il thread scrittore."""
+    insert = bulk_insert if len(rows) >= BULK_THRESHOLD else insert_rows
+    write(DATABASE, lambda conn: insert(conn, table, TARGETS[table]["columns"], rows))
+    return len(rows)
+
+
+def parse_records(payload):
+    """Normalizza il corpo JSON (oggetto, lista o {"results": lista}) in una lista di dict."""
+    if isinstance(payload, dict) and isinstance(payload.get("results"), list):
+        payload = payload["results"]
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list) or not all(isinstance(item, dict) for item in payload):
+        raise ValueError("atteso un oggetto JSON o una lista di oggetti")
+    return [
+        {HEADER_ALIASES.get(str(key).strip().lower()): value for key, value in item.items()}
+        for item in payload
+    ]
+
+
+def validate_records(records, table):
+    """Righe valide per `table` e lista di (indice, motivo) delle scartate."""
+    columns = TARGETS[table]["columns"]
+    archived = archived_years()
+    rows, rejected = [], []
+    for index, record in enumerate(records):
+        try:
+            rows.append(validate_row(record, columns, archived))
+        except RowError as exc:
+            rejected.append({"index": index, "reason": str(exc)})
+    return rows, rejected
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    server_version = "TrepontiIngest/1.0"
+    # Connessioni persistenti: i cronometri inviano molte richieste di seguito
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok"})
+        else:
+            self._send(404, {"error": "risorsa inesistente"})
+
+    def do_POST(self):
+        try:
+            self._content_length()
+        except ValueError as exc:
+            # Senza una lunghezza valida il corpo non si può saltare: la
+            # connessione viene chiusa dopo la risposta
+            self.close_connection = True
+            self._send(400, {"error": str(exc)})
+            return
+        table = self.path.strip("/")
+        if table != "token" and table not in TARGETS:
+            self._discard_body()
+            self._send(404, {"error": "risorsa inesistente"})
+            return
+        user = self._authenticate()
+        if user is None:
+            return
+        if table == "token":
+            self._discard_body()
+            self._send(200, {"token": issue_session_token(user), "expires_in": SESSION_TTL})
+            return
+
+        try:
+            records = parse_records(self._read_json())
+        except ValueError as exc:
+            self._send(400, {"error": str(exc)})
+            return
+        rows, rejected = validate_records(records, table)
+        inserted = 0
+        if rows:
+            try:
+                inserted = write_rows(table, rows)
+            except TimeoutError:
+                self._send(503, {"error": "scrittura non completata in tempo"})
+                return
+            except Exception as exc:
+                self._send(500, {"error": f"scrittura non riuscita: {exc}"})
+                return
+        status = 200 if inserted or not rejected else 422
+        self._send(status, {"inserted": inserted, "rejected": rejected})
+
+    def _authenticate(self):
+        """Utente della richiesta, oppure None dopo aver inviato la risposta di errore."""
+        header = self.headers.get("Authorization", "")
+        scheme, _, credentials = header.partition(" ")
+        user = None
+        if scheme.lower() == "bearer":
+            user = verify_session_token(credentials.strip())
+        elif scheme.lower() == "basic":
+            try:
+                username, _, password = base64.b64decode(credentials).decode("utf-8").partition(":")
+            except (ValueError, UnicodeDecodeError):
+                username = password = ""
+            try:
+                user = check_login(username, password) if username else None
+            except LoginThrottled as exc:
+                self._discard_body()
+                self._send(429, {"error": "troppi tentativi falliti"},
+                           {"Retry-After": str(int(exc.retry_after) + 1)})
+                return None
+            except LoginBusy as exc:
+                self._discard_body()
+                self._send(503, {"error": str(exc)}, {"Retry-After": "1"})
+                return None
+        if user is None:
+            self._discard_body()
+            self._send(401, {"error": "credenziali non valide"},
+                       {"WWW-Authenticate": 'Basic realm="treponti"'})
+        return user
+
+    def _content_length(self):
+        """Lunghezza del corpo dichiarata dal client; ValueError se non è un intero non negativo."""
+        value = self.headers.get("Content-Length") or "0"
+        try:
+            length = int(value)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise ValueError(f"Content-Length non valido: {value!r}")
+        return length
+
+    def _read_json(self):
+        length = self._content_length()
+        if length > MAX_BODY_BYTES:
+            raise ValueError("richiesta troppo grande")
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise ValueError("JSON non valido")
+
+    def _discard_body(self):
+        length = self._content_length()
+        if 0 < length <= MAX_BODY_BYTES:
+            self.rfile.read(length)
+        elif length:
+            self.close_connection = True
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class IngestServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, IngestHandler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servizio HTTP di acquisizione dei tempi.")
+    parser.add_argument("--host", default="127.0.0.1", help="indirizzo di ascolto (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8502, help="porta (default: 8502)")
+    args = parser.parse_args(argv)
+
+    init_databases()
+    ensure_default_users()
+    server = IngestServer((args.host, args.port))
+    print(f"In ascolto su http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
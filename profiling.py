@@ -0,0 +1,145 @@
+"""Strumentazione opzionale delle prestazioni dell'app.
+
+Quando è attiva, ogni query di db.py viene cronometrata con il numero di righe
+(tramite db.set_query_listener) e ogni rerun della vista attiva viene registrato
+con il tempo totale diviso fra query, costruzione dei DataFrame e il resto, cioè
+soprattutto il rendering di Streamlit. Ogni rerun è scritto come riga JSON in
+LOG_FILE insieme a p50/p95 aggiornati della vista.
+
+Si attiva con la variabile d'ambiente PROFILE=1 oppure dal pannello di debug
+degli amministratori; quando è spenta non aggiunge lavoro alle query.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import db
+
+LOG_FILE = os.environ.get("PROFILE_LOG", "profile.log")
+
+# Rerun recenti per vista usati per i percentili
+SAMPLES_PER_VIEW = 500
+
+_enabled = False
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=SAMPLES_PER_VIEW))
+# Ogni sessione Streamlit esegue lo script nel proprio thread: query e sezioni
+# del rerun in corso sono raccolte per thread.
+_local = threading.local()
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(enabled):
+    """Attiva o disattiva la strumentazione per tutto il processo."""
+    global _enabled
+    _enabled = bool(enabled)
+    db.set_query_listener(_record_query if _enabled else None)
+
+
+def _record_query(sql, seconds, rows, cached):
+    queries = getattr(_local, "queries", None)
+    if queries is not None:
+        queries.append({
+            "sql": " ".join(sql.split()),
+            "ms": round(seconds * 1000, 3),
+            "rows": rows,
+            "cached": cached,
+        })
+
+
+def percentile(values, fraction):
+    """Percentile (metodo nearest-rank) di una lista non vuota di valori."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+@contextmanager
+def section(name):
+    """Cronometra una parte del rerun in corso (es. "dataframe")."""
+    sections = getattr(_local, "sections", None)
+    if sections is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        sections[name] = sections.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+@contextmanager
+def profile_view(view, username=None):
+    """Registra il rerun di `view`: tempo totale, query e sezioni."""
+    if not _enabled:
+        yield
+        return
+    _local.queries = []
+    _local.sections = {}
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        total_ms = (time.perf_counter() - start) * 1000
+        queries, sections = _local.queries, _local.sections
+        _local.queries = _local.sections = None
+        # Le query servite dalla cache non passano da SQLite
+        query_ms = sum(q["ms"] for q in queries if not q["cached"])
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "view": view,
+            "user": username,
+            "total_ms": round(total_ms, 3),
+            "query_ms": round(query_ms, 3),
+            "queries": len(queries),
+            "cached": sum(1 for q in queries if q["cached"]),
+            "rows": sum(q["rows"] for q in queries),
+            "sections_ms": {name: round(ms, 3) for name, ms in sections.items()},
+            "other_ms": round(total_ms - query_ms - sum(sections.values()), 3),
+        }
+        with _lock:
+            samples = _samples[view]
+            samples.append(total_ms)
+            entry["p50_ms"] = round(percentile(samples, 0.50), 3)
+            entry["p95_ms"] = round(percentile(samples, 0.95), 3)
+            _write_log(entry)
+        _local.last = dict(entry, query_log=queries)
+
+
+def _write_log(entry):
+    try:
+        with open(LOG_FILE, "a", encoding="utf-8") as log:
+            log.write(json.dumps(entry) + "\n")
+    except OSError:
+        # Il log è accessorio: un errore di scrittura non deve fermare l'app
+        pass
+
+
+def last_rerun():
+    """Dati dell'ultimo rerun registrato nella sessione corrente (o None)."""
+    return getattr(_local, "last", None)
+
+
+def summary():
+    """Per ogni vista: numero di rerun registrati, p50, p95 e massimo in ms."""
+    with _lock:
+        return [
+            {
+                "view": view,
+                "reruns": len(samples),
+                "p50_ms": round(percentile(samples, 0.50), 1),
+                "p95_ms": round(percentile(samples, 0.95), 1),
+                "max_ms": round(max(samples), 1),
+            }
+            for view, samples in sorted(_samples.items()) if samples
+        ]
+
+
+if os.environ.get("PROFILE") == "1":
+    set_enabled(True)
@@ -0,0 +1,153 @@
+"""Riconciliazione fra l'elenco nomi (players) e gli atleti dei tempi dei ragazzi.
+
+Lo stesso ragazzo può comparire nei tempi con una grafia diversa da quella
+dell'elenco nomi ("Giulia Rossi", "Rossi Giulia", "Giulia Rosi"): i suoi tempi
+finiscono così su atleti diversi. Questo modulo propone i collegamenti fra i
+giocatori e gli atleti che non corrispondono a nessun giocatore.
+
+Confrontare ogni giocatore con ogni atleta costa O(n·m). I nomi vengono invece
+suddivisi in blocchi con chiavi (fonetica, inizio e fine) dei singoli token, e la
+somiglianza è calcolata solo fra nomi con almeno due token in comune secondo
+queste chiavi: un nome proprio frequente da solo non basta. I controlli veloci
+di difflib (limiti superiori del rapporto) scartano la maggior parte delle
+coppie prima del calcolo completo. I collegamenti accettati o scartati sono
+salvati nel database (db.link_player_athlete, db.reject_player_link).
+"""
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from db import (
+    DATABASE,
+    data_version,
+    get_rejected_links,
+    get_roster,
+    get_unlinked_athletes,
+    player_athlete_name,
+)
+
+# Somiglianza minima (0-1) perché una coppia venga proposta
+MATCH_THRESHOLD = 0.85
+
+# Suoni scritti in modi diversi ridotti a una sola forma, nell'ordine
+_PHONETIC_RULES = (
+    ("ch", "k"), ("gh", "g"), ("ph", "f"), ("gn", "n"), ("sc", "s"), ("h", ""),
+    ("c", "k"), ("q", "k"), ("y", "i"), ("j", "i"), ("w", "v"), ("x", "s"), ("z", "s"),
+)
+
+
+def normalize_name(name):
+    """Token del nome in minuscolo, senza accenti né punteggiatura, in ordine alfabetico."""
+    text = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(sorted(re.findall(r"[a-z]+", text.lower())))
+
+
+def phonetic_key(token):
+    """
+    Chiave fonetica di un token: prima lettera e consonanti che seguono, dopo aver
+    unificato i suoni equivalenti e le doppie ("Rossi", "Rosi" e "Rosy" -> "rs").
+    """
+    for old, new in _PHONETIC_RULES:
+        token = token.replace(old, new)
+    token = re.sub(r"(.)\1+", r"\1", token)
+    if not token:
+        return ""
+    return token[0] + re.sub(r"[aeiou]", "", token[1:])[:4]
+
+
+def token_keys(token):
+    """Chiavi di blocco di un token: chiave fonetica, prime e ultime tre lettere."""
+    return {"f:" + phonetic_key(token), "p:" + token[:3], "s:" + token[-3:]}
+
+
+def name_tokens(normalized):
+    """Token di un nome normalizzato usati per i blocchi (almeno due lettere)."""
+    return [token for token in normalized.split() if len(token) >= 2]
+
+
+def similarity(a, b, threshold=0.0):
+    """Somiglianza fra due nomi normalizzati, oppure 0 se è sicuramente sotto `threshold`."""
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+        return 0.0
+    return matcher.ratio()
+
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def cached_proposals(threshold=MATCH_THRESHOLD):
+    """Come propose_matches, ricalcolate solo se il database è cambiato dall'ultima volta."""
+    version = data_version(DATABASE)
+    with _lock:
+        entry = _cache.get(threshold)
+    if entry is None or entry[0] != version:
+        entry = (version, propose_matches(threshold))
+        with _lock:
+            _cache.clear()
+            _cache[threshold] = entry
+    return entry[1]
+
+
+def propose_matches(threshold=MATCH_THRESHOLD):
+    """
+    Collegamenti proposti fra giocatori e atleti senza giocatore, dal più simile.
+    Ogni proposta è un dict con giocatore (id, nome, gioco, categoria), atleta
+    (id, nome, numero di tempi) e somiglianza; per ogni atleta resta solo il
+    giocatore (o i giocatori a pari merito) più simile.
+    """
+    rejected = set(get_rejected_links())
+    blocks = defaultdict(set)
+    athletes = {}
+    for athlete_id, name, results in get_unlinked_athletes():
+        normalized = normalize_name(name)
+        tokens = name_tokens(normalized)
+        athletes[athlete_id] = (name, results, normalized, len(tokens))
+        for token in tokens:
+            for key in token_keys(token):
+                blocks[key].add(athlete_id)
+
+    # Atleti con un token simile a quello dato (i nomi propri si ripetono spesso)
+    matching = {}
+
+    def similar_to(token):
+        if token not in matching:
+            matching[token] = set().union(*(blocks.get(key, ()) for key in token_keys(token)))
+        return matching[token]
+
+    best = {}
+    for player_id, first_name, last_name, game, category in get_roster():
+        player_name = player_athlete_name(first_name, last_name)
+        normalized = normalize_name(player_name)
+        sets = [similar_to(token) for token in name_tokens(normalized)]
+        if len(sets) == 1:
+            candidates = {a for a in sets[0] if athletes[a][3] == 1}
+        else:
+            # Almeno due token in comune: intersezioni a coppie, ognuna lunga
+            # quanto il blocco più piccolo
+            candidates = set()
+            for i, first in enumerate(sets):
+                for second in sets[i + 1:]:
+                    candidates |= first & second
+        for athlete_id in candidates:
+            if (player_id, athlete_id) in rejected:
+                continue
+            score = round(similarity(normalized, athletes[athlete_id][2], threshold), 3)
+            if score < threshold:
+                continue
+            proposal = {
+                "player_id": player_id, "player": player_name, "game": game, "category": category,
+                "athlete_id": athlete_id, "athlete": athletes[athlete_id][0],
+                "results": athletes[athlete_id][1], "score": score,
+            }
+            current = best.get(athlete_id)
+            if current is None or score > current[0]["score"]:
+                best[athlete_id] = [proposal]
+            elif score == current[0]["score"]:
+                current.append(proposal)
+    proposals = [p for group in best.values() for p in group]
+    proposals.sort(key=lambda p: (-p["score"], p["player"], p["athlete"]))
+    return proposals
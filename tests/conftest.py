@@ -0,0 +1,25 @@
+"""Ogni test lavora su database nuovi in una cartella temporanea.
+
+I percorsi dei database (db.DATABASE, db.DATABASE_USERS) sono relativi alla
+cartella corrente: basta spostarsi in tmp_path e chiudere pool, code di
+scrittura e cache fra un test e l'altro.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth  # noqa: E402
+import db  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_databases(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db.close_all()
+    monkeypatch.setattr(db, "_initialized", False)
+    monkeypatch.setattr(auth, "_secret", None)
+    yield tmp_path
+    db.close_all()
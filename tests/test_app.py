@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+import db
+from auth import ensure_default_users
+
+streamlit_testing = pytest.importorskip("streamlit.testing.v1")
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def test_views_show_rows_without_time_or_year():
+    db.init_databases()
+    ensure_default_users()
+    db.insert_record_db1(12_000, "corsa", "medie", "femmina", 2024)
+    db.insert_record_db2("Anna", 12_000, "corsa", "medie", 2024, "femmina")
+    # Come le vecchie righe importate con tempo negativo o anno fuori intervallo
+    for table in db.TIME_TABLES:
+        db.execute(db.DATABASE, f"UPDATE {table} SET time = NULL, year = NULL")
+    db.close_all()
+
+    app = streamlit_testing.AppTest.from_file(APP, default_timeout=60)
+    app.run()
+    app.text_input[0].input("mattia")
+    app.text_input[1].input("Dorz")
+    app.button[0].click().run()
+    views = app.radio(key="active_view")
+    for view in views.options:
+        app.radio(key="active_view").set_value(view).run()
+        assert not app.exception, (view, app.exception)
+        for radio in [radio for radio in app.radio if radio.key != "active_view" and len(radio.options) > 2]:
+            for option in radio.options:
+                app.radio(key=radio.key).set_value(option).run()
+                assert not app.exception, (view, option, app.exception)
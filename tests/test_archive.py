@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+import db
+from archive import ArchiveError, archive_year, archives, restore_year
+
+
+def snapshot():
+    """Letture dell'app che devono restare identiche prima, durante e dopo l'archiviazione."""
+    db.clear_query_cache()
+    return {
+        "records": sorted(db.get_records_db1()),
+        "records_kids": sorted(db.get_records_db2()),
+        "min_all": sorted(db.get_min_times("Tutti")),
+        "min_2001": sorted(db.get_min_times("2001")),
+        "leaderboard": db.get_leaderboard("corsa", "medie", "femmina")[0],
+        "personal_bests": db.get_personal_bests("Anna"),
+        "progress": db.get_athlete_progress("Anna"),
+        "year_stats": db.get_year_stats("results_kids", "corsa", "medie"),
+        "filtered": sorted(db.get_filtered_records("results_kids", {"year": 2001})),
+        "years": db.get_years("results_kids"),
+    }
+
+
+def test_archive_and_restore_round_trip(tmp_path):
+    db.init_databases()
+    for year, offset in ((2001, 0), (2002, 100), (2024, 200)):
+        for i in range(5):
+            db.insert_record_db1(10_000 + offset + i, "corsa", "medie", "femmina", year)
+            db.insert_record_db2(f"Atleta {i}", 10_000 + offset + i, "corsa", "medie", year, "femmina")
+        db.insert_record_db2("Anna", 20_000 - offset, "corsa", "medie", year, "femmina")
+    before = snapshot()
+    assert before["years"] == [2024, 2002, 2001]
+
+    directory = str(tmp_path / "archivi")
+    assert archive_year(2001, directory) == {"results": 5, "results_kids": 6}
+    assert archive_year(2002, directory, vacuum=False) == {"results": 5, "results_kids": 6}
+    assert [row[0] for row in archives()] == [2001, 2002]
+    assert db.query(db.DATABASE, "SELECT DISTINCT year FROM results_kids") == [(2024,)]
+    assert snapshot() == before
+    with pytest.raises(ValueError):
+        db.insert_record_db2("Anna", 1_000, "corsa", "medie", 2001, "femmina")
+    with pytest.raises(ArchiveError):
+        archive_year(2001, directory)
+
+    path = archives()[0][1]
+    assert restore_year(2001) == {"results": 5, "results_kids": 6}
+    assert not os.path.exists(path)
+    assert [row[0] for row in archives()] == [2002]
+    assert restore_year(2002) == {"results": 5, "results_kids": 6}
+    assert archives() == []
+    assert snapshot() == before
+
+    # L'anno riportato accetta di nuovo tempi
+    db.insert_record_db2("Anna", 1_000, "corsa", "medie", 2001, "femmina")
+    assert db.get_min_times("2001") == [("corsa", "medie", "Anna", "femmina", 1_000)]
@@ -0,0 +1,15 @@
+import auth
+import db
+
+
+def test_session_survives_the_rehash_at_login(monkeypatch):
+    db.init_databases()
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 4)
+    auth.add_user("anna", "Anna", "segreta")
+    # Il fattore di costo configurato cambia: il login ricalcola l'hash
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+    user = auth.check_login("anna", "segreta")
+    assert auth.hash_rounds(auth.get_user("anna")["password"]) == 5
+    token = auth.issue_session_token(user)
+    # Refresh della pagina: la sessione riprende dal token
+    assert auth.verify_session_token(token)["username"] == "anna"
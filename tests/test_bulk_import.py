@@ -0,0 +1,53 @@
+import pytest
+
+import db
+from bulk_import import import_rows
+from formats import MAX_TIME_MS, format_time, parse_time, split_ms, validate_time_ms, validate_year
+
+HEADER = ["nome", "tempo (ms)", "gioco", "categoria", "sesso", "anno"]
+
+
+@pytest.mark.parametrize("value, reason", [
+    ("-1", "tempo negativo"),
+    ("1500.5", "non intero"),
+    ("inf", "tempo non valido"),
+    ("nan", "tempo non valido"),
+    ("1e30", "tempo troppo lungo"),
+    (str(MAX_TIME_MS + 1), "tempo troppo lungo"),
+    ("abc", "tempo non valido"),
+])
+def test_invalid_ms_times_are_rejected_rows(value, reason):
+    db.init_databases()
+    inserted, rejected = import_rows([
+        HEADER,
+        ["Anna", "12000", "corsa", "medie", "femmina", "2024"],
+        ["Bruno", value, "corsa", "medie", "maschio", "2024"],
+        ["Carla", "12000.0", "corsa", "medie", "femmina", "2024"],
+    ], "results_kids")
+    assert inserted == 2
+    assert [line for line, _ in rejected] == [3]
+    assert reason in rejected[0][1]
+    assert db.query(db.DATABASE, "SELECT time FROM results_kids") == [(12_000,), (12_000,)]
+
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan", "1:inf", "1e400", "-5", "25:00:00", "86400.001"])
+def test_parse_time_rejects_with_value_error(value):
+    with pytest.raises(ValueError):
+        parse_time(value)
+
+
+def test_parse_time_accepts_the_maximum():
+    assert parse_time("86400") == MAX_TIME_MS
+    assert validate_time_ms(MAX_TIME_MS) == MAX_TIME_MS
+
+
+@pytest.mark.parametrize("value", ["inf", "nan", "1e400", "25", "abc"])
+def test_validate_year_rejects_with_value_error(value):
+    with pytest.raises(ValueError):
+        validate_year(value)
+
+
+@pytest.mark.parametrize("value", [None, float("nan")])
+def test_missing_times_format_as_empty(value):
+    assert format_time(value) == ""
+    assert split_ms(value) == (None, None)
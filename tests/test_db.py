@@ -0,0 +1,146 @@
+import re
+
+import pytest
+
+import db
+
+# Alias delle tabelle dei tempi e della classifica nelle query lette
+TIME_ALIASES = re.compile(r"^(SCAN|SEARCH) (b|r|k)\b")
+
+
+def executed_queries(call):
+    """SQL delle SELECT eseguite da `call`, lette dal database e non dalla cache."""
+    seen = []
+    db.clear_query_cache()
+    db.set_query_listener(lambda sql, *_: seen.append(sql))
+    try:
+        call()
+    finally:
+        db.set_query_listener(None)
+    return [sql for sql in dict.fromkeys(seen) if "FROM archives" not in sql]
+
+
+@pytest.fixture
+def timed_rows():
+    db.init_databases()
+    for i in range(20):
+        db.insert_record_db1(10_000 + i, "corsa", "medie", "femmina", 2024)
+        db.insert_record_db2(f"Atleta {i}", 10_000 + i, "corsa", "medie", 2024, "femmina")
+
+
+@pytest.mark.parametrize("call", [
+    lambda: db.get_min_times("Tutti"),
+    lambda: db.get_min_times("2024"),
+    *(
+        (lambda table=table, filters=filters: db.get_filtered_records(table, filters))
+        for table in ("results", "results_kids")
+        for filters in (
+            {"year": 2024},
+            {"year": 2024, "category": "medie", "gender": "femmina"},
+            {"category": "medie"},
+            {"gender": "femmina", "time_min": 1000},
+            {"game": "cor"},
+        )
+    ),
+])
+def test_hot_queries_use_indexes(timed_rows, call):
+    queries = executed_queries(call)
+    assert queries
+    for sql in queries:
+        plan = db.explain(db.DATABASE, sql, (None,) * sql.count("?"))
+        steps = [step for step in plan if TIME_ALIASES.match(step)]
+        assert steps, plan
+        for step in steps:
+            assert step.startswith("SEARCH") and "USING" in step, (sql, plan)
+
+
+def best_times():
+    return sorted(db.get_min_times("Tutti") + db.get_min_times("2024"))
+
+
+def test_missing_times_are_never_the_best():
+    db.init_databases()
+    db.insert_record_db2("Lento", 20_000, "corsa", "medie", 2024, "femmina")
+    db.insert_record_db2("Senza tempo", 5_000, "corsa", "medie", 2024, "femmina")
+    # Il detentore perde il tempo (trigger di modifica) e una copia senza tempo
+    # viene inserita (trigger di inserimento)
+    db.execute(db.DATABASE, "UPDATE results_kids SET time = NULL WHERE time = 5000")
+    db.execute(
+        db.DATABASE,
+        "INSERT INTO results_kids (athlete_id, time, game_id, category_id, year, gender) "
+        "SELECT athlete_id, time, game_id, category_id, year, gender FROM results_kids WHERE time IS NULL"
+    )
+    expected = [("corsa", "medie", "Lento", "femmina", 20_000)] * 2
+    assert best_times() == expected
+    db.write(db.DATABASE, db.rebuild_best_times)
+    db.clear_query_cache()
+    assert best_times() == expected
+
+
+def test_missing_year_counts_only_for_all_years():
+    db.init_databases()
+    db.insert_record_db2("Lento", 20_000, "corsa", "medie", 2024, "femmina")
+    db.insert_record_db2("Senza anno", 5_000, "corsa", "medie", 2024, "femmina")
+    db.execute(db.DATABASE, "UPDATE results_kids SET year = NULL WHERE time = 5000")
+    assert db.get_min_times("2024") == [("corsa", "medie", "Lento", "femmina", 20_000)]
+    assert db.get_min_times("Tutti") == [("corsa", "medie", "Senza anno", "femmina", 5_000)]
+    db.write(db.DATABASE, db.rebuild_best_times)
+    db.clear_query_cache()
+    assert db.get_min_times("2024") == [("corsa", "medie", "Lento", "femmina", 20_000)]
+
+
+def test_missing_times_are_never_personal_bests():
+    db.init_databases()
+    db.insert_record_db2("Mario", 20_000, "corsa", "medie", 2024, "femmina")
+    db.insert_record_db2("Mario", 5_000, "corsa", "medie", 2023, "femmina")
+    db.execute(db.DATABASE, "UPDATE results_kids SET time = NULL WHERE time = 5000")
+    assert [row[:3] for row in db.get_personal_bests("Mario")] == [("corsa", 20_000, 2024)]
+    db.write(db.DATABASE, db.rebuild_personal_bests)
+    db.clear_query_cache()
+    assert [row[:3] for row in db.get_personal_bests("Mario")] == [("corsa", 20_000, 2024)]
+
+
+def test_year_stats_skip_missing_years():
+    db.init_databases()
+    db.insert_record_db1(10_000, "corsa", "medie", "femmina", 2024)
+    db.insert_record_db1(12_000, "corsa", "medie", "femmina", 2024)
+    db.execute(db.DATABASE, "UPDATE results SET year = NULL WHERE time = 12000")
+    expected = [(2024, "femmina", 1, 10_000, 10_000)]
+    assert db.get_year_stats("results", "corsa", "medie") == expected
+    db.write(db.DATABASE, db.rebuild_year_stats)
+    db.clear_query_cache()
+    assert db.get_year_stats("results", "corsa", "medie") == expected
+
+
+@pytest.mark.parametrize("sort", ["Tempo", "Anno"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_continue_across_missing_values(sort, descending):
+    db.init_databases()
+    for i in range(5):
+        db.insert_record_db1(10_000 + i, "corsa", "medie", "femmina", 2020 + i)
+    column = {"Tempo": "time", "Anno": "year"}[sort]
+    db.execute(db.DATABASE, f"UPDATE results SET {column} = NULL WHERE id <= 3")
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = db.get_page("results", sort, descending, cursor, page_size=2)
+        seen.extend(row[0] for row in rows)
+        pages += 1
+        if cursor is None:
+            break
+    expected = [1, 2, 3, 4, 5]
+    assert seen == (expected[::-1] if descending else expected)
+    assert pages == 3
+
+
+def test_name_search_ranks_every_match():
+    db.init_databases()
+    db.write(db.DATABASE, lambda conn: conn.executemany(
+        "INSERT INTO athletes (name) VALUES (?)", [(f"Anna Tamara {i}",) for i in range(300)]
+    ))
+    db.insert_record_db2("Mara Rossi", 12_000, "corsa", "medie", 2024, "femmina")
+    names = db.search_kid_names("mar")
+    assert names[0] == "Mara Rossi"
+    assert len(names) == 10
+    # Anche sotto i tre caratteri la ricerca è per sottostringa
+    assert db.search_kid_names("ar")[0] == "Mara Rossi"
+    assert "Anna Tamara 0" in db.search_kid_names("ar", limit=300)
@@ -0,0 +1,30 @@
+import io
+
+import pytest
+
+from export import FILTERED_COLUMNS, write_parquet
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_parquet_keeps_types_when_the_first_chunk_is_all_null():
+    columns = FILTERED_COLUMNS["results"]
+    chunks = [
+        [(1, None, "corsa", "medie", "femmina", None)],
+        [(2, 12_000, "corsa", "medie", "femmina", 2024)],
+    ]
+    out = io.BytesIO()
+    write_parquet(iter(chunks), columns, out)
+    table = pq.read_table(io.BytesIO(out.getvalue()))
+    assert str(table.schema.field("Tempo (ms)").type) == "int64"
+    assert table.column("Tempo (ms)").to_pylist() == [None, 12_000]
+    assert table.column("Anno").to_pylist() == [None, 2024]
+
+
+def test_parquet_without_rows_has_the_same_schema():
+    out = io.BytesIO()
+    write_parquet(iter([]), FILTERED_COLUMNS["results_kids"], out)
+    table = pq.read_table(io.BytesIO(out.getvalue()))
+    assert table.num_rows == 0
+    assert str(table.schema.field("Anno").type) == "int64"
+    assert str(table.schema.field("Nome").type) == "string"
@@ -0,0 +1,84 @@
+import base64
+import http.client
+import json
+import threading
+
+import pytest
+
+import db
+from auth import ensure_default_users
+from ingest import IngestServer
+
+BASIC = "Basic " + base64.b64encode(b"mattia:Dorz").decode()
+
+RECORD = {"nome": "Anna", "gioco": "corsa", "categoria": "medie", "sesso": "femmina", "anno": 2024}
+
+
+@pytest.fixture
+def server():
+    db.init_databases()
+    ensure_default_users()
+    server = IngestServer(("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    # Un solo login (bcrypt) per test, poi il token di sessione
+    server.authorization = BASIC
+    server.authorization = "Bearer " + post(server, "/token", b"")[1]["token"]
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, path, body, length=None):
+    """Invia una POST con il Content-Length indicato (quello reale se None)."""
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    try:
+        conn.putrequest("POST", path)
+        conn.putheader("Authorization", server.authorization)
+        conn.putheader("Content-Type", "application/json")
+        conn.putheader("Content-Length", str(len(body)) if length is None else length)
+        conn.endheaders(body)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("length", ["-1", "abc", "1.5"])
+def test_invalid_content_length_is_a_bad_request(server, length):
+    status, payload = post(server, "/results_kids", b"{}", length)
+    assert status == 400
+    assert "Content-Length" in payload["error"]
+    # Anche sugli endpoint che scartano il corpo
+    assert post(server, "/token", b"", length)[0] == 400
+    assert post(server, "/missing", b"", length)[0] == 400
+
+
+@pytest.mark.parametrize("field, value", [
+    ("time_ms", 1e30),
+    ("time_ms", -5),
+    ("time_ms", 12.5),
+    ("time_ms", "inf"),
+    ("anno", 1e30),
+    ("anno", "inf"),
+])
+def test_out_of_range_values_are_rejected_rows(server, field, value):
+    record = {"time_ms": 12_000, **RECORD, field: value}
+    body = json.dumps([record, {**RECORD, "time_ms": 11_000}]).encode()
+    status, payload = post(server, "/results_kids", body)
+    assert status == 200
+    assert payload["inserted"] == 1
+    assert [row["index"] for row in payload["rejected"]] == [0]
+
+    status, payload = post(server, "/results_kids", json.dumps(record).encode())
+    assert status == 422
+    assert payload["inserted"] == 0
+
+
+def test_infinite_json_year_is_rejected(server):
+    # json.loads legge 1e400 come inf
+    body = b'{"nome": "Anna", "time_ms": 12000, "gioco": "corsa", "categoria": "medie", ' \
+           b'"sesso": "femmina", "anno": 1e400}'
+    status, payload = post(server, "/results_kids", body)
+    assert status == 422
+    assert "anno" in payload["rejected"][0]["reason"]
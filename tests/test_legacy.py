@@ -0,0 +1,114 @@
+import sqlite3
+
+import pytest
+
+import db
+
+# Tabelle dei vecchi database separati (app.py prima di db.py)
+LEGACY_TABLES = {
+    "database1.db": (
+        "results",
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, time REAL, game_name TEXT, category TEXT, "
+        "gender TEXT, year INTEGER",
+    ),
+    "database2.db": (
+        "results_kids",
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT, time REAL, game_name TEXT, "
+        "category TEXT, gender TEXT, year INTEGER",
+    ),
+    "database3.db": (
+        "players",
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, first_name TEXT NOT NULL, last_name TEXT NOT NULL, "
+        "game TEXT NOT NULL, category TEXT NOT NULL, gender TEXT NOT NULL, status TEXT NOT NULL",
+    ),
+}
+
+
+def legacy_database(filename, rows, columns=None):
+    """Scrive un vecchio database con le righe date (e colonne diverse, se indicate)."""
+    table, default_columns = LEGACY_TABLES[filename]
+    conn = sqlite3.connect(filename)
+    with conn:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"CREATE TABLE {table} ({columns or default_columns})")
+        for row in rows:
+            conn.execute(f"INSERT INTO {table} VALUES ({', '.join('?' * len(row))})", row)
+    conn.close()
+
+
+def restart():
+    """Come un nuovo avvio dell'applicazione sugli stessi file."""
+    db.close_all()
+    db._initialized = False
+
+
+def count(table):
+    return db.query(db.DATABASE, f"SELECT COUNT(*) FROM {table}")[0][0]
+
+
+def test_failed_import_is_retried_from_scratch():
+    legacy_database("database1.db", [(1, 12.5, "corsa", "medie", "femmina", 2020)])
+    legacy_database("database2.db", [(1, "Anna", 10.25, "corsa", "medie", "femmina", 2020)])
+    # Manca la colonna status: la copia dei nomi fallisce dopo quella dei tempi
+    legacy_database(
+        "database3.db", [(1, "Anna", "Rossi", "corsa", "medie", "femmina")],
+        columns="id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT, game TEXT, category TEXT, gender TEXT"
+    )
+    with pytest.raises(sqlite3.OperationalError):
+        db.init_databases()
+    restart()
+    assert count("results") == count("results_kids") == count("players") == 0
+    assert not db.query(db.DATABASE, "SELECT 1 FROM meta WHERE key='legacy_migrated'")
+
+    legacy_database("database3.db", [(1, "Anna", "Rossi", "corsa", "medie", "femmina", "attivo")])
+    db.init_databases()
+    assert count("results") == count("results_kids") == count("players") == 1
+    assert db.query(db.DATABASE, "SELECT time FROM results_kids") == [(10_250,)]
+
+    # Importati una volta sola
+    restart()
+    db.init_databases()
+    assert count("results") == count("results_kids") == count("players") == 1
+
+
+def test_out_of_range_values_are_imported_empty(caplog):
+    legacy_database("database1.db", [
+        (1, 12.5, "corsa", "medie", "femmina", 25),
+        (2, -3.0, "corsa", "medie", "femmina", 2020),
+        (3, 11.0, "corsa", "medie", "femmina", 2020),
+    ])
+    db.init_databases()
+    assert db.query(db.DATABASE, "SELECT id, time, year FROM results ORDER BY id") == [
+        (1, 12_500, None), (2, None, 2020), (3, 11_000, 2020),
+    ]
+    assert "database1.db: 1 righe con anno fuori da 1900-2999 copiate senza anno" in caplog.text
+    assert "database1.db: 1 righe con tempo negativo copiate senza tempo" in caplog.text
+
+
+def test_out_of_range_values_survive_the_ms_migration(caplog):
+    # Database unico prima della migrazione 1: tempi in secondi e nessun vincolo
+    conn = sqlite3.connect(db.DATABASE)
+    with conn:
+        conn.execute("CREATE TABLE games (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE COLLATE NOCASE)")
+        conn.execute("CREATE TABLE categories (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+        conn.execute("CREATE TABLE athletes (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE COLLATE NOCASE)")
+        conn.execute("INSERT INTO games VALUES (1, 'corsa')")
+        conn.execute("INSERT INTO categories VALUES (1, 'medie')")
+        conn.execute(
+            "CREATE TABLE results (id INTEGER PRIMARY KEY AUTOINCREMENT, time REAL, game_id INTEGER, "
+            "category_id INTEGER, gender TEXT, year INTEGER)"
+        )
+        conn.execute(
+            "CREATE TABLE results_kids (id INTEGER PRIMARY KEY AUTOINCREMENT, athlete_id INTEGER, time REAL, "
+            "game_id INTEGER, category_id INTEGER, gender TEXT, year INTEGER)"
+        )
+        conn.executemany("INSERT INTO results_kids VALUES (?, NULL, ?, 1, 1, 'femmina', ?)", [
+            (1, 12.5, 25), (2, -3.0, 2020), (3, 11.0, 2020),
+        ])
+    conn.close()
+    db.init_databases()
+    assert db.query(db.DATABASE, "SELECT id, time, year FROM results_kids ORDER BY id") == [
+        (1, 12_500, None), (2, None, 2020), (3, 11_000, 2020),
+    ]
+    assert db.get_min_times("Tutti") == [("corsa", "medie", "", "femmina", 11_000)]
+    assert "results_kids: 1 righe con anno fuori da 1900-2999 copiate senza anno" in caplog.text
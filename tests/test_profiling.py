@@ -0,0 +1,23 @@
+import pytest
+
+import db
+import profiling
+
+
+@pytest.fixture
+def profiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "LOG_FILE", str(tmp_path / "profile.log"))
+    profiling.set_enabled(True)
+    yield
+    profiling.set_enabled(False)
+
+
+def test_writes_appear_in_the_rerun_log(profiled):
+    db.init_databases()
+    with profiling.profile_view("Inserisci Tempi", "mattia"):
+        db.insert_record_db1(12_000, "corsa", "medie", "femmina", 2024)
+    rerun = profiling.last_rerun()
+    writes = [q for q in rerun["query_log"] if "INSERT INTO results" in q["sql"]]
+    assert len(writes) == 1
+    assert writes[0]["rows"] >= 1 and not writes[0]["cached"]
+    assert rerun["query_ms"] >= writes[0]["ms"] > 0